@@ -0,0 +1,530 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+mod_spatialite / mod_standardmeshのベンチマーク
+一時ディレクトリのDBに乱数（シード固定）でデータを生成し、主要な処理の所要時間を計測する。
+各ベンチマークは別プロセスで実行し、スループット・ピークRSS・SQLの実行数をJSONに出力する。
+SpatiaLiteが読み込めない環境では、メッシュ（純Python）のベンチマークのみ実行する。
+
+つかいかた：
+  python bench_spatialite.py run --out baseline.json               # ベースラインを作成
+  python bench_spatialite.py run --out current.json --compare baseline.json
+  python bench_spatialite.py compare baseline.json current.json --threshold 0.1
+  python bench_spatialite.py run --only mesh_index,generate_stdmesh --scale 0.1
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import random
+import struct
+import argparse
+import platform
+import tempfile
+import contextlib
+import concurrent.futures
+
+# 範囲の既定値（東京周辺）
+T_EXTENT = (139.0, 35.0, 140.0, 36.0)
+
+
+# ピークRSS[MB]を得る（取得できない環境ではNone）
+def get_peak_rss_mb():
+    try:
+        import resource
+
+        i_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return i_rss / 1024 / 1024 if sys.platform == "darwin" else i_rss / 1024
+    except ImportError:
+        try:
+            import psutil
+
+            return psutil.Process().memory_info().peak_wset / 1024 / 1024
+        except (ImportError, AttributeError):
+            return None
+
+
+class BenchEnv(object):
+    """
+    ベンチマーク関数に渡す実行環境。計測はmeasure()のブロック内のみ（データ生成は含めない）。
+    """
+
+    def __init__(self, p_dir, f_scale=1.0, i_seed=0):
+        self.p_dir = p_dir
+        self.f_scale = f_scale
+        self.i_seed = i_seed
+        self.f_sec = None
+        self.i_sql = None
+        self.l_con = []
+
+    # 件数をスケールに合わせる
+    def scaled(self, n):
+        return max(1, int(n * self.f_scale))
+
+    # 一時ディレクトリにDBを生成して接続する
+    def connect(self, s_name="bench.sqlite"):
+        from mod_spatialite import SpatiaLiteConnection
+
+        con = SpatiaLiteConnection(os.path.join(self.p_dir, s_name))
+        self.l_con.append(con)
+        return con
+
+    # ブロックの所要時間と、conで実行されたSQLの数を記録する
+    @contextlib.contextmanager
+    def measure(self, con=None):
+        l_count = [0]
+        if con is not None:
+
+            def count(_):
+                l_count[0] += 1
+
+            con.set_trace_callback(count)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.f_sec = time.perf_counter() - t0
+            if con is not None:
+                con.set_trace_callback(None)
+                self.i_sql = l_count[0]
+
+    def close(self):
+        for con in self.l_con:
+            con.close()
+
+
+# ポリゴンのシェープファイル（.shp, .shx, .dbf）を書き出す
+def write_polygon_shp(p_base, ll_ring, l_name):
+    l_content = []
+    for l_ring in ll_ring:
+        l_xy = [xy for ring in l_ring for xy in ring]
+        l_x = [xy[0] for xy in l_xy]
+        l_y = [xy[1] for xy in l_xy]
+        l_part = []
+        i = 0
+        for ring in l_ring:
+            l_part.append(i)
+            i += len(ring)
+        l_content.append(
+            struct.pack(
+                "<i4d2i",
+                5,
+                min(l_x),
+                min(l_y),
+                max(l_x),
+                max(l_y),
+                len(l_ring),
+                len(l_xy),
+            )
+            + struct.pack(f"<{len(l_part)}i", *l_part)
+            + struct.pack(f"<{len(l_xy) * 2}d", *[v for xy in l_xy for v in xy])
+        )
+    l_x = [xy[0] for l_ring in ll_ring for ring in l_ring for xy in ring]
+    l_y = [xy[1] for l_ring in ll_ring for ring in l_ring for xy in ring]
+    t_bbox = (min(l_x), min(l_y), max(l_x), max(l_y), 0.0, 0.0, 0.0, 0.0)
+
+    def header(i_len_byte):
+        return struct.pack(">7i", 9994, 0, 0, 0, 0, 0, i_len_byte // 2) + struct.pack(
+            "<2i8d", 1000, 5, *t_bbox
+        )
+
+    b_rec = b"".join(
+        [struct.pack(">2i", i, len(b) // 2) + b for i, b in enumerate(l_content, 1)]
+    )
+    with open(p_base + ".shp", "wb") as f:
+        f.write(header(100 + len(b_rec)) + b_rec)
+
+    b_shx = b""
+    i_offset = 100
+    for b in l_content:
+        b_shx += struct.pack(">2i", i_offset // 2, len(b) // 2)
+        i_offset += 8 + len(b)
+    with open(p_base + ".shx", "wb") as f:
+        f.write(header(100 + len(b_shx)) + b_shx)
+
+    # 属性は名称（C, 16）のみ
+    i_len_rec = 1 + 16
+    b_dbf = struct.pack("<B3BIHH20x", 3, 124, 1, 1, len(l_name), 32 + 32 + 1, i_len_rec)
+    b_dbf += struct.pack("<11sc4xBB14x", b"name", b"C", 16, 0) + b"\r"
+    b_dbf += b"".join([b" " + s.encode("utf-8")[:16].ljust(16) for s in l_name])
+    with open(p_base + ".dbf", "wb") as f:
+        f.write(b_dbf + b"\x1a")
+
+
+# 星形のポリゴンを乱数で生成する
+def make_polygons(n, i_seed, t_extent=T_EXTENT, i_vertices=8):
+    import math
+
+    rnd = random.Random(i_seed)
+    minx, miny, maxx, maxy = t_extent
+    f_size = (maxx - minx) / max(math.sqrt(n), 1.0) / 4.0
+    ll_ring = []
+    for _ in range(n):
+        x = rnd.uniform(minx, maxx)
+        y = rnd.uniform(miny, maxy)
+        l_xy = []
+        for i in range(i_vertices):  # シェープファイルの外周は時計回り
+            f_angle = -2.0 * math.pi * i / i_vertices
+            f_r = f_size * rnd.uniform(0.5, 1.0)
+            l_xy.append((x + f_r * math.cos(f_angle), y + f_r * math.sin(f_angle)))
+        ll_ring.append([l_xy + [l_xy[0]]])
+    return ll_ring
+
+
+# ---- ベンチマーク（戻り値は(処理件数, 単位)） ----
+
+
+def bench_mesh_index(env):
+    import mod_standardmesh as mod_stdms
+
+    rnd = random.Random(env.i_seed)
+    n = env.scaled(200000)
+    l_xy = [(rnd.uniform(122.0, 154.0), rnd.uniform(20.0, 46.0)) for _ in range(n)]
+    with env.measure():
+        for x, y in l_xy:
+            mod_stdms.get_mesh_index(x, y, 3)
+    return n, "points"
+
+
+def bench_mesh_index_array(env):
+    import numpy as np
+    import mod_standardmesh as mod_stdms
+
+    rng = np.random.default_rng(env.i_seed)
+    n = env.scaled(2000000)
+    a_lon = rng.uniform(122.0, 154.0, n)
+    a_lat = rng.uniform(20.0, 46.0, n)
+    with env.measure():
+        mod_stdms.get_mesh_index_array(a_lon, a_lat, 3)
+    return n, "points"
+
+
+def bench_meshlist_extent(env):
+    import mod_standardmesh as mod_stdms
+
+    f_deg = 2.0 * env.f_scale**0.5
+    with env.measure():
+        l_mesh = mod_stdms.get_meshlist_from_extent(
+            139.0, 35.0, 139.0 + f_deg, 35.0 + f_deg, 3
+        )
+    return len(l_mesh), "meshes"
+
+
+def bench_generate_stdmesh(env):
+    con = env.connect()
+    f_deg = 2.0 * env.f_scale**0.5
+    with env.measure(con):
+        con.generate_stdmesh(
+            "stdmesh", (35.0 + f_deg, 139.0 + f_deg, 35.0, 139.0), mesh_level=3
+        )
+    return con.execute("""SELECT count(*) FROM "stdmesh";""").fetchone()[0], "meshes"
+
+
+def prepare_shps(env, n_file=4):
+    import zipfile
+
+    n = env.scaled(100000) // n_file + 1
+    p_zipdir = os.path.join(env.p_dir, "zips")
+    os.makedirs(p_zipdir, exist_ok=True)
+    for i_file in range(n_file):
+        s_name = f"poly_{i_file}"
+        p_base = os.path.join(env.p_dir, s_name)
+        write_polygon_shp(
+            p_base,
+            make_polygons(n, env.i_seed + i_file),
+            [f"{s_name}_{i}" for i in range(n)],
+        )
+        with zipfile.ZipFile(os.path.join(p_zipdir, s_name + ".zip"), "w") as zf:
+            for s_ext in (".shp", ".shx", ".dbf"):
+                zf.write(p_base + s_ext, s_name + s_ext)
+    return p_zipdir, n * n_file
+
+
+def bench_shp2spatialite(env):
+    p_zipdir, n = prepare_shps(env)
+    con = env.connect()
+    with env.measure(con):
+        con.zipshps2spatialite(p_zipdir, "merged", 4612, "utf-8")
+    return n, "features"
+
+
+def bench_shp2spatialite_stream(env):
+    p_zipdir, n = prepare_shps(env)
+    con = env.connect()
+    with env.measure(con):
+        con.zipshps2spatialite(p_zipdir, "merged", 4612, "utf-8", flg_stream=True)
+    return n, "features"
+
+
+def bench_nearest_neighbour(env):
+    from mod_spatialite import GTBL
+
+    con = env.connect()
+    n = env.scaled(20000)
+    gt_src = con.create_synthetic_data(
+        GTBL(con, "src", 4612, "pt"), n, i_seed=env.i_seed
+    )
+    gt_dst = con.create_synthetic_data(
+        GTBL(con, "dst", 4612, "pt"), n, i_seed=env.i_seed + 1
+    )
+    con.add_column(gt_src.name, "nn_id", "INTEGER")
+    with env.measure(con):
+        con.get_nearest_neighbour(gt_src, gt_dst, "nn_id")
+    return n, "points"
+
+
+def bench_split_line_equidistant(env):
+    from mod_spatialite import GTBL
+
+    con = env.connect()
+    n = env.scaled(5000)
+    gt_line = con.create_synthetic_data(
+        GTBL(con, "lines", 4612, "ln"), n, i_seed=env.i_seed
+    )
+    with env.measure(con):
+        con.split_line_equidistant(gt_line, "eqpoints", 100)
+    return n, "lines"
+
+
+def bench_rename_geomcol(env):
+    from mod_spatialite import GTBL
+
+    con = env.connect()
+    n = env.scaled(200000)
+    gt = con.create_synthetic_data(GTBL(con, "pts", 4612, "pt"), n, i_seed=env.i_seed)
+    with env.measure(con):
+        con.rename_geomcol(gt, s_gc_dst="geom_renamed")
+    return n, "rows"
+
+
+def bench_routing_nearest_netpoint(env):
+    from mod_spatialite import GTBL
+
+    con = env.connect()
+    n_node = env.scaled(20000)
+    n_query = env.scaled(200)
+    gt_node = con.create_synthetic_data(
+        GTBL(con, "nodes", 4612, "pt"), n_node, i_seed=env.i_seed
+    )
+    rnd = random.Random(env.i_seed + 1)
+    l_xy = [
+        (rnd.uniform(T_EXTENT[0], T_EXTENT[2]), rnd.uniform(T_EXTENT[1], T_EXTENT[3]))
+        for _ in range(n_query)
+    ]
+    with env.measure(con):
+        for x, y in l_xy:
+            con.routing_get_nearest_netpoint(gt_node, x, y)
+    return n_query, "queries"
+
+
+def bench_load_points(env):
+    import numpy as np
+    from mod_spatialite import GTBL
+
+    con = env.connect()
+    n = env.scaled(1000000)
+    rng = np.random.default_rng(env.i_seed)
+    x = rng.uniform(T_EXTENT[0], T_EXTENT[2], n)
+    y = rng.uniform(T_EXTENT[1], T_EXTENT[3], n)
+    d_attr = {"sensor_id": rng.integers(0, 1000, n), "value": rng.random(n)}
+    with env.measure(con):
+        con.load_points(GTBL(con, "pts", 4612, "pt"), x, y, d_attr=d_attr)
+    return n, "points"
+
+
+# ベンチマーク名: (関数, SpatiaLiteが必要か)
+BENCHMARKS = {
+    "mesh_index": (bench_mesh_index, False),
+    "mesh_index_array": (bench_mesh_index_array, False),
+    "meshlist_extent": (bench_meshlist_extent, False),
+    "generate_stdmesh": (bench_generate_stdmesh, True),
+    "shp2spatialite": (bench_shp2spatialite, True),
+    "shp2spatialite_stream": (bench_shp2spatialite_stream, True),
+    "nearest_neighbour": (bench_nearest_neighbour, True),
+    "split_line_equidistant": (bench_split_line_equidistant, True),
+    "rename_geomcol": (bench_rename_geomcol, True),
+    "routing_nearest_netpoint": (bench_routing_nearest_netpoint, True),
+    "load_points": (bench_load_points, True),
+}
+
+
+# 1つのベンチマークを実行する（別プロセスで呼ばれる）
+def run_one(s_name, f_scale, i_seed):
+    func, flg_spatialite = BENCHMARKS[s_name]
+    d_result = {"status": "ok"}
+    with tempfile.TemporaryDirectory(prefix="bench_") as p_dir:
+        env = BenchEnv(p_dir, f_scale, i_seed)
+        with contextlib.redirect_stdout(io.StringIO()):  # 処理中の出力は表示しない
+            # SpatiaLiteが読み込めない場合はスキップする
+            if flg_spatialite:
+                try:
+                    env.connect("check.sqlite")
+                except Exception as e:
+                    d_result.update(
+                        {"status": "skipped", "reason": f"SpatiaLite unavailable: {e}"}
+                    )
+                finally:
+                    env.close()
+                    env.l_con = []
+
+            try:
+                if d_result["status"] == "ok":
+                    n, s_unit = func(env)
+                    d_result.update(
+                        {
+                            "n": n,
+                            "unit": s_unit,
+                            "sec": env.f_sec,
+                            "throughput": n / env.f_sec if env.f_sec else None,
+                            "sql_count": env.i_sql,
+                        }
+                    )
+            except ImportError as e:
+                d_result.update({"status": "skipped", "reason": str(e)})
+            except Exception as e:
+                d_result.update(
+                    {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+                )
+            finally:
+                env.close()
+    d_result["peak_rss_mb"] = get_peak_rss_mb()
+
+    return d_result
+
+
+# ベンチマークを実行して結果の辞書を返す
+def run(l_name, f_scale=1.0, i_repeat=1, i_seed=0):
+    d_out = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": __import__("sqlite3").sqlite_version,
+            "scale": f_scale,
+            "repeat": i_repeat,
+            "seed": i_seed,
+        },
+        "results": {},
+    }
+    for s_name in l_name:
+        l_result = []
+        for _ in range(i_repeat):
+            # ピークRSSを分けるため、毎回新しいプロセスで実行する
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+                l_result.append(
+                    executor.submit(run_one, s_name, f_scale, i_seed).result()
+                )
+            if l_result[-1]["status"] != "ok":
+                break
+        l_ok = [d for d in l_result if d["status"] == "ok"]
+        d_result = min(l_ok, key=lambda d: d["sec"]) if l_ok else l_result[-1]
+        d_out["results"][s_name] = d_result
+        print_result(s_name, d_result)
+
+    return d_out
+
+
+def print_result(s_name, d):
+    if d["status"] != "ok":
+        print(f"{s_name:<26} {d['status']}: {d.get('reason', '')}")
+        return
+    s_rss = f"{d['peak_rss_mb']:.0f} MB" if d["peak_rss_mb"] is not None else "-"
+    s_sql = d["sql_count"] if d["sql_count"] is not None else "-"
+    print(
+        f"{s_name:<26} {d['n']:>9} {d['unit']:<8} {d['sec']:>8.3f} s "
+        f"{d['throughput']:>12.0f} /s  rss {s_rss:>8}  sql {s_sql}"
+    )
+
+
+# ベースラインと比較して、劣化したベンチマークの名称のリストを返す
+def compare(d_base, d_curr, f_threshold=0.1):
+    """
+    スループットが(1 - f_threshold)倍を下回るものを劣化とする。
+    ピークRSS・SQLの実行数が(1 + f_threshold)倍を超えるものは警告として表示する。
+    """
+
+    l_regression = []
+    print(f"{'benchmark':<26} {'base /s':>12} {'curr /s':>12} {'ratio':>7}")
+    for s_name, d_c in d_curr["results"].items():
+        d_b = d_base["results"].get(s_name)
+        if d_b is None or d_b["status"] != "ok" or d_c["status"] != "ok":
+            print(f"{s_name:<26} (not comparable)")
+            continue
+        f_ratio = d_c["throughput"] / d_b["throughput"]
+        l_flag = []
+        if f_ratio < 1.0 - f_threshold:
+            l_flag.append("REGRESSION")
+            l_regression.append(s_name)
+        elif f_ratio > 1.0 + f_threshold:
+            l_flag.append("improved")
+        for s_key in ("peak_rss_mb", "sql_count"):
+            if (
+                d_b.get(s_key)
+                and d_c.get(s_key)
+                and d_c[s_key] > d_b[s_key] * (1.0 + f_threshold)
+            ):
+                l_flag.append(f"{s_key} {d_b[s_key]:.0f} -> {d_c[s_key]:.0f}")
+        print(
+            f"{s_name:<26} {d_b['throughput']:>12.0f} {d_c['throughput']:>12.0f} "
+            f"{f_ratio:>7.2f}  {', '.join(l_flag)}"
+        )
+    if d_base["meta"].get("scale") != d_curr["meta"].get("scale"):
+        print("warning: baseline and current were run with different scales.")
+
+    return l_regression
+
+
+def main(l_arg=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p_run = subparsers.add_parser("run", help="run benchmarks")
+    p_run.add_argument("--only", help="comma separated benchmark names")
+    p_run.add_argument("--scale", type=float, default=1.0)
+    p_run.add_argument("--repeat", type=int, default=1, help="best of N runs")
+    p_run.add_argument("--seed", type=int, default=0)
+    p_run.add_argument("--out", help="output JSON path")
+    p_run.add_argument("--compare", help="baseline JSON path")
+    p_run.add_argument("--threshold", type=float, default=0.1)
+
+    p_cmp = subparsers.add_parser("compare", help="compare two JSON results")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args(l_arg)
+
+    if args.command == "run":
+        l_name = list(BENCHMARKS) if args.only is None else args.only.split(",")
+        for s_name in l_name:
+            if s_name not in BENCHMARKS:
+                parser.error(
+                    f"unknown benchmark: {s_name} (choose from {', '.join(BENCHMARKS)})"
+                )
+        d_curr = run(l_name, args.scale, args.repeat, args.seed)
+        if args.out is not None:
+            with open(args.out, "w") as f:
+                json.dump(d_curr, f, indent=2)
+            print(f"results were written to {args.out}")
+        if args.compare is None:
+            return 0
+        with open(args.compare) as f:
+            d_base = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            d_base = json.load(f)
+        with open(args.current) as f:
+            d_curr = json.load(f)
+
+    l_regression = compare(d_base, d_curr, args.threshold)
+    if l_regression:
+        print(f"regressions: {', '.join(l_regression)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SpatiaLiteのジオメトリBLOBの取り扱いに関するモジュール
+SQL関数（MakePoint, GeomFromText等）を経由せずにPython側でBLOBを組み立て・読み取る。conを必要としない。
+
+BLOBの構成（リトルエンディアン）:
+  0x00, 0x01(endian), SRID(int32), MBR(minx, miny, maxx, maxy: double), 0x7C,
+  クラス(int32), ジオメトリ本体, 0xFE
+  マルチジオメトリの各要素は 0x69, クラス(int32), 要素本体 の形で並ぶ。
+ref: https://www.gaia-gis.it/gaia-sins/BLOB-Geometry.html
+"""
+
+import array
+import struct
+
+# ジオメトリタイプとクラス番号
+GEOM_CLASS = {
+    "POINT": 1,
+    "LINESTRING": 2,
+    "POLYGON": 3,
+    "MULTIPOINT": 4,
+    "MULTILINESTRING": 5,
+    "MULTIPOLYGON": 6,
+}
+
+
+# 座標列（[(x, y), ...]）をbytesにする
+def pack_coords(l_xy) -> bytes:
+    l_flat = [v for xy in l_xy for v in xy[:2]]
+    return struct.pack(f"<{len(l_flat)}d", *l_flat)
+
+
+# ジオメトリ本体（クラス番号より後ろ）をbytesにする
+def pack_body(s_type: str, geom) -> bytes:
+    if s_type == "POINT":  # geom: (x, y)
+        return struct.pack("<2d", geom[0], geom[1])
+    elif s_type == "LINESTRING":  # geom: [(x, y), ...]
+        return struct.pack("<i", len(geom)) + pack_coords(geom)
+    elif s_type == "POLYGON":  # geom: [外周, 内周, ...]
+        return struct.pack("<i", len(geom)) + b"".join(
+            [struct.pack("<i", len(ring)) + pack_coords(ring) for ring in geom]
+        )
+    elif s_type.startswith("MULTI"):  # geom: [要素, ...]
+        s_type_elem = s_type[5:]
+        i_class_elem = GEOM_CLASS[s_type_elem]
+        return struct.pack("<i", len(geom)) + b"".join(
+            [
+                struct.pack("<Bi", 0x69, i_class_elem) + pack_body(s_type_elem, elem)
+                for elem in geom
+            ]
+        )
+    else:
+        raise ValueError(f"unsupported geometry type: {s_type}")
+
+
+# ジオメトリの全座標を列挙する
+def iter_coords(s_type: str, geom):
+    if s_type == "POINT":
+        yield geom
+    elif s_type == "LINESTRING":
+        yield from geom
+    elif s_type == "POLYGON":
+        for ring in geom:
+            yield from ring
+    else:
+        for elem in geom:
+            yield from iter_coords(s_type[5:], elem)
+
+
+# ジオメトリ（XY）をSpatiaLiteのBLOBにする
+def encode_geometry(s_type: str, geom, i_srid: int, t_mbr: tuple = None) -> bytes:
+    """
+    :param s_type: POINT, LINESTRING, POLYGON, MULTIPOINT, MULTILINESTRING, MULTIPOLYGON
+    :param geom: 座標のタプル・リストの入れ子（WKTと同じ構造）
+    :param i_srid: SRID
+    :param t_mbr: (minx, miny, maxx, maxy)。既知であれば与えると座標の走査を省略する
+    :return: SpatiaLiteのジオメトリBLOB
+    """
+
+    if t_mbr is None:
+        l_x = []
+        l_y = []
+        for xy in iter_coords(s_type, geom):
+            l_x.append(xy[0])
+            l_y.append(xy[1])
+        t_mbr = (min(l_x), min(l_y), max(l_x), max(l_y))
+
+    return (
+        struct.pack("<BBi4dBi", 0x00, 0x01, i_srid, *t_mbr, 0x7C, GEOM_CLASS[s_type])
+        + pack_body(s_type, geom)
+        + b"\xfe"
+    )
+
+
+# 点のBLOBを生成する（高速化のため専用）
+def encode_point(x: float, y: float, i_srid: int) -> bytes:
+    return struct.pack(
+        "<BBi4dBi2dB", 0x00, 0x01, i_srid, x, y, x, y, 0x7C, 1, x, y, 0xFE
+    )
+
+
+# 点のBLOBを座標の配列からまとめて生成する（NumPy）
+def encode_points(x, y, i_srid: int, z=None) -> list:
+    """
+    BLOBと同じ並びの構造化配列に書き込み、固定長のbytesに切り分ける（点ごとのstruct.packを行わない）。
+    :param x: x座標の配列
+    :param y: y座標の配列
+    :param i_srid: SRID
+    :param z: z座標の配列。与えるとPOINT Z
+    :return: BLOBのリスト。x, yのどちらかがNaNの点はNone
+    """
+    import numpy as np
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    i_dim = 2 if z is None else 3
+    dt = np.dtype(
+        [
+            ("start", "u1"),
+            ("endian", "u1"),
+            ("srid", "<i4"),
+            ("mbr", "<f8", (4,)),
+            ("mbr_end", "u1"),
+            ("class", "<i4"),
+            ("coords", "<f8", (i_dim,)),
+            ("end", "u1"),
+        ]
+    )
+    a = np.empty(len(x), dtype=dt)
+    a["start"] = 0x00
+    a["endian"] = 0x01
+    a["srid"] = i_srid
+    a["mbr"][:, 0] = a["mbr"][:, 2] = a["coords"][:, 0] = x
+    a["mbr"][:, 1] = a["mbr"][:, 3] = a["coords"][:, 1] = y
+    if z is not None:
+        a["coords"][:, 2] = np.asarray(z, dtype=np.float64)
+    a["mbr_end"] = 0x7C
+    a["class"] = GEOM_CLASS["POINT"] + (0 if z is None else 1000)
+    a["end"] = 0xFE
+
+    # 末尾が0xFEなので、固定長bytesとして見ても末尾の0x00は切り詰められない
+    l_blob = a.view(f"S{dt.itemsize}").tolist()
+    for i in np.flatnonzero(np.isnan(x) | np.isnan(y)):
+        l_blob[i] = None
+    return l_blob
+
+
+# 座標の次元（ジオメトリタイプの接尾辞）とクラス番号の加算値
+DIM_CLASS = {
+    "": (2, 0),
+    "Z": (3, 1000),
+    "M": (3, 2000),
+    "ZM": (4, 3000),
+}
+
+
+# BLOBのヘッダーを読み取る
+def read_header(blob) -> tuple:
+    """
+    :return: (s_endian, i_srid, t_mbr, i_class)。s_endianはstructの書式（"<" or ">"）
+    """
+
+    if len(blob) < 44 or blob[0] != 0x00 or blob[38] != 0x7C or blob[-1] != 0xFE:
+        raise ValueError("not a SpatiaLite geometry BLOB")
+    s_endian = "<" if blob[1] == 0x01 else ">"
+    i_srid, minx, miny, maxx, maxy = struct.unpack_from(f"{s_endian}i4d", blob, 2)
+    i_class = struct.unpack_from(f"{s_endian}i", blob, 39)[0]
+    return s_endian, i_srid, (minx, miny, maxx, maxy), i_class
+
+
+# BLOBの要素数を得る（MULTI・COLLECTION以外は1）
+def read_num_parts(blob) -> int:
+    s_endian, _, _, i_class = read_header(blob)
+    if i_class % 1000 in (4, 5, 6, 7):
+        return struct.unpack_from(f"{s_endian}i", blob, 43)[0]
+    return 1
+
+
+# BLOBのリストを列指向の配列（座標とオフセット）にする
+def decode_columns(l_blob, s_type: str) -> dict:
+    """
+    ジオメトリごとのオブジェクトを作らず、座標のbytesを連結して1つの配列にする。
+    座標はs_typeの次元（XY, XYZ, XYM, XYZM）のまま。圧縮ジオメトリ（CompressGeometry）は扱わない。
+    :param l_blob: BLOB（NULLはNone）のリスト。全て同じジオメトリタイプであること
+    :param s_type: ジオメトリタイプ（GTBL.type。"POINT", "MULTIPOLYGON", "POINT Z"等）
+    :return: {
+        "coords": 座標（n_coord, 次元数）。POINTは行ごとに1点で、NULLはNaN,
+        "geom_offsets": 行ごとの要素の範囲（n + 1）。POINT以外
+            LINESTRING, MULTIPOINT: coordsの添字、POLYGON: ringの添字、MULTI(LINESTRING|POLYGON): partの添字,
+        "part_offsets": partごとの範囲。MULTILINESTRING: coordsの添字、MULTIPOLYGON: ringの添字,
+        "ring_offsets": リングごとのcoordsの範囲。POLYGON, MULTIPOLYGON,
+        "mbr": ヘッダーのMBR（n, 4）。NULLはNaN,
+        "valid": NULLでない行（n,）,
+    }
+    """
+    import numpy as np
+
+    l_type = s_type.upper().split()
+    s_base = l_type[0]
+    s_dim = l_type[1] if len(l_type) > 1 else ""
+    if s_base not in GEOM_CLASS or s_dim not in DIM_CLASS:
+        raise ValueError(f"unsupported geometry type: {s_type}")
+    i_dim, i_class_dim = DIM_CLASS[s_dim]
+    i_class = GEOM_CLASS[s_base] + i_class_dim
+    i_width = i_dim * 8
+    b_nan = struct.pack(f"<{i_dim}d", *[float("nan")] * i_dim)
+
+    n = len(l_blob)
+    a_mbr = np.full((n, 4), np.nan)
+    a_valid = np.zeros(n, dtype=bool)
+    l_buf = []
+    l_geom_off = [0]
+    l_part_off = [0]
+    l_ring_off = [0]
+    i_coord = 0
+
+    # 座標列を取り込む
+    def read_coords(mv, s_endian, i_pos, i_num):
+        nonlocal i_coord
+        i_end = i_pos + i_num * i_width
+        if s_endian == "<":
+            l_buf.append(mv[i_pos:i_end])
+        else:
+            a = array.array("d", mv[i_pos:i_end].tobytes())
+            a.byteswap()
+            l_buf.append(a.tobytes())
+        i_coord += i_num
+        return i_end
+
+    # LINESTRING（リング）の本体を取り込む
+    def read_line(mv, s_endian, i_pos):
+        i_num = struct.unpack_from(f"{s_endian}i", mv, i_pos)[0]
+        return read_coords(mv, s_endian, i_pos + 4, i_num)
+
+    # POLYGONの本体を取り込む
+    def read_polygon(mv, s_endian, i_pos):
+        n_ring = struct.unpack_from(f"{s_endian}i", mv, i_pos)[0]
+        i_pos += 4
+        for _ in range(n_ring):
+            i_pos = read_line(mv, s_endian, i_pos)
+            l_ring_off.append(i_coord)
+        return i_pos
+
+    for i, blob in enumerate(l_blob):
+        if blob is None:
+            if s_base == "POINT":
+                l_buf.append(b_nan)
+                i_coord += 1
+            else:
+                l_geom_off.append(l_geom_off[-1])
+            continue
+
+        s_endian, _, t_mbr, i_class_blob = read_header(blob)
+        if i_class_blob != i_class:
+            raise ValueError(
+                f"geometry class {i_class_blob} does not match {s_type} (row {i})"
+            )
+        a_mbr[i] = t_mbr
+        a_valid[i] = True
+
+        mv = memoryview(blob)
+        if s_base == "POINT":
+            read_coords(mv, s_endian, 43, 1)
+        elif s_base == "LINESTRING":
+            read_line(mv, s_endian, 43)
+            l_geom_off.append(i_coord)
+        elif s_base == "POLYGON":
+            read_polygon(mv, s_endian, 43)
+            l_geom_off.append(len(l_ring_off) - 1)
+        else:  # マルチジオメトリ: 要素ごとに 0x69, クラス, 本体
+            n_elem = struct.unpack_from(f"{s_endian}i", mv, 43)[0]
+            i_pos = 47
+            for _ in range(n_elem):
+                i_pos += 5
+                if s_base == "MULTIPOINT":
+                    i_pos = read_coords(mv, s_endian, i_pos, 1)
+                elif s_base == "MULTILINESTRING":
+                    i_pos = read_line(mv, s_endian, i_pos)
+                    l_part_off.append(i_coord)
+                else:
+                    i_pos = read_polygon(mv, s_endian, i_pos)
+                    l_part_off.append(len(l_ring_off) - 1)
+            l_geom_off.append(
+                i_coord if s_base == "MULTIPOINT" else len(l_part_off) - 1
+            )
+
+    d_col = {
+        "coords": np.frombuffer(bytearray().join(l_buf), dtype="<f8").reshape(
+            -1, i_dim
+        ),
+        "mbr": a_mbr,
+        "valid": a_valid,
+    }
+    if s_base != "POINT":
+        d_col["geom_offsets"] = np.array(l_geom_off, dtype=np.int64)
+    if s_base in ("MULTILINESTRING", "MULTIPOLYGON"):
+        d_col["part_offsets"] = np.array(l_part_off, dtype=np.int64)
+    if s_base in ("POLYGON", "MULTIPOLYGON"):
+        d_col["ring_offsets"] = np.array(l_ring_off, dtype=np.int64)
+
+    return d_col
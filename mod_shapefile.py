@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+シェープファイル（.shp, .dbf）を読み込むモジュール
+ZIPに格納されたままのシェープファイルを展開せずに読み込み、SpatiaLiteのBLOBに変換した行を返す。
+conを必要としないため、プロセスプールのワーカーからも呼び出せる。
+座標はXYのみを扱う（Z, Mは読み飛ばす）。
+"""
+
+import os
+import struct
+import time
+import zipfile
+
+import mod_geomblob
+
+# シェープタイプ（Z, M付きを含む）とジオメトリタイプ（SpatiaLite側）
+SHAPE_TYPE = {
+    1: "POINT",
+    11: "POINT",
+    21: "POINT",
+    3: "MULTILINESTRING",
+    13: "MULTILINESTRING",
+    23: "MULTILINESTRING",
+    5: "MULTIPOLYGON",
+    15: "MULTIPOLYGON",
+    25: "MULTIPOLYGON",
+    8: "MULTIPOINT",
+    18: "MULTIPOINT",
+    28: "MULTIPOINT",
+}
+
+# ジオメトリタイプとGTBLの型の略称
+TYPE_ABR = {
+    "POINT": "pt",
+    "MULTIPOINT": "mpt",
+    "MULTILINESTRING": "mln",
+    "MULTIPOLYGON": "mpg",
+}
+
+
+# ソース（.zip or .shp）に含まれるシェープファイルを列挙する
+def list_shp(p_src: str) -> list:
+    """
+    :param p_src: zipファイル or shpファイルのパス
+    :return: [(p_src, s_member), ...]。shpファイルの場合はs_memberがNone
+    """
+
+    if p_src.lower().endswith(".zip"):
+        with zipfile.ZipFile(p_src) as zf:
+            return [
+                (p_src, s_member)
+                for s_member in sorted(zf.namelist())
+                if s_member.lower().endswith(".shp")
+            ]
+    else:
+        return [(p_src, None)]
+
+
+# シェープファイルと付属ファイル（.dbf）のbytesを取得する
+def read_shp_bytes(p_src: str, s_member: str = None) -> tuple:
+    """
+    :return: (b_shp, b_dbf)。dbfが無い場合はb_dbfがNone
+    """
+
+    if s_member is None:
+        s_base = os.path.splitext(p_src)[0]
+        with open(p_src, "rb") as f:
+            b_shp = f.read()
+        b_dbf = None
+        for s_ext in (".dbf", ".DBF"):
+            if os.path.exists(s_base + s_ext):
+                with open(s_base + s_ext, "rb") as f:
+                    b_dbf = f.read()
+                break
+        return b_shp, b_dbf
+
+    with zipfile.ZipFile(p_src) as zf:
+        d_member = {s.lower(): s for s in zf.namelist()}
+        b_shp = zf.read(s_member)
+        s_dbf = d_member.get(os.path.splitext(s_member)[0].lower() + ".dbf")
+        b_dbf = zf.read(s_dbf) if s_dbf is not None else None
+    return b_shp, b_dbf
+
+
+# 点がリングの内側にあるか判定する（レイキャスティング）
+def ch_point_in_ring(x: float, y: float, l_ring: list) -> bool:
+    flg_in = False
+    n = len(l_ring)
+    for i in range(n):
+        x1, y1 = l_ring[i]
+        x2, y2 = l_ring[i - 1]
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            flg_in = not flg_in
+    return flg_in
+
+
+# シェープファイルのリング群をポリゴン群に分ける
+def group_rings(l_ring: list) -> list:
+    """
+    シェープファイルでは外周が時計回り、内周が反時計回り。
+    内周は自身を含む外周に、含む外周が見つからない場合は直前の外周に割り当てる。
+    """
+
+    l_outer = []
+    l_inner = []
+    for ring in l_ring:
+        f_area2 = sum(
+            [
+                ring[i - 1][0] * ring[i][1] - ring[i][0] * ring[i - 1][1]
+                for i in range(len(ring))
+            ]
+        )
+        if f_area2 <= 0 or not l_outer:
+            l_outer.append([ring])
+        else:
+            l_inner.append((ring, l_outer[-1]))
+
+    for ring, poly_prev in l_inner:
+        poly_dst = poly_prev
+        if len(l_outer) > 1:
+            x, y = ring[0]
+            for poly in l_outer:
+                if ch_point_in_ring(x, y, poly[0]):
+                    poly_dst = poly
+                    break
+        poly_dst.append(ring)
+    return l_outer
+
+
+# .shpのbytesから、ジオメトリタイプとBLOBのリストを得る
+def parse_shp(b_shp: bytes, i_srid: int) -> tuple:
+    """
+    :return: (s_geomtype, l_blob)。NULLシェープはNone
+    """
+
+    i_shape_type = struct.unpack_from("<i", b_shp, 32)[0]
+    if i_shape_type not in SHAPE_TYPE:
+        raise ValueError(f"unsupported shape type: {i_shape_type}")
+    s_geomtype = SHAPE_TYPE[i_shape_type]
+
+    l_blob = []
+    i_pos = 100
+    n_byte = len(b_shp)
+    while i_pos + 8 <= n_byte:
+        i_len = struct.unpack_from(">i", b_shp, i_pos + 4)[0] * 2
+        i_rec = i_pos + 8
+        i_pos = i_rec + i_len
+        i_type = struct.unpack_from("<i", b_shp, i_rec)[0]
+        if i_type == 0:
+            l_blob.append(None)
+            continue
+
+        if s_geomtype == "POINT":
+            x, y = struct.unpack_from("<2d", b_shp, i_rec + 4)
+            l_blob.append(mod_geomblob.encode_point(x, y, i_srid))
+            continue
+
+        t_mbr = struct.unpack_from("<4d", b_shp, i_rec + 4)
+        if s_geomtype == "MULTIPOINT":
+            n_pt = struct.unpack_from("<i", b_shp, i_rec + 36)[0]
+            l_v = struct.unpack_from(f"<{n_pt * 2}d", b_shp, i_rec + 40)
+            geom = list(zip(l_v[0::2], l_v[1::2]))
+        else:
+            n_part, n_pt = struct.unpack_from("<2i", b_shp, i_rec + 36)
+            l_part = list(struct.unpack_from(f"<{n_part}i", b_shp, i_rec + 44))
+            l_v = struct.unpack_from(f"<{n_pt * 2}d", b_shp, i_rec + 44 + n_part * 4)
+            l_xy = list(zip(l_v[0::2], l_v[1::2]))
+            l_ring = [l_xy[i_s:i_e] for i_s, i_e in zip(l_part, l_part[1:] + [n_pt])]
+            geom = l_ring if s_geomtype == "MULTILINESTRING" else group_rings(l_ring)
+        l_blob.append(mod_geomblob.encode_geometry(s_geomtype, geom, i_srid, t_mbr))
+
+    return s_geomtype, l_blob
+
+
+# .dbfのbytesから、フィールド定義と属性値のリストを得る
+def parse_dbf(b_dbf: bytes, s_chcode: str = "CP932") -> tuple:
+    """
+    :return: (l_field, l_record, l_flg_deleted)
+        l_field: [(s_name, s_type_sql), ...]
+    """
+
+    n_rec, i_len_header, i_len_rec = struct.unpack_from("<IHH", b_dbf, 4)
+
+    l_fdef = []
+    i_pos = 32
+    i_offset = 1
+    while b_dbf[i_pos] != 0x0D:
+        s_name = b_dbf[i_pos : i_pos + 11].split(b"\x00")[0].decode(s_chcode)
+        s_ftype = chr(b_dbf[i_pos + 11])
+        i_flen, i_dec = b_dbf[i_pos + 16], b_dbf[i_pos + 17]
+        l_fdef.append((s_name, s_ftype, i_dec, i_offset, i_offset + i_flen))
+        i_offset += i_flen
+        i_pos += 32
+
+    l_field = []
+    for s_name, s_ftype, i_dec, _, _ in l_fdef:
+        if s_ftype in ("N", "F"):
+            s_type_sql = "INTEGER" if s_ftype == "N" and i_dec == 0 else "DOUBLE"
+        elif s_ftype == "L":
+            s_type_sql = "INTEGER"
+        else:
+            s_type_sql = "TEXT"
+        l_field.append((s_name, s_type_sql))
+
+    l_record = []
+    l_flg_deleted = []
+    for i in range(n_rec):
+        b_rec = b_dbf[i_len_header + i * i_len_rec : i_len_header + (i + 1) * i_len_rec]
+        l_flg_deleted.append(b_rec[:1] == b"*")
+        l_val = []
+        for (s_name, s_ftype, i_dec, i_s, i_e), (_, s_type_sql) in zip(l_fdef, l_field):
+            b_val = b_rec[i_s:i_e].strip(b" \x00")
+            if s_ftype in ("N", "F"):
+                try:
+                    val = int(b_val) if s_type_sql == "INTEGER" else float(b_val)
+                except ValueError:
+                    val = None
+            elif s_ftype == "L":
+                val = {b"Y": 1, b"T": 1, b"N": 0, b"F": 0}.get(b_val.upper())
+            else:
+                val = b_val.decode(s_chcode, errors="replace") if b_val else None
+            l_val.append(val)
+        l_record.append(tuple(l_val))
+
+    return l_field, l_record, l_flg_deleted
+
+
+# シェープファイルを読み込み、挿入用の行に変換する（プロセスプールのワーカー）
+def load_shp_rows(
+    p_src: str, s_member: str = None, s_chcode: str = "CP932", i_srid: int = 4612
+) -> dict:
+    """
+    :return: {
+        "name": シェープファイル名（拡張子なし）,
+        "geomtype": ジオメトリタイプ,
+        "fields": [(s_name, s_type_sql), ...],
+        "rows": [(属性値..., BLOB), ...],
+        "n_byte": 読み込んだバイト数,
+        "t_parse": 読込・変換に要した秒数,
+    }
+    """
+
+    t0 = time.perf_counter()
+    b_shp, b_dbf = read_shp_bytes(p_src, s_member)
+    s_geomtype, l_blob = parse_shp(b_shp, i_srid)
+
+    if b_dbf is not None:
+        l_field, l_record, l_flg_deleted = parse_dbf(b_dbf, s_chcode)
+    else:
+        l_field, l_record, l_flg_deleted = [], [()] * len(l_blob), [False] * len(l_blob)
+
+    l_row = [
+        rec + (blob,)
+        for rec, blob, flg_deleted in zip(l_record, l_blob, l_flg_deleted)
+        if not flg_deleted
+    ]
+
+    return {
+        "name": os.path.splitext(os.path.basename(s_member or p_src))[0],
+        "geomtype": s_geomtype,
+        "fields": l_field,
+        "rows": l_row,
+        "n_byte": len(b_shp) + (len(b_dbf) if b_dbf is not None else 0),
+        "t_parse": time.perf_counter() - t0,
+    }
@@ -1 +1 @@
-#!/usr/bin/env python# -*- coding: utf-8 -*-"""SpatiaLiteを利用する同じディレクトリにmod_spatialiteディレクトリを配置し、直下にmod_spatialiteほかを入れておく。mod_spatialite入手先：https://www.gaia-gis.it/gaia-sins/c.f.v4.3.0a win-x64: http://www.gaia-gis.it/gaia-sins/windows-bin-amd64/mod_spatialite-4.3.0a-win-amd64.7zv5.0.0beta win-x64: http://www.gaia-gis.it/gaia-sins/windows-bin-NEXTGEN-amd64/mod_spatialite-NG-win-amd64.7zAuthor: yoh_chan"""from __future__ import annotations  # 同モジュール内の別クラスを参照させるのに必要import osimport typesimport sqlite3import inspect# import pdb  # for debugprint("SpatiaLite modules was imported.")class SpatiaLiteConnection(sqlite3.Connection):    """    ref: https://stackoverflow.com/questions/23683886    ref: https://stackoverflow.com/questions/15556181    ref: https://codereview.stackexchange.com/questions/134535    fef: https://docs.python.jp/3/library/sqlite3.html#sqlite3.connect    """    def __init__(self, *args, p_mod_spatialite=None, **kwargs):        os.putenv("SPATIALITE_SECURITY", "relaxed")  # 2021-10-06 なんとこれで有効にできるらしい！        os.environ["SPATIALITE_SECURITY"] = "relaxed"        print(os.environ.get("SPATIALITE_SECURITY"))        # If no db file is exist, then create it.        if args[0] != ":memory:" and not os.path.isfile(args[0]):            print(("the db file {} is not exist and create it.".format(args[0])))            open(args[0], "w").close()        try:            if kwargs["acv"]:                if args[0] == ":memory:":                    print(                        "Connecting with memory db mode. You cannot archive existing data..."                    )                else:                    import shutil                    p_dir, s_db = os.path.split(args[0])                    shutil.copyfile(                        args[0],                        os.path.join(                            p_dir,                            "{}_acv{}".format(                                os.path.splitext(s_db)[0], os.path.splitext(s_db)[1]                            ),                        ),                    )                del kwargs["acv"]  # 辞書の要素を削除（そのまま残っているとsqlite3.ConnectionでInvalidになる。）        except KeyError:            pass        sqlite3.Connection.__init__(self, *args, **kwargs)  # 継承        self.p_mod_spatialite = p_mod_spatialite        s_ver = self.initialize()        print("Successfully connected to SQLite DB with mod_spatialite.")        print(("DB-path: {}".format(*args)))        print(("Spatialite version: {}".format(s_ver)))        # need to set proj db file SpatiaLite5<= and PROJ5<=        if float(s_ver[:3]) >= 5:            p_projdb = os.path.join(os.path.split(__file__)[0], "proj.db")            self.execute(f"""SELECT PROJ_SetDatabasePath('{p_projdb}');""")            print(self.execute(f"""SELECT PROJ_GetDatabasePath();""").fetchone()[0])            print(f"Successflly append proj.db path: {p_projdb}")    # mod_spatialiteの適用と初期化    def initialize(self, row_factory=sqlite3.Row):        # 辞書アクセスを可能にする http://docs.python.jp/2/library/sqlite3.html#row        # sqlite3.Row型でカーソルを利用できるようになる。行要素に対して列名による辞書アクセスが可能。        # .keys()で列名のリストも取得可能。        self.row_factory = row_factory  # 辞書アクセスしないならNoneを指定        # 自動コミットモードを有効にする        # http://docs.python.jp/2/library/sqlite3.html        self.isolation_level = None        # PATHの追加        if self.p_mod_spatialite is not None:            os.environ["PATH"] = f'{self.p_mod_spatialite};{os.environ["PATH"]}'            os.environ[                "PATH"            ] = f'{os.path.join(self.p_mod_spatialite, "mod_spatialite")};{os.environ["PATH"]}'        else:            p_mod = "C:/Dropbox/Files/Yoh_scripts/Git_yoh/mod_spatialite/mod_spatialite"            os.environ[                "PATH"            ] = f'{os.path.abspath(p_mod)};{"mod_spatialite"};{os.environ["PATH"]}'        # mod_spatialiteの読み込み        self.isolation_level = ""        self.enable_load_extension(True)        self.execute("SELECT load_extension('mod_spatialite');")        # メタデータを登録してSpatiaLiteDBとする。        self.execute("""SELECT InitSpatialMetaData(1);""")  # 1はトランザクション有効（高速）        self.isolation_level = None        # SpatiaLiteのバージョンを返す        return self.get_spatialite_version()    def get_spatialite_version(self):        """        SpatiaLiteのバージョンを返す        """        return self.execute("""SELECT spatialite_version();""").fetchone()[0]    # 切断    def disconnect(self, flg_vacuum=True, flg_upgrade=True):        if flg_vacuum:            print("vacuuming db...")            self.vacuum()        if flg_upgrade:            print("upgrading db...")            self.upgrade_db()        p_db = self.get_dbpath()        self.close()        print(("the database {} was successfully closed.".format(p_db)))    # begin    def begin(self):        self.execute("""BEGIN;""")    # vacuum    def vacuum(self):        self.execute("""vacuum;""")    # attach    def attach_db(self, p_db, s_alias="a"):        import os        if not os.path.isfile(p_db):            print(("oops... db file: {} is not exist.".format(p_db)))            return        sql = """attach database '{}' as {};""".format(os.path.abspath(p_db), s_alias)        # print(sql)        self.execute(sql)        print(            (                "attached database: {} into: {}".format(                    os.path.split(p_db)[1], os.path.split(self.get_dbpath())[1]                )            )        )    # detach    def detach_db(self, s_alias="a"):        sql = """detach database {};""".format(s_alias)        self.execute(sql)    # dbpathを得る    def get_dbpath(self, dbname="main"):        sql = """PRAGMA database_list;"""        ld_fetch = self.execute(sql).fetchall()        for d_fetch in ld_fetch:            if d_fetch["name"] == dbname:                return d_fetch["file"]            else:                pass        print(('no such table: "{}"'.format(dbname)))        return 0    # check Routing    def ch_able_routing(self):        import sys        print(("{}check routing libraries...".format(os.linesep)))        # check SpatiaLite version        sql = """SELECT spatialite_version();"""        try:            s_ver = self.execute(sql).fetchone()[0]        except self.OperationalError:            print(                "Error: spatialite version was not able to fetch... Did you mount mod_spatialite?"            )            sys.exit()        if int(s_ver[0]) < 5:            print(('mounted spatialite version "{}" is not suitable...'.format(s_ver)))            sys.exit()        # has VirtualRouting?        sql = """SELECT HasRouting();"""        try:            s_has = self.execute(sql).fetchone()[0]        except self.OperationalError:            print("Error: spatialite has not VirtualRouting... Please check libraries.")            sys.exit()        if int(s_has) != 1:            print("Error: VirtualRouting is not active... Sequences will be stopped.")            sys.exit()        print("check OK. routing available.")    # check table exists or not    def ch_exists_table(self, s_tbl):        result = self.get_tbllist(s_tbl)        if len(result) == 0:            return False        else:            return True    # check table exists or not    def ch_exists_col(self, gt_or_tbl, s_col=None):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name            s_col = gt_or_tbl.gc        else:            s_tbl = gt_or_tbl            if s_col is None:                print("if gt_or_tbl is not GTBL, s_col is mandatory.")        result = [d_colsinfo["name"] for d_colsinfo in self.get_columnsdef(s_tbl)]        if s_col in result:            return True        else:            return False    # update layer statistics    def update_layerstats(self, s_tbl=None, s_gc=None):        if s_gc is None:            if s_tbl is None:                self.execute("""SELECT UpdateLayerStatistics();""")            else:                self.execute("""SELECT UpdateLayerStatistics('{}');""".format(s_tbl))        else:            self.execute(                """SELECT UpdateLayerStatistics('{}', '{}');""".format(s_tbl, s_gc)            )    # update layer statistics    def upgrade_geomtriggers(self, flg_transaction=True):        self.execute(            """SELECT UpgradeGeometryTriggers({});""".format(flg_transaction * 1)        )    # upgrade database (free memory and update metadata)    def upgrade_db(self, flg_transaction=True):        self.update_layerstats()        self.upgrade_geomtriggers(flg_transaction)    # 連番を持つテーブルを生成する（カラムはPK_UID）をそのまま使用する    def create_sequential_data(self, s_tbl, limit):        self.create_table(s_tbl)        self.begin()        for n in range(limit):            self.execute("""insert into {} values (NULL);""".format(s_tbl))        self.commit()    # 長方形を生成する    def create_window(self, gt_window, l_nesw):        n = l_nesw[0]        e = l_nesw[1]        s = l_nesw[2]        w = l_nesw[3]        self.create_table(gt_window)        self.execute(            """            INSERT INTO "{tbl}" VALUES (NULL, BuildMbr({w}, {s}, {e}, {n}, {epsg}));        """.format(                tbl=gt_window.name, w=w, s=s, e=e, n=n, epsg=gt_window.epsg            )        )        return gt_window    # テーブルの生成（gtblを与えるとジオテーブルを生成する）    def create_table(        self, gt_or_tbl, ll_coldef=None, flg_pk=True, overwrite=True, flg_temp=False    ):        s_tbl = self.get_tblname(gt_or_tbl)        if overwrite:            self.drop_geotable(s_tbl)        if ll_coldef is None:            if flg_pk:                sql = """create table "{}" ("PK_UID" INTEGER PRIMARY KEY AUTOINCREMENT);""".format(                    s_tbl                )                if flg_temp:                    sql = sql.replace("create table", "create temp table")                self.execute(sql)            else:                print("You must give at least one of ll_coldef and flg_pk.")                return        else:            ll_coldef = [                [l_coldef[0], self.get_dtype(l_coldef[1])] for l_coldef in ll_coldef            ]            if flg_pk:                s_coldef = ", ".join(                    [""""PK_UID" INTEGER PRIMARY KEY AUTOINCREMENT"""]                    + [f""""{l_coldef[0]}" {l_coldef[1]}""" for l_coldef in ll_coldef]                )            else:                s_coldef = ", ".join(                    [f""""{l_coldef[0]}" {l_coldef[1]}""" for l_coldef in ll_coldef]                )            sql = f"""CREATE TABLE "{s_tbl}" ( {s_coldef} );"""            if flg_temp:                sql = sql.replace("create table", "create temp table")            self.execute(sql)        # ジオテーブルを生成する場合        if isinstance(gt_or_tbl, GTBL):            self.add_geomcol(gt_or_tbl)        return gt_or_tbl    # drop table    def drop_table(self, gt_or_tbl, db_prefix=None):        if self.get_spatialite_version() < "5.0.0":            print(                f"Spatialite version is older for DropTable ({self.get_spatialite_version()})."            )            print(f"So the prosess uses DropGeoTable instead.")            self.drop_geotable(gt_or_tbl, db_prefix=db_prefix)        else:            s_tbl = self.get_tblname(gt_or_tbl)            if db_prefix is None:                self.execute(f"""SELECT DropTable(NULL, '{s_tbl}', 1);""")            else:                self.execute(f"""SELECT DropTable('{db_prefix}', '{s_tbl}', 1);""")    # ジオテーブルの削除（ジオメトリがないテーブルでもよい）    def drop_geotable(self, gt_or_tbl, i_transaction=1, db_prefix=None):        if self.get_spatialite_version() < "5.0.0":            s_tbl = self.get_tblname(gt_or_tbl)            if db_prefix is None:                sql = f"""SELECT DropGeoTable('{s_tbl}', {i_transaction});"""            else:                sql = f"""SELECT DropGeoTable('{db_prefix}', '{s_tbl}', {i_transaction});"""            self.execute(sql)            # 何故かテーブル本体が削除されないので、こちらで削除            self.execute(f"""DROP TABLE IF EXISTS "{s_tbl}";""")  # deprecated        else:            print(                f"Spatialite version is newer for DropGeoTable ({self.get_spatialite_version()})."            )            print(f"So the prosess uses DropTable instead.")            self.drop_table(gt_or_tbl, db_prefix=db_prefix)    # add unique index    def add_uindex(self, gt_or_tbl, s_col):        s_tbl = self.get_tblname(gt_or_tbl)        sql = """create unique index "uix_{0}_{1}" on "{0}" ("{1}");""".format(            s_tbl, s_col        )        try:            self.execute(sql)            print(                (                    'A unique index was successfully added on "{tbl}"."{col}"'.format(                        tbl=s_tbl, col=s_col                    )                )            )        except self.OperationalError:            print(                (                    'It seems to already have unique index "{}_{}". Pass process.'.format(                        s_tbl, s_col                    )                )            )    # add index    def add_index(self, gt_or_tbl, s_col):        s_tbl = self.get_tblname(gt_or_tbl)        sql = """create index "ix_{0}_{1}" on "{0}" ("{1}");""".format(s_tbl, s_col)        try:            self.execute(sql)            print(                (                    'An index was successfully added on "{tbl}"."{col}"'.format(                        tbl=s_tbl, col=s_col                    )                )            )        except self.OperationalError:            print(                (                    'It seems to already have index "{}_{}". Process was skipped.'.format(                        s_tbl, s_col                    )                )            )    # drop index    def drop_index(self, gt_or_tbl, s_col):        s_tbl = self.get_tblname(gt_or_tbl)        sql = """          DROP INDEX IF EXISTS "{tbl}_{col}";  -- compatible old module          -- drop index if exists "ix_{tbl}_{col}";          -- drop index if exists "uix_{tbl}_{col}";        """        self.execute(sql.format(tbl=s_tbl, col=s_col))        print(('The index "{}_{}" was dropped.'.format(s_tbl, s_col)))    # add spatial index    def add_spindex(self, gt_or_tbl, s_gc=None):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        sql = """select CheckSpatialIndex('{}', '{}');"""        flg = self.execute(sql.format(s_tbl, s_gc)).fetchone()[0]        if flg is None:  # if there is no spatial index, create it.            print(('creating spatial index on "{}" of table "{}".'.format(s_gc, s_tbl)))            sql = """select CreateSpatialIndex('{}','{}');""".format(s_tbl, s_gc)            self.execute(sql)        elif flg == 1:            print("It seems to be already spatial index. Pass process.")    # drop spatial index    def drop_spindex(self, gt_or_tbl, s_gc=None):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        sql = """select DisableSpatialIndex('{}','{}');"""        self.execute(sql.format(s_tbl, s_gc))    # add column and return column name    def add_column(        self, s_tbl, s_col, dtype, default_value=None, refresh=False, if_exists="skip"    ):        ld_coldef = self.get_columnsdef(s_tbl)        l_col = [d["name"] for d in ld_coldef]        if s_col in l_col:            if if_exists == "skip":                print(f'Column "{s_col}" already exists. Process was skipped.')                return s_col            elif if_exists == "replace":                print(f'Column "{s_col}" already exists. It will be replaced.')                self.drop_column(s_tbl, s_col)            else:                raise ValueError(                    f'if_exists must be "skip" or "replace", but {if_exists} was set.'                )        dtype = self.get_dtype(dtype)        if default_value is None:            self.execute(f"""ALTER TABLE "{s_tbl}" ADD COLUMN "{s_col}" {dtype};""")        else:            self.execute(                f"""ALTER TABLE "{s_tbl}" ADD COLUMN "{s_col}" {dtype} DEFAULT {default_value};"""            )        self.refresh_table(s_tbl) if refresh else None        return s_col    # add columns    def add_columns(self, s_tbl, ll_coldef, refresh=False):        for l_coldef in ll_coldef:            if len(l_coldef) == 2:                self.add_column(s_tbl, l_coldef[0], l_coldef[1])            else:  # len(l_coldef) == 3 のみ考慮                self.add_column(s_tbl, l_coldef[0], l_coldef[1], l_coldef[2])        self.refresh_table(s_tbl) if refresh else None    # add PK_UID column    def add_pkuid_column(self, gt_or_tbl, refresh=False):        s_tbl = gt_or_tbl.name if isinstance(gt_or_tbl, GTBL) else gt_or_tbl        print(f"""adding PK_UID column to "{s_tbl}"...""")        # PRIMARY KEY はテーブル作成後には追加できないので、新規にテーブルを追加する必要がある        s_tbl_tmp = self.get_temptblname()        ld_coldef = self.get_columnsdef(s_tbl)        ll_coldef = [            [d_coldef["name"], d_coldef["type"]]            for d_coldef in ld_coldef            if d_coldef["pk"] != 1        ]        # create new table with PK_UID        self.create_table(s_tbl_tmp, ll_coldef, flg_pk=True)        # copy data        sql = f"""          INSERT INTO "{s_tbl_tmp}" ({", ".join([f'"{l_coldef[0]}"' for l_coldef in ll_coldef])})          SELECT {", ".join([f'"{l_coldef[0]}"' for l_coldef in ll_coldef])}          FROM "{s_tbl}"        ;"""        self.begin()        self.execute(sql)        self.commit()        # drop old table        self.drop_geotable(s_tbl)        # rename new table        self.rename_geotable(s_tbl_tmp, s_tbl)        # refresh table        self.refresh_table(s_tbl) if refresh else None        print(f"""adding PK_UID column to "{s_tbl}" was completed.""")    # drop column    def drop_column(self, gt_or_tbl, s_col=None):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name            s_col = gt_or_tbl.gc if s_col is None else s_col        elif isinstance(gt_or_tbl, (str,)):            s_tbl = gt_or_tbl        else:            print(("given parameter {} is invalid.".format(gt_or_tbl)))            return 0        s_tbl_temp = self.get_temptblname()        self.clone_table(s_tbl, s_tbl_temp, l_options=["::ignore::{}".format(s_col)])        self.drop_geotable(s_tbl)        self.rename_geotable(s_tbl_temp, s_tbl)    # drop columns    def drop_columns(self, gt_or_tbl, l_col):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name        elif isinstance(gt_or_tbl, (str,)):            s_tbl = gt_or_tbl        else:            print(("given parameter {} is invalid.".format(gt_or_tbl)))            return 0        s_tbl_temp = self.get_temptblname()        self.clone_table(            s_tbl,            s_tbl_temp,            l_options=["::ignore::{}".format(s_col) for s_col in l_col],        )        self.drop_geotable(s_tbl)        self.rename_geotable(s_tbl_temp, s_tbl)    # add geometry column    def add_geomcol(        self,        gt_or_tbl,        i_epsg=None,        s_geomtype=None,        s_gc=None,        s_dimension="XY",        i_notnull=0,        add_spidx=False,    ):        gt = self.ch_and_get_gtbl(gt_or_tbl, s_gc, i_epsg, s_geomtype)        sql = """select AddGeometryColumn('{}','{}',{},'{}','{}',{});"""        self.execute(            sql.format(gt.name, gt.gc, gt.epsg, gt.type, s_dimension, i_notnull)        )        if add_spidx:            self.add_spindex(gt)        return gt    # recover geometry column    def recov_geomcol(        self, gt_or_tbl, i_epsg=None, s_geomtype=None, s_gc=None, s_dimension="XY"    ):        gt = self.ch_and_get_gtbl(gt_or_tbl, s_gc, i_epsg, s_geomtype)        sql = f"""select RecoverGeometryColumn('{gt.name}','{gt.gc}',{gt.epsg},'{gt.type}','{s_dimension}');"""        self.execute(sql)        return gt    # discard geometry column    def discard_geomcol(self, gt_or_tbl, s_gc=None):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        sql = """select DiscardGeometryColumn('{}','{}');"""        self.execute(sql.format(s_tbl, s_gc))    # update column    def update_column(self, s_tbl, s_col, col_val, flg_sqlvalue=False):        if type(col_val) in (str, str) and flg_sqlvalue is False:  # 文字列値の場合            sql = """update "{}" set "{}" = '{}';""".format(s_tbl, s_col, col_val)        else:  # それ以外（値がSQLの場合も含む）            sql = """update "{}" set "{}" = {};""".format(s_tbl, s_col, col_val)        self.execute(sql)    # clone table    def clone_table(        self,        s_tbl_src,        s_tbl_dst=None,        s_db_src="main",        i_transaction=1,        l_options=None,        overwrite=False,    ):        if s_tbl_dst is None:            s_tbl_dst = s_tbl_src        if self.ch_exists_table(s_tbl_dst):            if overwrite:                self.drop_geotable(s_tbl_dst)            else:                print(("{}--- Warning ---".format(os.linesep)))                print(                    (                        'table "{}" is already exists and overwrite flg is not assigned to True...'.format(                            s_tbl_dst                        )                    )                )                print(("Cloning table process is not applied.".format(s_tbl_dst)))                return 0        if l_options is None:            sql = """SELECT CloneTable('{}', '{}', '{}', {});""".format(                s_db_src, s_tbl_src, s_tbl_dst, i_transaction            )        else:            sql = """SELECT CloneTable('{}', '{}', '{}', {}, {});""".format(                s_db_src,                s_tbl_src,                s_tbl_dst,                i_transaction,                ", ".join(["'{}'".format(s_opt) for s_opt in l_options]),            )        self.execute(sql)    # create cloned table    def create_cloned_table(        self,        s_tbl_src,        s_tbl_dst=None,        s_db_src="main",        i_transaction=1,        l_options=None,        overwrite=False,    ):        if s_tbl_dst is None:            s_tbl_dst = s_tbl_src        if self.ch_exists_table(s_tbl_dst):            if overwrite:                self.drop_geotable(s_tbl_dst)            else:                print(("{}--- Warning ---".format(os.linesep)))                print(                    (                        'table "{}" is already exists and overwrite flg is not assigned to True...'.format(                            s_tbl_dst                        )                    )                )                print(("Cloning table process is not applied.".format(s_tbl_dst)))                return 0        if l_options is None:            sql = f"""SELECT CreateClonedTable('{s_db_src}', '{s_tbl_src}', '{s_tbl_dst}', {i_transaction});"""        else:            sql = f"""                SELECT CreateClonedTable(                    '{s_db_src}', '{s_tbl_src}', '{s_tbl_dst}', {i_transaction},                    {', '.join([f"'{s_opt}'" for s_opt in l_options])}                );            """        self.execute(sql)    # create geometry view    def create_geometry_view(        self,        s_gv_name: str,        s_slct_stmt: str,        gt_ref: GTBL,        pk_uid: str = None,        overwrite: bool = True,    ):        pk_uid = self.get_primary_key(gt_ref) if pk_uid is None else pk_uid        self.drop_geotable(s_gv_name) if overwrite else None        self.execute(            f"""            CREATE VIEW "{s_gv_name}" AS            {s_slct_stmt}        """        )        self.execute(            f"""            INSERT INTO "views_geometry_columns" (              "view_name", "view_geometry", "view_rowid", "f_table_name", "f_geometry_column", "read_only"            ) VALUES (              '{s_gv_name}', '{gt_ref.gc}', '{pk_uid.lower()}', '{gt_ref.name}', '{gt_ref.gc}', 1            )            ;        """        )    # refresh geotable    def refresh_table(self, gt_or_tbl):        if isinstance(gt_or_tbl, GTBL):            s_tbl_src = gt_or_tbl.name        else:            s_tbl_src = gt_or_tbl        s_tbl_tmp = self.get_temptblname()        self.clone_table(s_tbl_src, s_tbl_tmp)        self.drop_geotable(s_tbl_src)        self.rename_geotable(s_tbl_tmp, s_tbl_src)    # cast to multi geometry    def cast_to_multi(self, gt_or_tbl, s_gc_src=None, s_gc_dst=None):        s_tbl, s_gc_src = self.get_tblname_and_gc(gt_or_tbl, s_gc_src)        # discard gc        self.discard_geomcol(s_tbl, s_gc_src)        # cast        sql = f"""UPDATE "{s_tbl}" SET "{s_gc_src}" = ST_Multi("{s_gc_src}");"""        self.execute(sql)        # recover gc        self.recov_geomcol(s_tbl, s_gc_src)        if s_gc_dst is None:            # 既存の名称がジオメトリに合っているかどうかを確認            geom_type, epsg = self.get_type_and_epsg(s_tbl, s_gc_src)            type_abr = self.get_type_abr(geom_type)            s_gc_dst = "geom_{}_{}".format(type_abr, epsg)            if s_gc_src != s_gc_dst:                gt_dst = self.rename_geomcol(s_tbl, s_gc_src)            else:  # 既にキャスト後のジオメトリカラム名に適合しているならばそのままでよい                gt_dst = GTBL(self, s_tbl, epsg, type_abr, s_gc_dst)        else:            gt_dst = self.rename_geomcol(s_tbl, s_gc_src, s_gc_dst)        return gt_dst    # append src table to dst table    def append_table(        self,        gt_or_tbl_src,        s_tbl_dst,        s_gc=None,        flg_multi=False,        flg_drop=False,        s_db="main",    ):        """        テーブルへのデータ挿入（追加）        appendモードは便利で、テーブルがなければ新設、あれば追加で機能する。        """        if isinstance(gt_or_tbl_src, GTBL):            s_tbl_src = gt_or_tbl_src.name            s_gc = gt_or_tbl_src.gc        elif isinstance(gt_or_tbl_src, (str,)):            s_tbl_src = gt_or_tbl_src        else:            print(("given parameter {} is invalid.".format(gt_or_tbl_src)))            return 0        # マルチモードへの統合が有効になっている場合、いったんキャストしたテーブルを生成する        if flg_multi and s_gc is not None:            s_tbl_temp_multi = self.get_temptblname("multi")            sql = """select CloneTable('{}','{}','{}',1,'::cast2multi::{}');""".format(                s_db, s_tbl_src, s_tbl_temp_multi, s_gc            )            self.execute(sql)            sql = """select CloneTable('{}','{}','{}',1,'::append::');""".format(                s_db, s_tbl_temp_multi, s_tbl_dst            )            self.execute(sql)            self.drop_geotable(s_tbl_temp_multi)        else:  # それ以外は（ジオメトリがない場合も含め）通常のCloneで対応            self.commit()            sql = """select CloneTable('{}','{}','{}',1,'::append::');""".format(                s_db, s_tbl_src, s_tbl_dst            )            result = self.execute(sql).fetchone()[0]            print(("Clone execution result is {}".format(result)))        if flg_drop is True:  # オリジナルのテーブルを削除            self.drop_geotable(s_tbl_src)    # rename geotable    def rename_geotable(self, s_tbl_old, s_tbl_new, l_options=None):        """        it may have multiple geometry column, no GTBL object will be returned.        """        print(('rename "{}" to "{}"'.format(s_tbl_old, s_tbl_new)))        # 新しいテーブルを生成        self.clone_table(s_tbl_old, s_tbl_new, l_options=l_options)        # オリジナルを削除        self.drop_geotable(s_tbl_old)        # メタデータ更新        self.upgrade_db()    # get table list (return in utf)    def get_tbllist(self, s_likephrase=None):  # 名称条件はLikeなので％利用可能        if s_likephrase is None:            sql = """SELECT "name" FROM "SQLITE_MASTER" WHERE "type" IS 'table';"""        else:            sql = """                select "name" from "SQLITE_MASTER" where "type" is 'table' and "name" like '{}';            """.format(                s_likephrase            )        rows = self.execute(sql)        l_tbl = sorted([i["name"] for i in rows])        return l_tbl    # テーブルの列情報を得る。戻り値は各カラムの辞書（name, type, notnull, dflt_value, pk）のリスト    def get_columnsdef(self, gt_or_tbl, flg_except_gc=False) -> dict:        """        This function returns the column information of the table.        return :dict of columns info [name, type, notnull, default_value, pk]        """        s_tbl = self.get_tblname(gt_or_tbl)        if isinstance(gt_or_tbl, (str,)) and flg_except_gc is True:            print("when tblname is given then flg_except_gc must be set False")            return 0  # 処理終了        sql = """pragma table_info("{}");""".format(s_tbl)        ld_coldef = self.execute(sql).fetchall()        if flg_except_gc:            ld_coldef = [                d_columninfo                for d_columninfo in ld_coldef                if d_columninfo["name"].lower() != gt_or_tbl.gc.lower()            ]        return ld_coldef    # get geometry type of target column    def get_geomtype(self, gt_or_tbl, s_gc=None):  # （登録されている）ジオメトリタイプを取得する        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        sql = """pragma table_info("{}");""".format(s_tbl)        # print(sql)        rows = self.execute(sql).fetchall()        s_geomtype = [i["type"] for i in rows if i["name"].lower() == s_gc.lower()][            0        ]  # Geom と geom を等価とする。        return s_geomtype    # get srid of geometry    def get_epsg(self, gt_or_tbl, s_gc=None):  # ジオメトリのSRIDを取得する        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        sql = """select distinct Srid("{}") as srid from "{}" where srid is not NULL;""".format(            s_gc, s_tbl        )        i_epsg = self.execute(sql).fetchone()[0]        return i_epsg    def ch_epsg_coordtype(self, i_epsg):        sql = """SELECT "is_geographic" FROM "spatial_ref_sys_all" WHERE "srid" == {};""".format(            i_epsg        )        i = self.execute(sql).fetchone()[0]        if i == 1:            return "geographic"  # 地理座標系        elif i == 0:            return "projected"  # 投影座標系        else:            print(os.linesep)            print(('Error: given epsg "{}" is invalid.'.format(i_epsg)))            return 0    # make valid geometry （return geometry column name）    def make_valid(self, gt_or_tbl, s_gc=None, flg_addcol=False):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        if flg_addcol:  # 修正カラムを生成する場合            s_gc_valid = "{}_valid".format(s_gc)            i_epsg = self.get_epsg(s_tbl, s_gc)            s_geomtype = self.get_geomtype(s_tbl, s_gc)            self.add_geomcol(                s_tbl, i_epsg, s_geomtype, s_gc_valid, s_dimension="XY", i_notnull=0            )            self.discard_geomcol(s_tbl, s_gc)  # 古いジオメトリカラムをDiscard            # ジオメトリを複写            sql = """update "{}" set "{}" = "{}";""".format(s_tbl, s_gc_valid, s_gc)            self.execute(sql)            s_gc = s_gc_valid  # 追加したカラムをメインカラムとする        sql = """            update "{tbl}" set "{gc}" = ST_MakeValid("{gc}") where ST_IsValid("{gc}") != 1;        """.format(            tbl=s_tbl, gc=s_gc        )        self.execute(sql)        return s_gc  # flg_addcol = True の場合はカラム名が変わるので、戻り値として与える    # get x,y of each min and max with list    def get_extent(self, gt_or_tbl_cover, i_epsg_dst=None):        """        :param gt_or_tbl_cover:        :param i_epsg_dst:        :return: l_nesw        """        s_tbl_cover = self.get_tblname(gt_or_tbl_cover)        if i_epsg_dst is None:            sql = """                select ST_MaxY(geom) as y2, ST_MaxX(geom) as x2, ST_MinY(geom) as y1, ST_MinX(geom) as x1                from (select GetLayerExtent('{tbl}') as geom                );            """.format(                tbl=s_tbl_cover            )        elif isinstance(i_epsg_dst, int):            sql = """                select ST_MaxY(geom) as y2, ST_MaxX(geom) as x2, ST_MinY(geom) as y1, ST_MinX(geom) as x1                from (select ST_Transform(GetLayerExtent('{tbl}'), {epsg}) as geom                );            """.format(                tbl=s_tbl_cover, epsg=i_epsg_dst            )        else:            print(f"{self.get_method_name()}: given parameter is something wrowg...: ")            return        l_extent_nesw = list(self.execute(sql).fetchone())        return l_extent_nesw  # NESW    # transform geotable ジオメトリカラムの名称と内容が合致しなくなる可能性があるので注意。    def transform_geotable(        self, gt_or_tbl, i_epsg_dst, s_gc=None, s_dimension="XY", s_gc_dst=None    ):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        # ジオメトリカラムを差し替える場合、テーブルを差し替える        if s_gc_dst is not None and s_gc != s_gc_dst:            s_temptbl = self.get_temptblname()            sql = """select CreateClonedTable('main','{}','{}', 1, '::ignore::{}');"""            self.execute(sql.format(s_tbl, s_temptbl, s_gc))            self.add_geomcol(s_temptbl, s_gc=s_gc_dst, i_epsg=i_epsg_dst)            self.execute(                """insert into "{}" select * from "{}";""".format(s_temptbl, s_tbl)            )            self.drop_geotable(s_tbl)            self.rename_geotable(s_temptbl, s_tbl)            s_gc = s_gc_dst        # 投影変換        s_geomtype = self.get_geomtype(s_tbl, s_gc)        self.discard_geomcol(s_tbl, s_gc)        sql = """update "{0}" set "{1}" = ST_Transform("{1}",{2});""".format(            s_tbl, s_gc, i_epsg_dst        )        self.execute(sql.format(s_tbl, s_gc, i_epsg_dst))        gt = self.recov_geomcol(s_tbl, i_epsg_dst, s_geomtype, s_gc, s_dimension)        return gt    # build point geometry    def build_point(        self,        s_tbl,        s_gc,        i_epsg,        s_geomtype,        r_x,        r_y,        r_z=None,        s_dimension="XY",        i_notnull=0,    ):        # 対象テーブルにジオメトリカラムを追加        self.add_geomcol(s_tbl, i_epsg, s_geomtype, s_gc, s_dimension, i_notnull)        # ポイントジオメトリをupdate        if s_dimension == "XY":            self.update_column(                s_tbl, s_gc, "MakePoint({},{},{})".format(r_x, r_y, i_epsg), True            )            s_type_abr = "pt"        elif s_dimension == "XYZ":            self.update_column(                s_tbl,                s_gc,                "MakePointZ({},{},{},{})".format(r_x, r_y, r_z, i_epsg),                True,            )            s_type_abr = "ptz"        else:            print("given parameter: s_dimension is strange.")            return 0        return GTBL(self, s_tbl, i_epsg, s_type_abr, s_gc)    def get_type_and_epsg(self, s_tbl, s_gc):        sql = """SELECT DISTINCT GeometryType("{gc}") AS type, SRID("{gc}") AS srid FROM "{tbl}";""".format(            tbl=s_tbl, gc=s_gc        )        # print(sql)        fetched = self.execute(sql).fetchone()        geom_type = fetched[0]        i_epsg = fetched[1]        return geom_type, i_epsg    # rename geometry column and return gtbl    def rename_geomcol(self, gt_or_tbl, s_gc_src=None, s_gc_dst=None):        s_tbl = self.get_tblname(gt_or_tbl)        if isinstance(gt_or_tbl, GTBL) and s_gc_src is None:            s_gc_src = gt_or_tbl.gc            geom_type = gt_or_tbl.type            geom_type_abr = gt_or_tbl.type_abr            i_epsg = gt_or_tbl.epsg        elif isinstance(gt_or_tbl, (str,)) and s_gc_src is not None:            geom_type, i_epsg = self.get_type_and_epsg(s_tbl, s_gc_src)            geom_type_abr = self.get_type_abr(geom_type)        else:            print(f"{self.get_method_name()}: given parameter is something wrong")            print(("given gt_or_tbl is {}".format(gt_or_tbl)))            print(("given s_gc_src is {}".format(s_gc_src)))            print(("given s_gc_dst is {}".format(s_gc_dst)))            return 0  # 処理終了        if s_gc_dst is None:  # ジオメトリカラム名を与えない場合は自動付与            s_gc_dst = "geom_{}_{}".format(geom_type_abr, i_epsg)        # ジオメトリカラムの差し替え        print(            (                'geometry column "{gc_src}" of table "{tbl}" will be renamed to "{gc_dst}".'.format(                    tbl=s_tbl, gc_src=s_gc_src, gc_dst=s_gc_dst                )            )        )        s_tbl_temp = self.get_temptblname()        self.rename_geotable(s_tbl, s_tbl_temp)        sql = """select CreateClonedTable('main','{tbl_src}','{tbl_dst}',1,'::ignore::{gc}');""".format(            tbl_src=s_tbl_temp, tbl_dst=s_tbl, gc=s_gc_src        )        self.execute(sql)        self.add_geomcol(s_tbl, i_epsg, geom_type, s_gc_dst)        self.begin()        self.execute(f"""INSERT INTO "{s_tbl}" SELECT * FROM "{s_tbl_temp}";""")        self.commit()        self.drop_geotable(s_tbl_temp)        gt_out = GTBL(self, s_tbl, i_epsg, geom_type_abr, s_gc_dst)        return gt_out    # divide elementary geometries and return gtbl    def divide_elem(        self,        gt_or_tbl_in,        s_gc=None,        s_tbl_dst=None,        out_pk="PK_UID_elem",        out_multi_id="PK_UID_multi",        transaction=1,        flg_replace=True,        l_col_ignore=None,    ):        s_tbl_src, s_gc = self.get_tblname_and_gc(gt_or_tbl_in, s_gc)        if s_tbl_dst is None:            s_tbl_dst = "{}_elem".format(s_tbl_src)        # 同名のものがあれば削除する        if flg_replace:            self.drop_geotable(s_tbl_dst)        if l_col_ignore is None:            sql = """                SELECT ElementaryGeometries('{}', '{}', '{}', '{}', '{}', {});            """.format(                s_tbl_src, s_gc, s_tbl_dst, out_pk, out_multi_id, transaction            )        else:            sql = """                SELECT ElementaryGeometries('{}', '{}', '{}', '{}', '{}', {}, {});            """.format(                s_tbl_src,                s_gc,                s_tbl_dst,                out_pk,                out_multi_id,                transaction,                ", ".join(["'::ignore::{}'".format(s_col) for s_col in l_col_ignore]),            )        # print(sql)        self.execute(sql)        # ジオメトリカラム名を変更し、新たなgtblを得る。        gt_out = self.rename_geomcol(s_tbl_dst, s_gc)        return gt_out    # convert dbf to existing sqlite database    def dbf2spatialite(        self, path_dbf, s_tbl_dst, s_chcode_src, flg_append=True, flg_overwrite=True    ):        import os        if flg_append:            # dbfを読み込み -> temp            s_temptbl = self.get_temptblname("dbftemp")        else:            if not self.ch_exists_table(s_tbl_dst):                s_temptbl = s_tbl_dst            elif flg_overwrite:  # テーブルが存在する場合、上書きフラグが有効なら先だって削除する                self.drop_geotable(s_tbl_dst)                s_temptbl = s_tbl_dst            else:                print(                    (                        'the table "{}" cannot be created because it is already exists.'.format(                            s_tbl_dst                        )                    )                )                return 0        # ImportDBFは拡張子ありでよい（ややこしい、、）        sql = """select ImportDBF('{}','{}','{}');""".format(            path_dbf, s_temptbl, s_chcode_src        )        self.execute(sql)        # dbf名をデータに追加        self.add_column(s_temptbl, "dbf_name", "TEXT")        self.update_column(            s_temptbl, "dbf_name", os.path.split(os.path.splitext(path_dbf)[0])[1]        )        if flg_append:            # 読み込んだデータを統合 -> s_tbl_dst            self.append_table(s_temptbl, s_tbl_dst)            self.drop_geotable(s_temptbl)    # import shp to spatialite database and return gtbl    def shp2spatialite(        self,        p_shp,        i_epsg_src,        s_chcode_src,        s_tbl_dst=None,        s_gc_dst=None,        flg_multi=False,        flg_append=True,        flg_overwrite=False,    ):        import os        # shp名        s_shp_name = os.path.splitext(os.path.split(p_shp)[1])[0]        # テーブル名が与えられない場合は、shp名を与える        if s_tbl_dst is None:            s_tbl_dst = s_shp_name        if flg_append:            # shpを読み込み -> temp            s_tbl_temp = self.get_temptblname()        else:            if not self.ch_exists_table(s_tbl_dst):                s_tbl_temp = s_tbl_dst            elif flg_overwrite:  # テーブルが存在する場合、上書きフラグが有効なら先だって削除する                self.drop_geotable(s_tbl_dst)                s_tbl_temp = s_tbl_dst            else:                print(                    (                        'the table "{}" cannot be created because it is already exists.'.format(                            s_tbl_dst                        )                    )                )                return 0        # shpの読み込み        if s_gc_dst is None:            sql = """select ImportSHP('{}','{}','{}',{});""".format(                os.path.splitext(p_shp)[0], s_tbl_temp, s_chcode_src, i_epsg_src            )        else:            sql = """select ImportSHP('{}','{}','{}',{},'{}');""".format(                os.path.splitext(p_shp)[0],                s_tbl_temp,                s_chcode_src,                i_epsg_src,                s_gc_dst,            )        self.execute(sql)        # 読み込まれたデータタイプを検出してGTBLを設定        if s_gc_dst is None:            geom_type = self.get_type_and_epsg(s_tbl_temp, "Geometry")[0]        else:            geom_type = self.get_type_and_epsg(s_tbl_temp, s_gc_dst)[0]        if geom_type is not None:            type_abr = self.get_type_abr(geom_type)            if s_gc_dst is None:                gt = GTBL(self, s_tbl_temp, i_epsg_src, type_abr, "Geometry")            else:                gt = GTBL(self, s_tbl_temp, i_epsg_src, type_abr, s_gc_dst)        else:            print(                ("imported data may be invalid...: {}".format(os.path.split(p_shp)[1]))            )            return 0        # shp名をデータに追加        self.add_column(s_tbl_temp, "shp_name", "TEXT")        self.update_column(s_tbl_temp, "shp_name", s_shp_name)        # 読み込んだデータを統合 -> s_tbl_dst        if flg_append:            print(('append table "{}" to "{}"'.format(gt.name, s_tbl_dst)))            # 読み込んだデータを統合 -> s_tbl_dst            self.append_table(gt, s_tbl_dst, flg_multi=flg_multi)            self.drop_geotable(gt)            gt.name = s_tbl_dst            # gt = GTBL(s_tbl_dst, gt.epsg, gt.type_abr)            if flg_multi and s_gc_dst is None:                gt = self.rename_geomcol(gt)  # todo: 何のためにあるのかイマイチ、、、？　flg_multi必要？            # gt = gt_new        elif flg_multi:  # s_geomcol_dstが指定されない場合、gcはジオメトリのタイプに応じて書き換えられる            gt = self.cast_to_multi(gt, s_gc_dst=s_gc_dst)        elif s_gc_dst is None:            gt = self.rename_geomcol(gt)        return gt    # import shapefile to spatialite database via ogr library and return gtbl    def shp2spatialite_ogr(self, p_shp, i_epsg_dst=None, s_tbl_dst=None, s_gc_dst=None):        from osgeo import ogr        s_tbl_dst = (            s_tbl_dst            if s_tbl_dst is not None            else os.path.splitext(os.path.split(p_shp)[1])[0]        )        # database path        p_db = self.get_dbpath()        # ソースShapefileを開きます        driver = ogr.GetDriverByName("ESRI Shapefile")        shapefile = driver.Open(str(p_shp))        # SpatiaLiteデータベースに接続します        sqlite_driver = ogr.GetDriverByName("SQLite")        database = sqlite_driver.Open(str(p_db), 1)  # 1 means writeable        # Shapefileからレイヤを取得し、その名前を取得します        layer = shapefile.GetLayer()        # EPSGを設定する        if i_epsg_dst is None:            # レイヤからEPSGを取得する            i_epsg = int(layer.GetSpatialRef().GetAuthorityCode(None))            if i_epsg is None:                raise ValueError(                    "EPSG code is not found from shapefile. Please specify EPSG code in i_epsg_src."                )        else:            i_epsg = i_epsg_dst        # ジオメトリカラムの名前を設定する        if s_gc_dst is None:            # Get geometry type from layer            s_geom_type = layer.GetGeomType()            # Convert geometry type to human-readable form            s_geom_type_name = ogr.GeometryTypeToName(s_geom_type)            # Get type abr            s_type_abr = self.get_type_abr(s_geom_type_name)            s_gc_dst = f"geom_{s_type_abr}_{i_epsg}"        # Shapefileのレイヤをデータベースにコピーします        new_layer = database.CopyLayer(            layer,            s_tbl_dst,            ["SPATIALITE=YES", f"GEOMETRY_NAME={s_gc_dst}", "FID=PK_UID"],        )        if new_layer is None:            print("Error while copying layer")        else:            print("Copy layer succeeded")        # データベースとShapefileを閉じます        database.Destroy()        # update metadata        self.update_layerstats(s_tbl_dst)        # get gtbl object        gtbl = self.get_gtbl_from_metadata(s_tbl_dst)        # If i_epsg_src is not None, reproject geometry        if i_epsg_dst is not None:            self.discard_geomcol(gtbl)            self.begin()            self.execute(                f"""                UPDATE "{s_tbl_dst}"                SET "{s_gc_dst}" = ST_Transform("{s_gc_dst}", {i_epsg_dst})                ;            """            )            self.commit()            gtbl = self.recov_geomcol(s_tbl_dst, i_epsg_dst, gtbl.type_abr, s_gc_dst)        print("Import process was done.")        return gtbl    # import zipped shp files to spatialite database    def zipshps2spatialite(        self,        p_zipshpdir,        s_tbl="merge",        i_epsg_src=4612,        s_chcode_src="utf-8",        flg_multi=False,    ):        import os        import glob        import shutil        # path_zipのzipファイルを一時ディレクトリに展開する        def zip_extract(_p_zip):            import zipfile            import tempfile            import os            tempdir = tempfile.mkdtemp(dir=os.path.split(_p_zip)[0])  # 解凍先一時ディレクトリを生成            zipfile.ZipFile(_p_zip).extractall(tempdir)  # 全部展開            return tempdir  # 一時ディレクトリパスを戻り値とする        # フォルダ内の結合するshpファイルのリストを作成        l_path_zip = glob.glob("{}/*.zip".format(p_zipshpdir))        for path_zip in l_path_zip:            # zip展開            path_shpdir = zip_extract(path_zip)            # ディレクトリ内のshpのリストを生成（階層構造になっている場合があるので、globでは足りない）            l_path_shp = []            for root, dirs, files in os.walk(path_shpdir):                for _file in files:                    if os.path.splitext(_file)[1] == ".shp":                        l_path_shp.append(os.path.join(root, _file))            # shpの読み込み            for p_shp in l_path_shp:                gt = self.shp2spatialite(                    p_shp, i_epsg_src, s_chcode_src, s_tbl, flg_multi=flg_multi                )            # 一時ディレクトリの削除            shutil.rmtree(path_shpdir)        return gt    # generate stdmesh    def generate_stdmesh(        self,        s_tbl,        lat_max_or_t_nesw,        lon_max=None,        lat_min=None,        lon_min=None,        mesh_level=3,        ellipsoid="wgs84",    ):        import mod_standardmesh as mod_stdms        # check given extent format        if isinstance(lat_max_or_t_nesw, (list, tuple)):            lat_max = lat_max_or_t_nesw[0]  # N            lon_max = lat_max_or_t_nesw[1]  # E            lat_min = lat_max_or_t_nesw[2]  # S            lon_min = lat_max_or_t_nesw[3]  # W        elif (            isinstance(lat_max_or_t_nesw, (int, float))            and lat_min is not None            and lon_max is not None            and lon_min is not None        ):            lat_max = lat_max_or_t_nesw        else:            print("invalid some of coordinate values.")            return 0        # do nothing when given mesh_level is invalid        if mesh_level not in (1, 2, 3, "5x", "2x", "half", "quarter", "eighth"):            print(("invalid mesh_level: {}".format(mesh_level)))            return 0        # obtain unit mesh size        unit_lon, unit_lat = mod_stdms.get_unitsize(mesh_level)        # メッシュコード群を生成        l_meshcode = list()        lat = lat_min        while lat <= lat_max:            lon = lon_min            while lon <= lon_max:                meshcode = mod_stdms.get_mesh_index(lon, lat, mesh_level)                l_meshcode.append(meshcode)                lon += unit_lon            lat += unit_lat        # メッシュのテーブルを生成        if ellipsoid == "wgs84":            i_epsg = 4612        elif ellipsoid == "bessel":            i_epsg = 4301        else:            print('given parameter ellipsoid: "{}" is invalid.')            return 0        ll_coldef = [["mesh_code", "INTEGER"]]        gt_mesh = GTBL(self, s_tbl, i_epsg, "pg")        self.create_table(gt_mesh, ll_coldef)        # 連続的にメッシュポリゴンをInsert（左下から右上まで）        self.begin()        for s_meshcode in l_meshcode:            sql = """insert into "{}" select NULL, '{}', ST_GeomFromText('{}', {});""".format(                s_tbl, s_meshcode, mod_stdms.get_stdmeshcode2wkt(s_meshcode)[0], i_epsg            )            self.execute(sql)        self.add_uindex(s_tbl, "mesh_code")        self.commit()        return gt_mesh    # generate gridmesh    def generate_gridmesh(        self, gt_src, s_tbl_dst, i_gridsize, edges_only=False, t_origing=(0, 0)    ):        # メッシュのgtblを作成する        if edges_only:            s_type_abr = "mln"        else:            s_type_abr = "mpg"        i_epsg = self.get_epsg(gt_src)        gt_dst = GTBL(self, s_tbl_dst, i_epsg, s_type_abr)        self.create_table(gt_dst)        # グリッドのジオメトリを挿入する        sql = """            insert into "{tbl_grid}"            select NULL, ST_SquareGrid(ST_Collect("{geom}"), {size}, {edges_only}, MakePoint({x}, {y}))            from "{tbl_src}"            ;        """.format(            tbl_grid=gt_dst.name,            tbl_src=gt_src.name,            geom=gt_src.gc,            size=i_gridsize,            edges_only=edges_only,            x=t_origing[0],            y=t_origing[1],        )        self.execute(sql)        return gt_dst    # split selected geometry area and generate area polygon    def split_mbr(        self,        s_tbl_dst,        s_tbl_src,        s_gc_src,        sql_select_geom,        i_split_x=2,        i_split_y=2,        flg_overwrite=True,    ):        """        与えられたselect stmtにもとづいて、対象のエリアを分割するポリゴンを生成する。デフォルトは四等分。        対象ジオメトリのselect stmtは、s_gc_srcのみ選択する内容である必要がある。        """        # get epsg        i_epsg = self.get_epsg(s_tbl_src, s_gc_src)        # create geotable        gt_dst = self.set_gtbl(s_tbl_dst, i_epsg, "pg")        self.create_table(gt_dst, overwrite=flg_overwrite)        # create split data        sql = """            select ST_MinX(extent), ST_MinY(extent), ST_MaxX(extent), ST_MaxY(extent)            from (select ST_Collect({gc}) as extent from ({slct_stmt}));        """.format(            gc=s_gc_src, slct_stmt=sql_select_geom        )        # print(sql)        t_extent = self.execute(sql).fetchone()        min_x = t_extent[0]        min_y = t_extent[1]        max_x = t_extent[2]        max_y = t_extent[3]        dx = 1.0 * (max_x - min_x) / i_split_x        dy = 1.0 * (max_y - min_y) / i_split_y        self.begin()        for n_y in range(i_split_y):            y1 = min_y + dy * n_y            y2 = y1 + dy            for n_x in range(i_split_x):                x1 = min_x + dx * n_x                x2 = x1 + dx                # wkt                wkt = "POLYGON(({0} {1}, {0} {3}, {2} {3}, {2} {1}, {0} {1}))".format(                    x1, y1, x2, y2                )                sql = """insert into "{tbl}" ("{gc}") values (GeomFromtext('{wkt}', {epsg}));""".format(                    tbl=s_tbl_dst, gc=gt_dst.gc, wkt=wkt, epsg=i_epsg                )                # print(sql)                self.execute(sql)        self.commit()        return gt_dst    # split line to equidistant points    def split_line_equidistant(self, gt_line, s_tbl_out, len_split_m, i_epsg4len=3857):        """        :param gt_line        :param s_tbl_out        :param len_split_m: 点の間隔[m]        :param i_epsg4len: 等間隔点を得る際に距離の基準とするepsg        :return: 切断後lineのGTBL        """        # 切断したデータを入れるテーブルを作成する（マルチジオメトリになるのでジオメトリカラムを変更する）        self.drop_geotable(s_tbl_out)        self.create_cloned_table(gt_line.name, s_tbl_out)        self.discard_geomcol(s_tbl_out, gt_line.gc)        gt_line_out = self.recov_geomcol(            s_tbl_out, gt_line.epsg, "MULTILINESTRING", gt_line.gc        )        gt_line_out = self.rename_geomcol(            gt_line_out, s_gc_dst="geom_mln_{}".format(gt_line_out.epsg)        )        # GeometryNで利用するため分割数の最大値を取得し、連番テーブルを生成する        sql = """            select                Max(                    ST_NumGeometries(                        ST_Line_Interpolate_Equidistant_Points(                            ST_Transform("{}", {}), {}  -- いったん投影してからメートル単位で等間隔点を得る                        )                    )                )            from "{}";        """.format(            gt_line.gc, i_epsg4len, len_split_m, gt_line.name        )        i_limit = self.execute(sql).fetchone()[0]        s_tbl_numlist = self.get_temptblname("tbl_numlist")        self.create_sequential_data(s_tbl_numlist, i_limit)        # 線データのジオメトリ数（レコード数）を取得        i_numlines = self.execute(            """select count(*) from "{}";""".format(gt_line.name)        ).fetchone()[0]        # 切断したデータを入れ込む        self.execute("""BEGIN;""")        for i in range(i_numlines):            ld_columns = self.get_columnsdef(gt_line, flg_except_gc=True)            sql = ", ".join(                ['a."{}"'.format(d_columns["name"]) for d_columns in ld_columns]            )            sql = """                insert into "{0}"                select                    {1},                    case                        when b.blades is not NULL then ST_Multi(ST_Split(a."{2}", b.blades))                        else ST_Multi(a."{2}")                    end                from (select * from "{3}" limit 1 offset {6}) as a, (                    select ST_Collect(blade) as blades                    from (                        select                            n                            , MakeLine(                                ShiftCoords(GeometryN(eqpoints, n), -0.000001, -0.000001),                                ShiftCoords(GeometryN(eqpoints, n), 0.000001, 0.000001)                            ) as blade                        from                            (                                select                                    ST_Transform(                                        ST_Line_Interpolate_Equidistant_Points(ST_Transform("{2}", {4}), {5}), {8}                                    ) as eqpoints                                from "{3}"                                limit 1 offset {6}                            )                            , (select "PK_UID" as n from "{7}")                        where n <= ST_NumGeometries(eqpoints)                    )                ) as b                ;            """.format(                s_tbl_out,                sql,                gt_line.gc,                gt_line.name,                i_epsg4len,                len_split_m,                i,                s_tbl_numlist,                gt_line.epsg,            )            # if i == 0:  # for debug            #     print(sql)            self.execute(sql)        self.commit()        self.drop_geotable(s_tbl_numlist)        return gt_line_out    # 与えられた座標を投影変換する    def transform_pt(self, t_xy, i_epsg_src, i_epsg_dst):        x = t_xy[0]        y = t_xy[1]        sql = """            select                ST_X(ST_Transform(MakePoint({x}, {y}, {epsg_src}), {epsg_dst})) as x                , ST_Y(ST_Transform(MakePoint({x}, {y}, {epsg_src}), {epsg_dst})) as y            ;        """.format(            x=x, y=y, epsg_src=i_epsg_src, epsg_dst=i_epsg_dst        )        l_xy_dst = self.execute(sql).fetchone()        # print('tranfomed value: x={}, y={}'.format(l_xy_dst['x'], l_xy_dst['y']))        return l_xy_dst    # 与えられた範囲座標を投影変換する    def transform_coverage(self, l_nesw, i_epsg_src, i_epsg_dst):        n = l_nesw[0]        e = l_nesw[1]        s = l_nesw[2]        w = l_nesw[3]        sql = """            select                ST_MaxY(geom) as y2                , ST_MaxX(geom) as x2                , ST_MinY(geom) as y1                , ST_MinX(geom) as x1            from (                select ST_Transform(BuildMbr({}, {}, {}, {}, {}), {}) as geom            );        """.format(            w, s, e, n, i_epsg_src, i_epsg_dst        )        l_nesw_dst = list(self.execute(sql).fetchone())        print(            (                "tranfomed value: x1={}, x2={}, y1={}, y2={}".format(                    l_nesw_dst[3], l_nesw_dst[1], l_nesw_dst[2], l_nesw_dst[0]                )            )        )        return l_nesw_dst    # get and update Nearest-Neighbour    def get_nearest_neighbour(        self, gt_src_pt, gt_dst_pt, s_col_update, use_virtual_knn=False    ):        if use_virtual_knn:            # KNN使用モード ：KNNはPythonからのループでは落ちる（原因不明）ので、ひとまず利用しない。            print("get and update nearest neighbor using Virtual KNN")            rows = self.execute(                f"""                SELECT "ROWID"                FROM "{gt_src_pt.name}"                WHERE "{gt_src_pt.gc}" IS NOT NULL            ;"""            )            self.begin()            for row in rows:  # sqlite3ではwithが使えないのでforで対応                i_id_src = row[0]                # print('knn process: {}'.format(i_id_src))                sql = f"""                        SELECT "fid" FROM "KNN"                        WHERE "f_table_name" = '{gt_dst_pt.name}'                        AND "ref_geometry" = (                            SELECT "{gt_src_pt.gc}"                            FROM "{gt_src_pt.name}"                            WHERE "ROWID" == {i_id_src})                        AND "max_items" = 1                        ;                    """                id_closest_road = self.execute(sql).fetchone()[0]                self.execute(                    f"""                        UPDATE "{gt_src_pt.name}"                        SET "{s_col_update}" = {id_closest_road}                        WHERE "ROWID" == {i_id_src}                    ;"""                )            self.commit()        else:            # KNNを使用しない場合、Min(ST_Distance)で対応する            print("get and update nearest neighbor without using Virtual KNN")            s_tbl_temp = self.get_temptblname("temp")            sql = f"""                DROP TABLE IF EXISTS "{s_tbl_temp}";                CREATE TABLE "{s_tbl_temp}" ("src_id" INTEGER PRIMARY KEY, "dst_id" INTEGER);                INSERT INTO "{s_tbl_temp}"                SELECT srcid, dstid FROM (                    SELECT                      src."ROWID" AS srcid                      , dst."ROWID" AS dstid                      , Min(ST_Distance(src."{gt_src_pt.gc}", dst."{gt_dst_pt.gc}"))                    FROM "{gt_src_pt.name}" AS src, "{gt_dst_pt.name}" AS dst                    WHERE src."{gt_src_pt.gc}" IS NOT NULL                    GROUP BY src."ROWID"                )                ;                UPDATE "{gt_src_pt.name}"                SET "{s_col_update}" = (                    SELECT "dst_id"                    FROM "{s_tbl_temp}"                    WHERE "{gt_src_pt.name}"."ROWID" == "{s_tbl_temp}"."src_id"                )                WHERE "{gt_src_pt.gc}" IS NOT NULL                ;                DROP TABLE IF EXISTS "{s_tbl_temp}";            """            self.executescript(sql)    # create routing nodes id    def routing_addcol_routing_id(        self,        gt_lines,        s_col_from="node_from",        s_col_to="node_to",        s_tbl_nodes_gt=None,        s_tbl_nodes_gv=None,        s_db_alies=None,    ):        """        始点ノードIDと終点ノードIDをラインのジオテーブルにカラムとして付与する        :return 追加されたfrom、toのカラム名および、s_tbl_nodes_gtを与えた場合はそのgtblオブジェクトが返る        """        self.ch_able_routing()        print("adding node id column for routing...")        s_db_alies = f"'{s_db_alies}'" if s_db_alies is not None else "NULL"        sql = f"""            SELECT CreateRoutingNodes({s_db_alies}, '{gt_lines.name}', '{gt_lines.gc}', '{s_col_from}', '{s_col_to}');        """        try:            self.execute(sql)            print(f'successfully added column "{s_col_from}" and "{s_col_to}"')        except sqlite3.OperationalError as e:            print(e)            print(f"Column {s_col_from} and {s_col_to} are already exists for routing.")        if s_tbl_nodes_gt is None:            return s_col_from, s_col_to        # create geotable/spatialview of nodes with node id        print("creating geotable of nodes.")        gt_nodes = self.set_gtbl(s_tbl_nodes_gt, gt_lines.epsg, "pt")        self.create_table(gt_nodes)        if s_tbl_nodes_gv is None:            sql = f"""                INSERT INTO "{s_tbl_nodes_gt}"                SELECT * FROM (                  SELECT                    "{s_col_from}" AS "id",                    ST_StartPoint("{gt_lines.gc}")                  FROM "{gt_lines.name}"                  UNION                  SELECT                    "{s_col_to}",                    ST_EndPoint("{gt_lines.gc}")                  FROM "{gt_lines.name}"                )                ORDER BY "id"                ;            """            self.execute(sql)        # if creates spatial view, no geometries will be inserted to geotable. (but knn too slow...        else:            sql = f"""                DROP VIEW IF EXISTS "{s_tbl_nodes_gv}";                CREATE VIEW "{s_tbl_nodes_gv}" AS                SELECT * FROM (                    SELECT                        "{s_col_from}" AS "id",                        ST_StartPoint("{gt_lines.gc}") AS "{gt_nodes.gc}"                    FROM "{gt_lines.name}"                    UNION                    SELECT                        "{s_col_to}",                        ST_EndPoint("{gt_lines.gc}")                    FROM "{gt_lines.name}"                )                ORDER BY "id"                ;                INSERT INTO "views_geometry_columns"                VALUES ('{s_tbl_nodes_gv}', '{gt_nodes.gc}', 'id', '{gt_nodes.name}', '{gt_nodes.gc}', 1)                ;            """            self.executescript(sql)        self.add_spindex(gt_nodes)  # for using KNN, spatial index is necessary.        return s_col_from, s_col_to, gt_nodes    # create routing data    def routing_create_routing_data(        self,        gt_lines,        s_col_from,        s_col_to,        s_col_cost=None,        s_col_name=None,        i_argorithm=1,        i_bidirectional=0,        s_col_fwd=None,        s_col_inv=None,        i_overwrite=1,        s_tbl_rtg_data="routing_net_data",        s_vtbl_rtg="routing_net",    ):        self.ch_able_routing()        print("creating routing data.")        s_col_cost = "'{}'".format(s_col_cost) if s_col_cost is not None else "NULL"        s_col_name = "'{}'".format(s_col_name) if s_col_name is not None else "NULL"        s_col_fwd = "'{}'".format(s_col_fwd) if s_col_fwd is not None else "NULL"        s_col_inv = "'{}'".format(s_col_inv) if s_col_inv is not None else "NULL"        sql = """            SELECT CreateRouting(                '{tbl_rtg_data}', '{vtbl_rtg}', '{tbl_lines}', '{col_from}', '{col_to}', '{gc_lines}'                , {col_cost}  -- cost column when NULL then length                , {col_name}  -- road name or NULL                , {i_argorithm}  -- enable A-star (boolean)                , {i_bidirectional}  -- directed graph or not (boolean)                , {col_flg_fwd}  -- flag to forward                , {col_flg_inv}  -- flag to inverse                , {i_flg_overwrite}  -- boolean            )            ;        """.format(            tbl_rtg_data=s_tbl_rtg_data,            vtbl_rtg=s_vtbl_rtg,            tbl_lines=gt_lines.name,            col_from=s_col_from,            col_to=s_col_to,            gc_lines=gt_lines.gc,            col_cost=s_col_cost,            col_name=s_col_name,            i_argorithm=i_argorithm,            i_bidirectional=i_bidirectional,            col_flg_fwd=s_col_fwd,            col_flg_inv=s_col_inv,            i_flg_overwrite=i_overwrite,        )        if self.execute(sql).fetchone()[0] == 1:            print("routing data was successfully created.")        else:            s_msg = self.execute("""SELECT CreateRouting_GetLastError();""").fetchone()[                0            ]            print(('create routing exit with exception: "{}"'.format(s_msg)))    # extract nodes point data from routing network    def extract_routing_nodes(        self,        gt_lines: "GTBL",        s_col_from: str,        s_col_to: str,        s_gt_road_nodes: str = None,    ) -> "GTBL":        s_gt_road_nodes = (            f"{gt_lines.name}_nodes" if s_gt_road_nodes is None else s_gt_road_nodes        )        gt_road_nodes = self.set_gtbl(s_gt_road_nodes, gt_lines.epsg, "pt")        self.create_table(gt_road_nodes)        self.begin()        self.execute(            f"""            INSERT INTO "{gt_road_nodes.name}"            SELECT * FROM (                SELECT                    "{s_col_from}" AS "id",                    ST_StartPoint("{gt_lines.gc}")                FROM "{gt_lines.name}"                UNION                SELECT                    "{s_col_to}" AS "id",                    ST_EndPoint("{gt_lines.gc}")                FROM "{gt_lines.name}"            )            ORDER BY id        ;"""        )        self.commit()        self.add_spindex(gt_road_nodes)        return gt_road_nodes    # ある点からのネットワーク上の近接点IDと、その点までの距離を得る。戻り値はid、dist_mの辞書    def routing_get_nearest_netpoint(        self, gt_node, x, y, i_epsg=4612, s_uid_nodes="PK_UID"    ):        # ch coord type        s_coordtype = self.ch_epsg_coordtype(i_epsg)        s_coordtype_nodes = self.ch_epsg_coordtype(gt_node.epsg)        if i_epsg == gt_node.epsg:            # get the closest point            sql = """                SELECT                  "{uid}" AS "id"                  , Min(ST_Distance(MakePoint({x}, {y}, {epsg}), "{gc_node}")) AS "dist_m"                FROM "{tbl_node}"                ;            """.format(                tbl_node=gt_node.name,                gc_node=gt_node.gc,                x=x,                y=y,                epsg=i_epsg,                uid=s_uid_nodes,            )            d_closest_point = dict(self.execute(sql).fetchone())            if s_coordtype == "geographic":  # get distance with ellipsoidal                sql = """                    SELECT ST_Distance(MakePoint({x}, {y}, {epsg}), "{gc_node}", 1)                    FROM "{tbl_node}"                    WHERE "{uid}" == {id}                    ;                """.format(                    tbl_node=gt_node.name,                    gc_node=gt_node.gc,                    x=x,                    y=y,                    epsg=i_epsg,                    uid=s_uid_nodes,                    id=d_closest_point["id"],                )                d_closest_point["dist_m"] = self.execute(sql).fetchone()[0]        else:            # get the closest point            sql = """                SELECT                  "{uid}" AS "id"                  , Min(ST_Distance(ST_Transform(MakePoint({x}, {y}, {epsg}), {epsg_nodes}), "{gc_node}")) AS "dist_m"                FROM "{tbl_node}"                ;            """.format(                tbl_node=gt_node.name,                gc_node=gt_node.gc,                x=x,                y=y,                epsg=i_epsg,                uid=s_uid_nodes,                epsg_nodes=gt_node.epsg,            )            d_closest_point = dict(self.execute(sql).fetchone())            if s_coordtype_nodes == "geographic":  # get distance with ellipsoidal                sql = """                    SELECT ST_Distance(ST_Transform(MakePoint({x}, {y}, {epsg}), {epsg_nodes}), "{gc_node}", 1)                    FROM "{tbl_node}" WHERE "{uid}" == {id};                """.format(                    tbl_node=gt_node.name,                    gc_node=gt_node.gc,                    x=x,                    y=y,                    epsg=i_epsg,                    uid=s_uid_nodes,                    id=d_closest_point["id"],                    epsg_nodes=gt_node.epsg,                )                d_closest_point["dist_m"] = self.execute(sql).fetchone()[0]        # print('closest point id:{}, dist_m:{}'.format(d_closest_point['id'], d_closest_point['dist_m']))        return d_closest_point    # KNNを利用してある点からのネットワーク上の近接点IDと、その点までの距離を得る。戻り値はid、dist_mの辞書    def routing_get_nearest_netpoint_knn(self, gt_node, x, y, i_epsg_lonlat=4612):        """        KNNを利用して近接点を得る。もしかしてpython-sqlite3からは利用できないのでは…？        :param gt_node:        :param x: lon        :param y: lat        :param i_epsg_lonlat:        :return:        """        sql = """            SELECT "fid" AS id, "distance" AS dist_m            FROM "KNN"            WHERE "f_table_name" = '{tbl_node}'            AND "f_geometry_column" = '{gc_node}'            AND "ref_geometry" = MakePoint({x}, {y}, {epsg})            AND "max_items" = 1            ;        """.format(            tbl_node=gt_node.name, gc_node=gt_node.gc, x=x, y=y, epsg=i_epsg_lonlat        )        d_closest_point = dict(self.execute(sql).fetchone())        print(            (                "closest point id:{}, dist_m:{}".format(                    d_closest_point["id"], d_closest_point["dist_m"]                )            )        )        return d_closest_point    # 登録されているジオメトリカラムの情報をもとに、テーブル名からgtblを得る    def get_gtbl_from_metadata(self, s_tbl, s_gc=None):        if s_gc is None:            sql = f"""SELECT * FROM "geometry_columns" WHERE "f_table_name" IS '{s_tbl}';"""        else:            sql = f"""                SELECT * FROM "geometry_columns" WHERE "f_table_name" IS '{s_tbl}' AND "f_geometry_column" IS '{s_gc}';            """        ll_fetch = self.execute(sql).fetchall()        d_type = {            1: "pt",            2: "ln",            3: "pg",            4: "mpt",            5: "mln",            6: "mpg",        }  # M、Z次元には未対応（dimension列見てない）        if len(ll_fetch) == 1:            l_fetch = ll_fetch[0]            gt = GTBL(                self,                s_tbl,                l_fetch["srid"],                d_type[l_fetch["geometry_type"]],                l_fetch["f_geometry_column"],            )        elif len(ll_fetch) == 0:            print("no table and/or geometry column was found. please check them.")            return None        else:            print(                (                    'geotable "{}" has multiple geometry column. please identify the geometry column.'.format(                        s_tbl                    )                )            )            return None        return gt    # GTBLならそれを、違うなら作成してGTBLを返す    def ch_and_get_gtbl(self, gt_or_tbl, s_gc, i_epsg, s_geomtype):        if isinstance(gt_or_tbl, GTBL):            gt = gt_or_tbl        elif (            isinstance(gt_or_tbl, (str,))            and i_epsg is not None            and s_geomtype is not None        ):            if s_geomtype in (                "pt",                "ln",                "pg",                "mpt",                "mln",                "mpg",                "mptm",                "mlnm",                "mpgm",                "ptz" "ptzm",                "mptz",                "mptzm",            ):                s_type_abr = s_geomtype            else:                s_type_abr = self.get_type_abr(s_geomtype)            gt = GTBL(self, gt_or_tbl, i_epsg, s_type_abr, s_gc)        else:            print(f"{self.get_method_name()}: given parameter is something wrong")            return 0  # 処理終了        return gt    # set gtbl    def set_gtbl(self, gt_or_tbl, epsg=None, s_type_abr=None, gc=None):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name            epsg = gt_or_tbl.epsg if epsg is None else epsg            s_type_abr = gt_or_tbl.type_abr if s_type_abr is None else s_type_abr            # epsg/s_typeどちらか指定 => 通常gcは書き換わるため、gcについてはそれ以外の場合のみ指定。            if epsg is None and s_type_abr is None:                gc = gt_or_tbl.gc if gc is None else gc        else:            if epsg is None:                print(                    'if you give s_tbl instead of gtbl object, parameter "epsg" must not be None.'                )                return 0            if s_type_abr is None:                print(                    'if you give s_tbl instead of gtbl object, parameter "s_type_abr" must not be None.'                )                return 0            s_tbl = gt_or_tbl        if s_type_abr in (            "pt",            "ln",            "pg",            "mpt",            "mln",            "mpg",            "mptm",            "mlnm",            "mpgm",            "ptz" "ptzm",            "mptz",            "mptzm",        ):            s_type_abr = s_type_abr        else:            s_type_abr = self.get_type_abr(s_type_abr)        gt = GTBL(self, s_tbl, epsg, s_type_abr, gc)        return gt    # レイヤ名を返す    @staticmethod    def get_tblname(gt_or_tbl):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name        elif isinstance(gt_or_tbl, (str,)):            s_tbl = gt_or_tbl        else:            print(f"{self.get_method_name()}: given parameter is something wrong")            return 0  # 処理終了        return s_tbl    # レイヤ名とジオメトリカラム名を返す    @staticmethod    def get_tblname_and_gc(gt_or_tbl, s_gc=None):        if isinstance(gt_or_tbl, GTBL) and s_gc is None:            s_tbl = gt_or_tbl.name            s_gc = gt_or_tbl.gc        elif isinstance(gt_or_tbl, (str,)) and s_gc is not None:            s_tbl = gt_or_tbl        else:            print(f"{self.get_method_name()}: given parameter is something wrong")            print(("given gt_or_tbl is {}".format(gt_or_tbl)))            print(("given s_gc is {}".format(s_gc)))            return 0  # 処理終了        return s_tbl, s_gc    # ジオメトリタイプから略形表記を取得する    @staticmethod    def get_type_abr(s_geomtype):        type_dict = {            "pt": "POINT",            "ln": "LINESTRING",            "pg": "POLYGON",            "mpt": "MULTIPOINT",            "mln": "MULTILINESTRING",            "mpg": "MULTIPOLYGON",            "mptm": "MULTIPOINT M",            "mlnm": "MULTILINESTRING M",            "mpgm": "MULTIPOLYGON M",            "ptz": "POINT Z",            "ptzm": "POINT ZM",            "mptz": "MULTIPOINT Z",            "mptzm": "MULTIPOINT ZM",        }        # typeからtype_abrを呼ぶために辞書を反転する。辞書を反転させるときにスペースを削除し、すべて小文字に変換        type_dict_inv = {            v.replace(" ", "").lower(): k for k, v in list(type_dict.items())        }        # Remove spaces and convert to lower case for matching        s_geomtype_lower = s_geomtype.replace(" ", "").lower()        # Try to match geometry type directly        s_type_abr = type_dict_inv.get(s_geomtype_lower)        # If no match found, raise an error        if s_type_abr is None:            raise ValueError(f"No abbreviation found for geometry type {s_geomtype}")        return s_type_abr    # 適当な一時テーブル名を作成    @staticmethod    def get_temptblname(s_prefix="geotemp"):        # 適当な一時テーブル名を作成 http://qiita.com/FGtatsuro/items/92bca9ed665449ab047        import string        import random        s_temptbl = "".join([random.choice(string.ascii_letters) for i in range(10)])        s_temptbl = "{}_{}".format(s_prefix, s_temptbl)        return s_temptbl    # SQLiteで定義できるカラムタイプに変換する    @staticmethod    def get_dtype(dtype):        if isinstance(dtype, str):            return dtype        elif dtype is bytes or dtype is str:            return "TEXT"        elif dtype is int:            return "INTEGER"        elif dtype is float:            return "REAL"        elif dtype is bytes:            return "BLOB"        else:            print(('given type "{}" might be strange.'.format(dtype)))            return dtype    # get primary key column name    def get_primary_key(self, gt_or_tbl: [GTBL, str]) -> [str, None]:        """        get name of primary key column        :param gt_or_tbl: table name or GTBL object        :return: name of primary key column        """        s_tbl = gt_or_tbl.name if isinstance(gt_or_tbl, GTBL) else gt_or_tbl        rows = self.execute(            f"""PRAGMA table_info("{s_tbl}")"""        ).fetchall()  # by ChatGTP        for row in rows:            if row[5] == 1:                return row[1]        print(f'the table "{s_tbl}" has no primary key column. return None.')        return None    # get method name    def get_method_name():        return inspect.currentframe().f_code.co_nameclass GTBL(object):    def __init__(        self, con: SpatiaLiteConnection, name: str, epsg: int, type_abr: str, gc=None    ):        self.con = con        self.name = name        self.epsg = epsg        self.type_abr = type_abr        if gc is None:            gc = f"geom_{type_abr}_{epsg}"        self.gc = gc        type_dict = {            "pt": "POINT",            "ln": "LINESTRING",            "pg": "POLYGON",            "mpt": "MULTIPOINT",            "mln": "MULTILINESTRING",            "mpg": "MULTIPOLYGON",            "mptm": "MULTIPOINT M",            "mlnm": "MULTILINESTRING M",            "mpgm": "MULTIPOLYGON M",            "ptz": "POINT Z",            "ptzm": "POINT ZM",            "mptz": "MULTIPOINT Z",            "mptzm": "MULTIPOINT ZM",        }        self.type = type_dict[type_abr]        # Get Primary Key column of geo table        l_row = self.con.execute(f"""PRAGMA table_info("{self.name}");""").fetchall()        if len([r["pk"] for r in l_row if r["pk"] == 1]) == 1:            s_pk = [r["name"] for r in l_row if r["pk"] == 1][0]        elif len([r["pk"] for r in l_row if r["pk"] == 1]) > 1:            print(f"""Multiple Primary Key columns in "{self.name}".""")            s_pk = None        else:            s_pk = None        self.pk = s_pk    @property    def is_geographic(self):        i_result = self.con.execute(            f"""SELECT SridIsGeographic({self.epsg});"""        ).fetchone()[0]        return bool(i_result)    @property    def is_projected(self):        i_result = self.con.execute(            f"""SELECT SridIsProjected({self.epsg});"""        ).fetchone()[0]        return bool(i_result)
\ No newline at end of file
+#!/usr/bin/env python# -*- coding: utf-8 -*-"""SpatiaLiteを利用する同じディレクトリにmod_spatialiteディレクトリを配置し、直下にmod_spatialiteほかを入れておく。mod_spatialite入手先：https://www.gaia-gis.it/gaia-sins/c.f.v4.3.0a win-x64: http://www.gaia-gis.it/gaia-sins/windows-bin-amd64/mod_spatialite-4.3.0a-win-amd64.7zv5.0.0beta win-x64: http://www.gaia-gis.it/gaia-sins/windows-bin-NEXTGEN-amd64/mod_spatialite-NG-win-amd64.7zAuthor: yoh_chan"""from __future__ import annotations  # 同モジュール内の別クラスを参照させるのに必要import osimport typesimport sqlite3import inspectimport logging# import pdb  # for debug# 出力はloggingで行う（既定では何も表示しない。表示する場合は呼び出し側でlogging.basicConfig等を設定する）logger = logging.getLogger(__name__)logger.addHandler(logging.NullHandler())logger.debug("SpatiaLite modules was imported.")# ワーカーの接続がロックの解除を待つ秒数（sqlite3の既定の5秒では、大きなチャンクの書き込み中にタイムアウトする）WORKER_TIMEOUT = 600.0# exec_tile_parallelでタイルの範囲をソースのSRIDに変換する際の、1辺あたりの分割数TILE_DENSIFY = 64class SpatiaLiteConnection(sqlite3.Connection):    """    ref: https://stackoverflow.com/questions/23683886    ref: https://stackoverflow.com/questions/15556181    ref: https://codereview.stackexchange.com/questions/134535    fef: https://docs.python.jp/3/library/sqlite3.html#sqlite3.connect    """    def __init__(        self,        *args,        p_mod_spatialite=None,        fast_open=False,        read_only=False,        **kwargs,    ):        """        :param p_mod_spatialite: mod_spatialiteのディレクトリ        :param fast_open: 初期化済みのDBではメタデータの初期化を省略し、WAL・mmap等のPRAGMAを設定する。ログ出力も抑制する。        :param read_only: 読み取り専用で接続する（ファイルが存在しない場合は生成しない）        """        if os.environ.get("SPATIALITE_SECURITY") != "relaxed":            os.putenv("SPATIALITE_SECURITY", "relaxed")  # 2021-10-06 なんとこれで有効にできるらしい！            os.environ["SPATIALITE_SECURITY"] = "relaxed"        if not fast_open:            logger.info(os.environ.get("SPATIALITE_SECURITY"))        # If no db file is exist, then create it.        if (            args[0] != ":memory:"            and not read_only            and not os.path.isfile(args[0])        ):            logger.info("the db file {} is not exist and create it.".format(args[0]))            open(args[0], "w").close()        try:            if kwargs["acv"]:                if args[0] == ":memory:":                    logger.warning(                        "Connecting with memory db mode. You cannot archive existing data..."                    )                else:                    import shutil                    p_dir, s_db = os.path.split(args[0])                    shutil.copyfile(                        args[0],                        os.path.join(                            p_dir,                            "{}_acv{}".format(                                os.path.splitext(s_db)[0], os.path.splitext(s_db)[1]                            ),                        ),                    )                del kwargs["acv"]  # 辞書の要素を削除（そのまま残っているとsqlite3.ConnectionでInvalidになる。）        except KeyError:            pass        # 読み取り専用の場合はURIで接続する        if read_only and args[0] != ":memory:":            import pathlib            s_uri = pathlib.Path(os.path.abspath(args[0])).as_uri()            args = (f"{s_uri}?mode=ro",) + tuple(args[1:])            kwargs["uri"] = True        sqlite3.Connection.__init__(self, *args, **kwargs)  # 継承        self.p_mod_spatialite = p_mod_spatialite        self.fast_open = fast_open        self.read_only = read_only        # テーブル・ジオメトリカラムのメタデータキャッシュ（DDL系のメソッドおよびスキーマの変更でクリアされる）        self.d_meta_cache = {}        self.d_meta_stats = {"hit": 0, "miss": 0}        self.clear_meta_cache()        # ルーティングのノードのインデックスとスナップ結果（DDLでは破棄しない。get_routing_node_index参照）        self.d_node_cache = {}        # クエリのプロファイル（enable_profilingで有効化する）        self.d_prof = None        s_ver = self.initialize()        if not fast_open:            logger.info("Successfully connected to SQLite DB with mod_spatialite.")            logger.info("DB-path: {}".format(*args))            logger.info("Spatialite version: {}".format(s_ver))        # need to set proj db file SpatiaLite5<= and PROJ5<=        if float(s_ver[:3]) >= 5:            p_projdb = os.path.join(os.path.split(__file__)[0], "proj.db")            self.execute(f"""SELECT PROJ_SetDatabasePath('{p_projdb}');""")            if not fast_open:                logger.info(                    self.execute(f"""SELECT PROJ_GetDatabasePath();""").fetchone()[0]                )                logger.info(f"Successflly append proj.db path: {p_projdb}")    # mod_spatialiteの適用と初期化    def initialize(self, row_factory=sqlite3.Row):        # 辞書アクセスを可能にする http://docs.python.jp/2/library/sqlite3.html#row        # sqlite3.Row型でカーソルを利用できるようになる。行要素に対して列名による辞書アクセスが可能。        # .keys()で列名のリストも取得可能。        self.row_factory = row_factory  # 辞書アクセスしないならNoneを指定        # 自動コミットモードを有効にする        # http://docs.python.jp/2/library/sqlite3.html        self.isolation_level = None        # PATHの追加（接続のたびにPATHが伸びないよう、未追加の場合のみ）        if self.p_mod_spatialite is not None:            l_path_add = [                os.path.join(self.p_mod_spatialite, "mod_spatialite"),                self.p_mod_spatialite,            ]        else:            p_mod = "C:/Dropbox/Files/Yoh_scripts/Git_yoh/mod_spatialite/mod_spatialite"            l_path_add = [os.path.abspath(p_mod), "mod_spatialite"]        l_path = os.environ["PATH"].split(";")        l_path_add = [p for p in l_path_add if p not in l_path]        if len(l_path_add) > 0:            os.environ["PATH"] = ";".join(l_path_add + [os.environ["PATH"]])        # mod_spatialiteの読み込み        self.isolation_level = ""        self.enable_load_extension(True)        self.execute("SELECT load_extension('mod_spatialite');")        # メタデータを登録してSpatiaLiteDBとする。（初期化済みの場合は省略）        if not self.ch_spatial_metadata() and not self.read_only:            self.execute("""SELECT InitSpatialMetaData(1);""")  # 1はトランザクション有効（高速）        self.isolation_level = None        # 高速化のためのPRAGMAを設定        if self.fast_open:            self.set_fast_pragmas()        # 基準地域メッシュのSQL関数を登録        self.register_mesh_functions()        # SpatiaLiteのバージョンを返す        return self.get_spatialite_version()    # 基準地域メッシュのエンコード・デコードをSQL関数として登録する    def register_mesh_functions(self):        """        MeshCode(x, y, level): 経緯度からメッシュコード（整数）を返す        MeshBBox(code): メッシュコードからメッシュのWKTを返す（レベルはコード長から自動判別）        MeshBBox(code, level): メッシュコードとレベルからメッシュのWKTを返す（1/10細分メッシュはこちら）        例: SELECT MeshCode(ST_X(geom), ST_Y(geom), 3) AS code, Count(*) FROM pts GROUP BY code;        """        import mod_standardmesh as mod_stdms        def get_level(level):            if isinstance(level, str) and level.isdigit():                level = int(level)            return level if level in mod_stdms.MESH_STEPS else None        def mesh_code(x, y, level):            level = get_level(level)            if x is None or y is None or level is None:                return None            ix, iy = mod_stdms.get_grid_index(x, y)            return mod_stdms.encode_mesh_grid(ix, iy, level)        def mesh_bbox(code, level=None):            if code is None:                return None            if level is None:                t_wkt = mod_stdms.get_stdmeshcode2wkt(str(code))                return t_wkt[0] if len(t_wkt) != 0 else None            level = get_level(level)            if level is None:                return None            minlon, minlat, maxlon, maxlat = mod_stdms.get_meshbounds(int(code), level)            return f"POLYGON(({minlon} {minlat}, {minlon} {maxlat}, {maxlon} {maxlat}, {maxlon} {minlat}, {minlon} {minlat}))"        self.create_function("MeshCode", 3, mesh_code, deterministic=True)        self.create_function("MeshBBox", 1, mesh_bbox, deterministic=True)        self.create_function("MeshBBox", 2, mesh_bbox, deterministic=True)    # SpatiaLiteのメタデータが初期化済みかどうか    def ch_spatial_metadata(self):        i_count = self.execute(            """            SELECT Count(*) FROM "sqlite_master"            WHERE "type" IS 'table' AND "name" IN ('spatial_ref_sys', 'geometry_columns')        ;"""        ).fetchone()[0]        return i_count == 2    # ジャーナルモードをWALにする（ファイルDBのみ。設定はDBファイルに残る）    def enable_wal(self):        """        並列の読み込み接続（ワーカー）と、この接続での書き込み・コミットが互いを待たないようにする。        トランザクション外で呼び出すこと。        """        if self.get_dbpath() in ("", None, 0) or self.read_only:            return        s_mode = self.execute("""PRAGMA journal_mode = WAL;""").fetchone()[0]        if s_mode.lower() != "wal":            logger.warning(f"journal_mode could not be changed to WAL ({s_mode}).")    # 読み込み主体の接続向けのPRAGMAを設定する    def set_fast_pragmas(self, i_mmap_mb=256, i_cache_mb=64):        if self.get_dbpath() not in ("", None) and not self.read_only:            self.execute("""PRAGMA journal_mode = WAL;""")            self.execute("""PRAGMA synchronous = NORMAL;""")        self.execute(f"""PRAGMA mmap_size = {i_mmap_mb * 1024 * 1024};""")        self.execute(f"""PRAGMA cache_size = {-i_cache_mb * 1024};""")  # 負値はKiB単位        self.execute("""PRAGMA temp_store = MEMORY;""")    def get_spatialite_version(self):        """        SpatiaLiteのバージョンを返す        """        return self.execute("""SELECT spatialite_version();""").fetchone()[0]    # 切断    def disconnect(self, flg_vacuum=True, flg_upgrade=True):        if flg_vacuum:            logger.info("vacuuming db...")            self.vacuum()        if flg_upgrade:            logger.info("upgrading db...")            self.upgrade_db()        p_db = self.get_dbpath()        self.close()        logger.info("the database {} was successfully closed.".format(p_db))    # begin    def begin(self):        self.execute("""BEGIN;""")    # vacuum    def vacuum(self):        self.execute("""vacuum;""")    # attach    def attach_db(self, p_db, s_alias="a"):        import os        if not os.path.isfile(p_db):            logger.warning("oops... db file: {} is not exist.".format(p_db))            return        sql = """attach database '{}' as {};""".format(os.path.abspath(p_db), s_alias)        # print(sql)        self.execute(sql)        logger.info(            "attached database: %s into: %s",            os.path.split(p_db)[1],            os.path.split(self.get_dbpath())[1],        )    # detach    def detach_db(self, s_alias="a"):        sql = """detach database {};""".format(s_alias)        self.execute(sql)    # dbpathを得る    def get_dbpath(self, dbname="main"):        sql = """PRAGMA database_list;"""        ld_fetch = self.execute(sql).fetchall()        for d_fetch in ld_fetch:            if d_fetch["name"] == dbname:                return d_fetch["file"]            else:                pass        logger.warning('no such table: "{}"'.format(dbname))        return 0    # check Routing    def ch_able_routing(self):        import sys        logger.info("{}check routing libraries...".format(os.linesep))        # check SpatiaLite version        sql = """SELECT spatialite_version();"""        try:            s_ver = self.execute(sql).fetchone()[0]        except self.OperationalError:            logger.error(                "Error: spatialite version was not able to fetch... Did you mount mod_spatialite?"            )            sys.exit()        if int(s_ver[0]) < 5:            logger.info(                'mounted spatialite version "{}" is not suitable...'.format(s_ver)            )            sys.exit()        # has VirtualRouting?        sql = """SELECT HasRouting();"""        try:            s_has = self.execute(sql).fetchone()[0]        except self.OperationalError:            logger.error(                "Error: spatialite has not VirtualRouting... Please check libraries."            )            sys.exit()        if int(s_has) != 1:            logger.error(                "Error: VirtualRouting is not active... Sequences will be stopped."            )            sys.exit()        logger.info("check OK. routing available.")    # メタデータキャッシュのクリア    def clear_meta_cache(self):        self.d_meta_cache = {            "schema_version": None,            "tables": None,  # テーブル名（小文字）のset            "columns": {},  # テーブル名: PRAGMA table_infoの結果            "geomcols": None,  # テーブル名（小文字）: geometry_columnsの行のリスト        }    # メタデータキャッシュのヒット数・ミス数を返す    def get_meta_cache_stats(self):        return dict(self.d_meta_stats)    # メタデータキャッシュを返す（DDL系のメソッド以外でスキーマが変更されていた場合はクリアする）    def get_meta_cache(self):        i_schema_ver = self.execute("""PRAGMA schema_version;""").fetchone()[0]        if i_schema_ver != self.d_meta_cache["schema_version"]:            self.clear_meta_cache()            self.d_meta_cache["schema_version"] = i_schema_ver        return self.d_meta_cache    # テーブル名（小文字）のsetをキャッシュから得る    def get_tblset_meta(self):        d_cache = self.get_meta_cache()        if d_cache["tables"] is None:            self.d_meta_stats["miss"] += 1            rows = self.execute(                """SELECT "name" FROM "SQLITE_MASTER" WHERE "type" IS 'table';"""            )            d_cache["tables"] = {row["name"].lower() for row in rows}        else:            self.d_meta_stats["hit"] += 1        return d_cache["tables"]    # テーブルの列情報（PRAGMA table_info）をキャッシュから得る    def get_tblinfo_meta(self, s_tbl):        d_cache = self.get_meta_cache()        if s_tbl not in d_cache["columns"]:            self.d_meta_stats["miss"] += 1            d_cache["columns"][s_tbl] = self.execute(                f"""PRAGMA table_info("{s_tbl}");"""            ).fetchall()        else:            self.d_meta_stats["hit"] += 1        return list(d_cache["columns"][s_tbl])    # 登録されているジオメトリカラムの情報（geometry_columns）をキャッシュから得る    def get_geomcols_meta(self, s_tbl, s_gc=None):        d_cache = self.get_meta_cache()        if d_cache["geomcols"] is None:            self.d_meta_stats["miss"] += 1            d_cache["geomcols"] = {}            for row in self.execute("""SELECT * FROM "geometry_columns";"""):                d_row = dict(row)                d_cache["geomcols"].setdefault(d_row["f_table_name"].lower(), []).append(                    d_row                )        else:            self.d_meta_stats["hit"] += 1        ld_geomcol = d_cache["geomcols"].get(s_tbl.lower(), [])        if s_gc is not None:            ld_geomcol = [                d_row                for d_row in ld_geomcol                if d_row["f_geometry_column"].lower() == s_gc.lower()            ]        return ld_geomcol    # クエリのトレース・メソッドごとのプロファイルを開始する    def enable_profiling(        self, flg_explain=False, i_progress_steps=1000, p_log=None, i_log_max=100000    ):        """        execute/executemany/executescriptの呼び出しごとに、呼び出し元のメソッド・SQL・所要時間・行数を記録する。        set_trace_callbackで実際に実行された文（トリガーやSpatiaLiteの関数の内部で実行される文を含む）を数え、        set_progress_handlerでVMの命令数（i_progress_steps単位）を数える。        cursor経由など差し替えていない経路で実行された文も、時間なしで記録される。        SELECTの時間は最初の行が得られるまでで、fetch中の命令数は直前の記録に加算される。        :param flg_explain: EXPLAIN QUERY PLANを取得し、ジオテーブルの全件走査をfull_scanに記録する        :param p_log: 記録をJSON Linesで追記するファイル        :param i_log_max: メモリ上に保持する記録の最大数（古いものから捨てる。集計には影響しない）        """        import collections        if self.d_prof is not None and self.d_prof["enabled"]:            self.disable_profiling()        self.d_prof = {            "enabled": True,            "explain": flg_explain,            "steps": i_progress_steps,            "log": collections.deque(maxlen=i_log_max),            "summary": {},            "f_log": open(p_log, "a", encoding="utf-8") if p_log is not None else None,            "active": None,  # 計測中の呼び出しの記録            "current": None,  # 命令数を加算する記録            "busy": False,  # プロファイル自体のクエリを記録しない        }        self.set_trace_callback(self.trace_statement)        self.set_progress_handler(self.count_progress, i_progress_steps)        # 無効時の負荷をなくすため、インスタンスの属性でメソッドを差し替える        self.execute = self.execute_profiled        self.executemany = self.executemany_profiled        self.executescript = self.executescript_profiled    # クエリのトレース・プロファイルを終了する（記録・集計は残る）    def disable_profiling(self):        if self.d_prof is None or not self.d_prof["enabled"]:            return        for s_attr in ("execute", "executemany", "executescript"):            self.__dict__.pop(s_attr, None)        self.set_trace_callback(None)        self.set_progress_handler(None, 0)        if self.d_prof["f_log"] is not None:            self.d_prof["f_log"].close()            self.d_prof["f_log"] = None        self.d_prof["enabled"] = False    # 記録・集計を消去する（プロファイルは継続する）    def clear_profile(self):        if self.d_prof is not None:            self.d_prof["log"].clear()            self.d_prof["summary"] = {}    # 記録（呼び出しごとの辞書）のリストを得る    def get_profile_log(self):        return [] if self.d_prof is None else list(self.d_prof["log"])    # メソッドごとの集計を得る（s_sortの降順）    def get_profile_summary(self, s_sort="sec"):        if self.d_prof is None:            return []        ld_sum = [dict(d, method=s_method) for s_method, d in self.d_prof["summary"].items()]        return sorted(ld_sum, key=lambda d: d[s_sort] or 0, reverse=True)    # メソッドごとの集計をログに出力する    def log_profile_summary(self, i_top=20):        logger.info(            f"{'method':<32} {'calls':>7} {'sec':>9} {'rows':>9} {'stmts':>8} {'vm_steps':>11} full_scan"        )        for d in self.get_profile_summary()[:i_top]:            logger.info(                f"{d['method']:<32} {d['calls']:>7} {d['sec']:>9.3f} {d['rows']:>9} "                f"{d['n_stmt']:>8} {d['vm_steps']:>11} {d['full_scan']}"            )    # プロファイル中のexecute    def execute_profiled(self, sql, parameters=()):        return self.run_profiled(sqlite3.Connection.execute, sql, parameters)    # プロファイル中のexecutemany    def executemany_profiled(self, sql, seq_of_parameters):        return self.run_profiled(sqlite3.Connection.executemany, sql, seq_of_parameters)    # プロファイル中のexecutescript    def executescript_profiled(self, sql_script):        return self.run_profiled(sqlite3.Connection.executescript, sql_script)    # 計測しながら実行する    def run_profiled(self, func, sql, *args):        import time        d_prof = self.d_prof        if d_prof["busy"] or d_prof["active"] is not None:  # 内部のクエリ・入れ子の呼び出し            return func(self, sql, *args)        s_method, s_entry = self.get_caller_methods()        d_rec = self.new_profile_record(s_method, s_entry, func.__name__, sql)        if d_prof["explain"] and func is sqlite3.Connection.execute:            d_rec["plan"], d_rec["full_scan"] = self.explain_query(sql, *args)        d_prof["active"] = d_prof["current"] = d_rec        t0 = time.perf_counter()        try:            cur = func(self, sql, *args)            d_rec["rows"] = cur.rowcount if cur.rowcount >= 0 else None            return cur        except Exception as e:            d_rec["error"] = f"{type(e).__name__}: {e}"            raise        finally:            d_rec["sec"] = time.perf_counter() - t0            d_prof["active"] = None            self.add_profile_record(d_rec)    # trace callback: 実行された文を数える    def trace_statement(self, s_sql):        d_prof = self.d_prof        if d_prof["busy"]:            return        if d_prof["active"] is not None:            d_prof["active"]["n_stmt"] += 1        else:  # cursor経由等で実行された文            s_method, s_entry = self.get_caller_methods()            d_rec = self.new_profile_record(s_method, s_entry, "trace", s_sql)            d_rec["n_stmt"] = 1            d_prof["current"] = d_rec            self.add_profile_record(d_rec)    # progress handler: VMの命令数を数える    def count_progress(self):        d_rec = self.d_prof["current"]        if d_rec is not None and not self.d_prof["busy"]:            d_rec["vm_steps"] += self.d_prof["steps"]            self.get_profile_summary_entry(d_rec["method"])["vm_steps"] += self.d_prof[                "steps"            ]        return 0    # メソッドの集計を得る（なければ作成する）    def get_profile_summary_entry(self, s_method):        return self.d_prof["summary"].setdefault(            s_method,            {"calls": 0, "sec": 0.0, "rows": 0, "n_stmt": 0, "vm_steps": 0, "full_scan": 0},        )    # 記録の雛形    @staticmethod    def new_profile_record(s_method, s_entry, s_call, sql):        import time        return {            "ts": time.time(),            "method": s_method,            "entry": s_entry,            "call": s_call,            "sql": " ".join(sql.split()),            "sec": None,            "rows": None,            "n_stmt": 0,            "vm_steps": 0,            "plan": None,            "full_scan": [],            "error": None,        }    # 記録を保持し、メソッドごとに集計する    def add_profile_record(self, d_rec):        import json        d_prof = self.d_prof        d_prof["log"].append(d_rec)        d_sum = self.get_profile_summary_entry(d_rec["method"])        d_sum["calls"] += 1        d_sum["sec"] += d_rec["sec"] or 0.0        d_sum["rows"] += d_rec["rows"] or 0        d_sum["n_stmt"] += d_rec["n_stmt"]  # vm_stepsはcount_progressで加算済み        d_sum["full_scan"] += len(d_rec["full_scan"])        if d_prof["f_log"] is not None:            d_prof["f_log"].write(json.dumps(d_rec, ensure_ascii=False) + "\n")        if logger.isEnabledFor(logging.DEBUG):            logger.debug(                "%s: %s (%s s, %s rows)",                d_rec["method"],                d_rec["sql"][:200],                d_rec["sec"],                d_rec["rows"],                extra={"sql_profile": d_rec},            )        if d_rec["full_scan"]:            logger.warning(                f"{d_rec['method']}: full scan of geotable {', '.join(d_rec['full_scan'])}: {d_rec['sql'][:200]}"            )    # EXPLAIN QUERY PLANを得て、全件走査されるジオテーブルを検出する    def explain_query(self, sql, parameters=()):        import re        l_word = sql.split(None, 1)        if not l_word or l_word[0].upper() not in (            "SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH"        ):            return None, []        self.d_prof["busy"] = True        try:            rows = sqlite3.Connection.execute(                self, f"EXPLAIN QUERY PLAN {sql}", parameters            ).fetchall()            self.get_geomcols_meta("")  # メタデータのキャッシュを読み込む            set_geotbl = set(self.d_meta_cache["geomcols"])        except sqlite3.Error:  # 未作成のテーブルを参照する場合など            return None, []        finally:            self.d_prof["busy"] = False        # 別名からテーブル名を引く（SQLite 3.36以降のプランは「SCAN <別名>」のみを出力する）        set_keyword = set(            "as where on using join left right full inner outer cross natural group order "            "limit union except intersect window having set values indexed not".split()        )        d_alias = {}        for m in re.finditer(            r'(?:\bFROM|\bJOIN|,)\s+("[^"]+"|\w+)(?:\s+(?:AS\s+)?("[^"]+"|\w+))?',            sql,            re.IGNORECASE,        ):            s_tbl = m.group(1).strip('"').lower()            if m.group(2) is not None and s_tbl in set_geotbl:                s_alias = m.group(2).strip('"').lower()                if s_alias not in set_keyword:                    d_alias[s_alias] = s_tbl        l_plan = [row[3] for row in rows]        l_full_scan = []        for s_detail in l_plan:            m = re.match(r"SCAN (?:TABLE )?(\S+)(?: AS (\S+))?(.*)$", s_detail)            if m is None or "USING" in m.group(3):                continue            s_name = m.group(1).strip('"').lower()            s_tbl = d_alias.get(s_name, s_name)            if s_tbl in set_geotbl:                l_full_scan.append(s_tbl)        return l_plan, l_full_scan    # 呼び出し元のSpatiaLiteConnectionのメソッド名（最も内側・外側）を得る    def get_caller_methods(self):        set_skip = {            "get_caller_methods",            "run_profiled",            "execute_profiled",            "executemany_profiled",            "executescript_profiled",            "trace_statement",        }        s_inner = s_outer = s_first = None        frame = inspect.currentframe().f_back        while frame is not None:            s_name = frame.f_code.co_name            if s_name not in set_skip:                if s_first is None:                    s_first = s_name                if isinstance(frame.f_locals.get("self"), SpatiaLiteConnection):                    s_outer = s_name                    if s_inner is None:                        s_inner = s_name            frame = frame.f_back        return (s_inner or s_first), (s_outer or s_first)    # check table exists or not    def ch_exists_table(self, s_tbl):        return s_tbl.lower() in self.get_tblset_meta()    # check table exists or not    def ch_exists_col(self, gt_or_tbl, s_col=None):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name            s_col = gt_or_tbl.gc        else:            s_tbl = gt_or_tbl            if s_col is None:                logger.info("if gt_or_tbl is not GTBL, s_col is mandatory.")        result = [d_colsinfo["name"] for d_colsinfo in self.get_columnsdef(s_tbl)]        if s_col in result:            return True        else:            return False    # update layer statistics    def update_layerstats(self, s_tbl=None, s_gc=None):        if s_gc is None:            if s_tbl is None:                self.execute("""SELECT UpdateLayerStatistics();""")            else:                self.execute("""SELECT UpdateLayerStatistics('{}');""".format(s_tbl))        else:            self.execute(                """SELECT UpdateLayerStatistics('{}', '{}');""".format(s_tbl, s_gc)            )    # update layer statistics    def upgrade_geomtriggers(self, flg_transaction=True):        self.execute(            """SELECT UpgradeGeometryTriggers({});""".format(flg_transaction * 1)        )    # upgrade database (free memory and update metadata)    def upgrade_db(self, flg_transaction=True):        self.update_layerstats()        self.upgrade_geomtriggers(flg_transaction)    # 連番を持つテーブルを生成する（カラムはPK_UID）をそのまま使用する    def create_sequential_data(self, s_tbl, limit, flg_temp=False):        self.create_table(s_tbl, overwrite=not flg_temp, flg_temp=flg_temp)        self.begin()        self.execute(            f"""            WITH RECURSIVE "seq"("n") AS (              SELECT 1 WHERE {limit} >= 1              UNION ALL              SELECT "n" + 1 FROM "seq" WHERE "n" < {limit}            )            INSERT INTO "{s_tbl}" ("PK_UID") SELECT "n" FROM "seq"        ;"""        )        self.commit()    # 乱数によるジオメトリを持つテーブルを生成する（ベンチマーク・検証用）    def create_synthetic_data(        self,        gt,        limit,        t_extent=(139.0, 35.0, 140.0, 36.0),        i_seed=0,        i_vertices=8,        f_size=None,        i_chunk=100000,        add_spidx=True,    ):        """        create_sequential_dataのジオメトリ版。gtのジオメトリタイプに応じて、範囲内に乱数で地物を生成する。        同じi_seedであれば同じデータとなる。BLOBはPython側で組み立て、i_chunk件ずつexecutemanyでInsertする。        点：一様乱数、ライン：i_vertices点のランダムウォーク、ポリゴン：i_vertices角の星形（単純な多角形）        :param t_extent: (minx, miny, maxx, maxy)        :param f_size: 地物の大きさ（Noneの場合は地物が重なりすぎない程度に範囲と件数から決める）        :return: gt        """        import math        import random        import mod_geomblob        minx, miny, maxx, maxy = t_extent        if f_size is None:            f_size = (maxx - minx) / max(math.sqrt(limit), 1.0) / 4.0        rnd = random.Random(i_seed)        s_type = gt.type.split(" ")[0]        s_type_elem = s_type[5:] if s_type.startswith("MULTI") else s_type        def make_elem():            x = rnd.uniform(minx, maxx)            y = rnd.uniform(miny, maxy)            if s_type_elem == "POINT":                return (x, y)            elif s_type_elem == "LINESTRING":                l_xy = [(x, y)]                for _ in range(i_vertices - 1):                    f_angle = rnd.uniform(0.0, 2.0 * math.pi)                    x += f_size * math.cos(f_angle)                    y += f_size * math.sin(f_angle)                    l_xy.append((x, y))                return l_xy            else:  # POLYGON                l_xy = []                for i in range(i_vertices):                    f_angle = 2.0 * math.pi * i / i_vertices                    f_r = f_size * rnd.uniform(0.5, 1.0)                    l_xy.append((x + f_r * math.cos(f_angle), y + f_r * math.sin(f_angle)))                return [l_xy + [l_xy[0]]]        self.create_table(gt)        sql = f"""INSERT INTO "{gt.name}" ("{gt.gc}") VALUES (?);"""        i_done = 0        while i_done < limit:            i_n = min(i_chunk, limit - i_done)            if s_type == "MULTIPOINT":                l_geom = [[make_elem() for _ in range(i_vertices)] for _ in range(i_n)]            elif s_type.startswith("MULTI"):                l_geom = [[make_elem()] for _ in range(i_n)]            else:                l_geom = [make_elem() for _ in range(i_n)]            self.begin()            self.executemany(                sql,                [(mod_geomblob.encode_geometry(s_type, geom, gt.epsg),) for geom in l_geom],            )            self.commit()            i_done += i_n        if add_spidx:            self.add_spindex(gt)        self.update_layerstats(gt.name, gt.gc)        return gt    # 長方形を生成する    def create_window(self, gt_window, l_nesw):        n = l_nesw[0]        e = l_nesw[1]        s = l_nesw[2]        w = l_nesw[3]        self.create_table(gt_window)        self.execute(            """            INSERT INTO "{tbl}" VALUES (NULL, BuildMbr({w}, {s}, {e}, {n}, {epsg}));        """.format(                tbl=gt_window.name, w=w, s=s, e=e, n=n, epsg=gt_window.epsg            )        )        return gt_window    # テーブルの生成（gtblを与えるとジオテーブルを生成する）    def create_table(        self, gt_or_tbl, ll_coldef=None, flg_pk=True, overwrite=True, flg_temp=False    ):        s_tbl = self.get_tblname(gt_or_tbl)        if overwrite:            self.drop_geotable(s_tbl)        if ll_coldef is None:            if flg_pk:                sql = """create table "{}" ("PK_UID" INTEGER PRIMARY KEY AUTOINCREMENT);""".format(                    s_tbl                )                if flg_temp:                    sql = sql.replace("create table", "create temp table")                self.execute(sql)            else:                logger.warning("You must give at least one of ll_coldef and flg_pk.")                return        else:            ll_coldef = [                [l_coldef[0], self.get_dtype(l_coldef[1])] for l_coldef in ll_coldef            ]            if flg_pk:                s_coldef = ", ".join(                    [""""PK_UID" INTEGER PRIMARY KEY AUTOINCREMENT"""]                    + [f""""{l_coldef[0]}" {l_coldef[1]}""" for l_coldef in ll_coldef]                )            else:                s_coldef = ", ".join(                    [f""""{l_coldef[0]}" {l_coldef[1]}""" for l_coldef in ll_coldef]                )            sql = f"""CREATE TABLE "{s_tbl}" ( {s_coldef} );"""            if flg_temp:                sql = sql.replace("create table", "create temp table")            self.execute(sql)        self.clear_meta_cache()        # ジオテーブルを生成する場合        if isinstance(gt_or_tbl, GTBL):            self.add_geomcol(gt_or_tbl)        return gt_or_tbl    # drop table    def drop_table(self, gt_or_tbl, db_prefix=None):        if self.get_spatialite_version() < "5.0.0":            logger.info(                f"Spatialite version is older for DropTable ({self.get_spatialite_version()})."            )            logger.info(f"So the prosess uses DropGeoTable instead.")            self.drop_geotable(gt_or_tbl, db_prefix=db_prefix)        else:            s_tbl = self.get_tblname(gt_or_tbl)            if db_prefix is None:                self.execute(f"""SELECT DropTable(NULL, '{s_tbl}', 1);""")            else:                self.execute(f"""SELECT DropTable('{db_prefix}', '{s_tbl}', 1);""")            self.clear_meta_cache()            self.clear_node_cache(s_tbl)    # ジオテーブルの削除（ジオメトリがないテーブルでもよい）    def drop_geotable(self, gt_or_tbl, i_transaction=1, db_prefix=None):        if self.get_spatialite_version() < "5.0.0":            s_tbl = self.get_tblname(gt_or_tbl)            if db_prefix is None:                sql = f"""SELECT DropGeoTable('{s_tbl}', {i_transaction});"""            else:                sql = f"""SELECT DropGeoTable('{db_prefix}', '{s_tbl}', {i_transaction});"""            self.execute(sql)            # 何故かテーブル本体が削除されないので、こちらで削除            self.execute(f"""DROP TABLE IF EXISTS "{s_tbl}";""")  # deprecated            self.clear_meta_cache()            self.clear_node_cache(s_tbl)        else:            logger.info(                f"Spatialite version is newer for DropGeoTable ({self.get_spatialite_version()})."            )            logger.info(f"So the prosess uses DropTable instead.")            self.drop_table(gt_or_tbl, db_prefix=db_prefix)    # add unique index    def add_uindex(self, gt_or_tbl, s_col):        s_tbl = self.get_tblname(gt_or_tbl)        sql = """create unique index "uix_{0}_{1}" on "{0}" ("{1}");""".format(            s_tbl, s_col        )        try:            self.execute(sql)            logger.info(                'A unique index was successfully added on "%s"."%s"', s_tbl, s_col            )        except self.OperationalError:            logger.info(                'It seems to already have unique index "%s_%s". Pass process.',                s_tbl,                s_col,            )    # add index    def add_index(self, gt_or_tbl, s_col):        s_tbl = self.get_tblname(gt_or_tbl)        sql = """create index "ix_{0}_{1}" on "{0}" ("{1}");""".format(s_tbl, s_col)        try:            self.execute(sql)            logger.info('An index was successfully added on "%s"."%s"', s_tbl, s_col)        except self.OperationalError:            logger.info(                'It seems to already have index "%s_%s". Process was skipped.',                s_tbl,                s_col,            )    # drop index    def drop_index(self, gt_or_tbl, s_col):        s_tbl = self.get_tblname(gt_or_tbl)        sql = """          DROP INDEX IF EXISTS "{tbl}_{col}";  -- compatible old module          -- drop index if exists "ix_{tbl}_{col}";          -- drop index if exists "uix_{tbl}_{col}";        """        self.execute(sql.format(tbl=s_tbl, col=s_col))        logger.info('The index "{}_{}" was dropped.'.format(s_tbl, s_col))    # add spatial index    def add_spindex(self, gt_or_tbl, s_gc=None):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        sql = """select CheckSpatialIndex('{}', '{}');"""        flg = self.execute(sql.format(s_tbl, s_gc)).fetchone()[0]        if flg is None:  # if there is no spatial index, create it.            logger.info(                'creating spatial index on "{}" of table "{}".'.format(s_gc, s_tbl)            )            sql = """select CreateSpatialIndex('{}','{}');""".format(s_tbl, s_gc)            self.execute(sql)        elif flg == 1:            logger.info("It seems to be already spatial index. Pass process.")    # drop spatial index    def drop_spindex(self, gt_or_tbl, s_gc=None):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        sql = """select DisableSpatialIndex('{}','{}');"""        self.execute(sql.format(s_tbl, s_gc))    # add column and return column name    def add_column(        self, s_tbl, s_col, dtype, default_value=None, refresh=False, if_exists="skip"    ):        ld_coldef = self.get_columnsdef(s_tbl)        l_col = [d["name"] for d in ld_coldef]        if s_col in l_col:            if if_exists == "skip":                logger.info(f'Column "{s_col}" already exists. Process was skipped.')                return s_col            elif if_exists == "replace":                logger.info(f'Column "{s_col}" already exists. It will be replaced.')                self.drop_column(s_tbl, s_col)            else:                raise ValueError(                    f'if_exists must be "skip" or "replace", but {if_exists} was set.'                )        dtype = self.get_dtype(dtype)        if default_value is None:            self.execute(f"""ALTER TABLE "{s_tbl}" ADD COLUMN "{s_col}" {dtype};""")        else:            self.execute(                f"""ALTER TABLE "{s_tbl}" ADD COLUMN "{s_col}" {dtype} DEFAULT {default_value};"""            )        self.clear_meta_cache()        self.refresh_table(s_tbl) if refresh else None        return s_col    # add columns    def add_columns(self, s_tbl, ll_coldef, refresh=False):        for l_coldef in ll_coldef:            if len(l_coldef) == 2:                self.add_column(s_tbl, l_coldef[0], l_coldef[1])            else:  # len(l_coldef) == 3 のみ考慮                self.add_column(s_tbl, l_coldef[0], l_coldef[1], l_coldef[2])        self.refresh_table(s_tbl) if refresh else None    # add PK_UID column    def add_pkuid_column(self, gt_or_tbl, refresh=False):        s_tbl = gt_or_tbl.name if isinstance(gt_or_tbl, GTBL) else gt_or_tbl        logger.info(f"""adding PK_UID column to "{s_tbl}"...""")        # PRIMARY KEY はテーブル作成後には追加できないので、新規にテーブルを追加する必要がある        s_tbl_tmp = self.get_temptblname()        ld_coldef = self.get_columnsdef(s_tbl)        ll_coldef = [            [d_coldef["name"], d_coldef["type"]]            for d_coldef in ld_coldef            if d_coldef["pk"] != 1        ]        # create new table with PK_UID        self.create_table(s_tbl_tmp, ll_coldef, flg_pk=True)        # copy data        sql = f"""          INSERT INTO "{s_tbl_tmp}" ({", ".join([f'"{l_coldef[0]}"' for l_coldef in ll_coldef])})          SELECT {", ".join([f'"{l_coldef[0]}"' for l_coldef in ll_coldef])}          FROM "{s_tbl}"        ;"""        self.begin()        self.execute(sql)        self.commit()        # drop old table        self.drop_geotable(s_tbl)        # rename new table        self.rename_geotable(s_tbl_tmp, s_tbl)        # refresh table        self.refresh_table(s_tbl) if refresh else None        logger.info(f"""adding PK_UID column to "{s_tbl}" was completed.""")    # drop column    def drop_column(self, gt_or_tbl, s_col=None):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name            s_col = gt_or_tbl.gc if s_col is None else s_col        elif isinstance(gt_or_tbl, (str,)):            s_tbl = gt_or_tbl        else:            logger.warning("given parameter {} is invalid.".format(gt_or_tbl))            return 0        s_tbl_temp = self.get_temptblname()        self.clone_table(s_tbl, s_tbl_temp, l_options=["::ignore::{}".format(s_col)])        self.drop_geotable(s_tbl)        self.rename_geotable(s_tbl_temp, s_tbl)    # drop columns    def drop_columns(self, gt_or_tbl, l_col):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name        elif isinstance(gt_or_tbl, (str,)):            s_tbl = gt_or_tbl        else:            logger.warning("given parameter {} is invalid.".format(gt_or_tbl))            return 0        s_tbl_temp = self.get_temptblname()        self.clone_table(            s_tbl,            s_tbl_temp,            l_options=["::ignore::{}".format(s_col) for s_col in l_col],        )        self.drop_geotable(s_tbl)        self.rename_geotable(s_tbl_temp, s_tbl)    # add geometry column    def add_geomcol(        self,        gt_or_tbl,        i_epsg=None,        s_geomtype=None,        s_gc=None,        s_dimension="XY",        i_notnull=0,        add_spidx=False,    ):        gt = self.ch_and_get_gtbl(gt_or_tbl, s_gc, i_epsg, s_geomtype)        sql = """select AddGeometryColumn('{}','{}',{},'{}','{}',{});"""        self.execute(            sql.format(gt.name, gt.gc, gt.epsg, gt.type, s_dimension, i_notnull)        )        self.clear_meta_cache()        if add_spidx:            self.add_spindex(gt)        return gt    # recover geometry column    def recov_geomcol(        self, gt_or_tbl, i_epsg=None, s_geomtype=None, s_gc=None, s_dimension="XY"    ):        gt = self.ch_and_get_gtbl(gt_or_tbl, s_gc, i_epsg, s_geomtype)        sql = f"""select RecoverGeometryColumn('{gt.name}','{gt.gc}',{gt.epsg},'{gt.type}','{s_dimension}');"""        self.execute(sql)        self.clear_meta_cache()        return gt    # discard geometry column    def discard_geomcol(self, gt_or_tbl, s_gc=None):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        sql = """select DiscardGeometryColumn('{}','{}');"""        self.execute(sql.format(s_tbl, s_gc))        self.clear_meta_cache()    # update column    def update_column(self, s_tbl, s_col, col_val, flg_sqlvalue=False):        if type(col_val) in (str, str) and flg_sqlvalue is False:  # 文字列値の場合            sql = """update "{}" set "{}" = '{}';""".format(s_tbl, s_col, col_val)        else:  # それ以外（値がSQLの場合も含む）            sql = """update "{}" set "{}" = {};""".format(s_tbl, s_col, col_val)        self.execute(sql)    # clone table    def clone_table(        self,        s_tbl_src,        s_tbl_dst=None,        s_db_src="main",        i_transaction=1,        l_options=None,        overwrite=False,    ):        if s_tbl_dst is None:            s_tbl_dst = s_tbl_src        if self.ch_exists_table(s_tbl_dst):            if overwrite:                self.drop_geotable(s_tbl_dst)            else:                logger.warning("{}--- Warning ---".format(os.linesep))                logger.info(                    'table "%s" is already exists and overwrite flg is not assigned to True...',                    s_tbl_dst,                )                logger.info("Cloning table process is not applied.")                return 0        if l_options is None:            sql = """SELECT CloneTable('{}', '{}', '{}', {});""".format(                s_db_src, s_tbl_src, s_tbl_dst, i_transaction            )        else:            sql = """SELECT CloneTable('{}', '{}', '{}', {}, {});""".format(                s_db_src,                s_tbl_src,                s_tbl_dst,                i_transaction,                ", ".join(["'{}'".format(s_opt) for s_opt in l_options]),            )        self.execute(sql)        self.clear_meta_cache()    # create cloned table    def create_cloned_table(        self,        s_tbl_src,        s_tbl_dst=None,        s_db_src="main",        i_transaction=1,        l_options=None,        overwrite=False,    ):        if s_tbl_dst is None:            s_tbl_dst = s_tbl_src        if self.ch_exists_table(s_tbl_dst):            if overwrite:                self.drop_geotable(s_tbl_dst)            else:                logger.warning("{}--- Warning ---".format(os.linesep))                logger.info(                    'table "%s" is already exists and overwrite flg is not assigned to True...',                    s_tbl_dst,                )                logger.info("Cloning table process is not applied.")                return 0        if l_options is None:            sql = f"""SELECT CreateClonedTable('{s_db_src}', '{s_tbl_src}', '{s_tbl_dst}', {i_transaction});"""        else:            sql = f"""                SELECT CreateClonedTable(                    '{s_db_src}', '{s_tbl_src}', '{s_tbl_dst}', {i_transaction},                    {', '.join([f"'{s_opt}'" for s_opt in l_options])}                );            """        self.execute(sql)        self.clear_meta_cache()    # create geometry view    def create_geometry_view(        self,        s_gv_name: str,        s_slct_stmt: str,        gt_ref: GTBL,        pk_uid: str = None,        overwrite: bool = True,    ):        pk_uid = self.get_primary_key(gt_ref) if pk_uid is None else pk_uid        self.drop_geotable(s_gv_name) if overwrite else None        self.execute(            f"""            CREATE VIEW "{s_gv_name}" AS            {s_slct_stmt}        """        )        self.execute(            f"""            INSERT INTO "views_geometry_columns" (              "view_name", "view_geometry", "view_rowid", "f_table_name", "f_geometry_column", "read_only"            ) VALUES (              '{s_gv_name}', '{gt_ref.gc}', '{pk_uid.lower()}', '{gt_ref.name}', '{gt_ref.gc}', 1            )            ;        """        )        self.clear_meta_cache()    # refresh geotable    def refresh_table(self, gt_or_tbl):        if isinstance(gt_or_tbl, GTBL):            s_tbl_src = gt_or_tbl.name        else:            s_tbl_src = gt_or_tbl        s_tbl_tmp = self.get_temptblname()        self.clone_table(s_tbl_src, s_tbl_tmp)        self.drop_geotable(s_tbl_src)        self.rename_geotable(s_tbl_tmp, s_tbl_src)    # cast to multi geometry    def cast_to_multi(self, gt_or_tbl, s_gc_src=None, s_gc_dst=None):        s_tbl, s_gc_src = self.get_tblname_and_gc(gt_or_tbl, s_gc_src)        # discard gc        self.discard_geomcol(s_tbl, s_gc_src)        # cast        sql = f"""UPDATE "{s_tbl}" SET "{s_gc_src}" = ST_Multi("{s_gc_src}");"""        self.execute(sql)        # recover gc        self.recov_geomcol(s_tbl, s_gc_src)        if s_gc_dst is None:            # 既存の名称がジオメトリに合っているかどうかを確認            geom_type, epsg = self.get_type_and_epsg(s_tbl, s_gc_src)            type_abr = self.get_type_abr(geom_type)            s_gc_dst = "geom_{}_{}".format(type_abr, epsg)            if s_gc_src != s_gc_dst:                gt_dst = self.rename_geomcol(s_tbl, s_gc_src)            else:  # 既にキャスト後のジオメトリカラム名に適合しているならばそのままでよい                gt_dst = GTBL(self, s_tbl, epsg, type_abr, s_gc_dst)        else:            gt_dst = self.rename_geomcol(s_tbl, s_gc_src, s_gc_dst)        return gt_dst    # append src table to dst table    def append_table(        self,        gt_or_tbl_src,        s_tbl_dst,        s_gc=None,        flg_multi=False,        flg_drop=False,        s_db="main",    ):        """        テーブルへのデータ挿入（追加）        appendモードは便利で、テーブルがなければ新設、あれば追加で機能する。        """        if isinstance(gt_or_tbl_src, GTBL):            s_tbl_src = gt_or_tbl_src.name            s_gc = gt_or_tbl_src.gc        elif isinstance(gt_or_tbl_src, (str,)):            s_tbl_src = gt_or_tbl_src        else:            logger.warning("given parameter {} is invalid.".format(gt_or_tbl_src))            return 0        # マルチモードへの統合が有効になっている場合、いったんキャストしたテーブルを生成する        if flg_multi and s_gc is not None:            s_tbl_temp_multi = self.get_temptblname("multi")            sql = """select CloneTable('{}','{}','{}',1,'::cast2multi::{}');""".format(                s_db, s_tbl_src, s_tbl_temp_multi, s_gc            )            self.execute(sql)            sql = """select CloneTable('{}','{}','{}',1,'::append::');""".format(                s_db, s_tbl_temp_multi, s_tbl_dst            )            self.execute(sql)            self.drop_geotable(s_tbl_temp_multi)        else:  # それ以外は（ジオメトリがない場合も含め）通常のCloneで対応            self.commit()            sql = """select CloneTable('{}','{}','{}',1,'::append::');""".format(                s_db, s_tbl_src, s_tbl_dst            )            result = self.execute(sql).fetchone()[0]            logger.info("Clone execution result is {}".format(result))        if flg_drop is True:  # オリジナルのテーブルを削除            self.drop_geotable(s_tbl_src)    # rename geotable    def rename_geotable(self, s_tbl_old, s_tbl_new, l_options=None):        """        it may have multiple geometry column, no GTBL object will be returned.        """        logger.info('rename "{}" to "{}"'.format(s_tbl_old, s_tbl_new))        self.clear_node_cache(s_tbl_old)        # CloneTableのオプションがなければ、ALTER TABLEでその場でリネームする        if l_options is None and self.rename_inplace(s_tbl_old, s_tbl_new=s_tbl_new):            return        # 新しいテーブルを生成        self.clone_table(s_tbl_old, s_tbl_new, l_options=l_options)        # オリジナルを削除        self.drop_geotable(s_tbl_old)        # メタデータ更新（対象レイヤーのみ）        self.clear_meta_cache()        for d_geomcol in self.get_geomcols_meta(s_tbl_new):            self.update_layerstats(s_tbl_new, d_geomcol["f_geometry_column"])    # ALTER TABLE RENAMEが使えるかどうか（SQLite 3.25以降）    @staticmethod    def ch_alter_rename():        return sqlite3.sqlite_version_info >= (3, 25, 0)    # ジオメトリカラムに付随するトリガーを削除する（SpatiaLite 4.x）    def drop_geomtriggers(self, s_tbl, s_gc):        l_name = [            f"{s_prefix}_{s_tbl}_{s_gc}".lower()            for s_prefix in "ggi ggu gii giu gid gci gcu gcd tmi tmu tmd".split()        ]        rows = self.execute(            """SELECT "name" FROM "SQLITE_MASTER" WHERE "type" IS 'trigger' AND lower("tbl_name") = ?;""",            (s_tbl.lower(),),        ).fetchall()        for row in rows:            if row["name"].lower() in l_name:                self.execute(f"""DROP TRIGGER "{row["name"]}";""")    # 1つのジオメトリカラムのトリガーを作成する（SpatiaLite 4.x。UpgradeGeometryTriggersと同じ定義）    def create_geomtriggers(self, s_tbl, s_gc, flg_spindex=False):        s_tbl_q = s_tbl.replace("'", "''")        s_gc_q = s_gc.replace("'", "''")        s_where = f"""Lower(f_table_name) = Lower('{s_tbl_q}') AND Lower(f_geometry_column) = Lower('{s_gc_q}')"""        # ジオメトリタイプ・SRIDの制約        for s_prefix, s_event in (            ("ggi", "INSERT"),            ("ggu", f'UPDATE OF "{s_gc}"'),        ):            self.execute(                f"""                CREATE TRIGGER "{s_prefix}_{s_tbl}_{s_gc}" BEFORE {s_event} ON "{s_tbl}"                FOR EACH ROW BEGIN                SELECT RAISE(ABORT,'{s_tbl_q}.{s_gc_q} violates Geometry constraint [geom-type or SRID not allowed]')                WHERE (SELECT geometry_type FROM geometry_columns                WHERE {s_where}                AND GeometryConstraints(NEW."{s_gc}", geometry_type, srid) = 1) IS NULL;                END            ;"""            )        # 更新時刻の記録        if self.ch_exists_table("geometry_columns_time"):            for s_prefix, s_event, s_col_time in (                ("tmi", "INSERT", "last_insert"),                ("tmu", "UPDATE", "last_update"),                ("tmd", "DELETE", "last_delete"),            ):                self.execute(                    f"""                    CREATE TRIGGER "{s_prefix}_{s_tbl}_{s_gc}" AFTER {s_event} ON "{s_tbl}"                    FOR EACH ROW BEGIN                    UPDATE geometry_columns_time SET {s_col_time} = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')                    WHERE {s_where};                    END                ;"""                )        # R*Treeの更新        if flg_spindex:            s_idx = f"idx_{s_tbl}_{s_gc}"            s_idx_q = s_idx.replace("'", "''")            for s_prefix, s_event, s_row in (                ("gii", "INSERT", "NEW"),                ("giu", f'UPDATE OF "{s_gc}"', "NEW"),            ):                self.execute(                    f"""                    CREATE TRIGGER "{s_prefix}_{s_tbl}_{s_gc}" AFTER {s_event} ON "{s_tbl}"                    FOR EACH ROW BEGIN                    DELETE FROM "{s_idx}" WHERE pkid={s_row}.ROWID;                    SELECT RTreeAlign('{s_idx_q}', {s_row}.ROWID, {s_row}."{s_gc}");                    END                ;"""                )            self.execute(                f"""                CREATE TRIGGER "gid_{s_tbl}_{s_gc}" AFTER DELETE ON "{s_tbl}"                FOR EACH ROW BEGIN                DELETE FROM "{s_idx}" WHERE pkid=OLD.ROWID;                END            ;"""            )    # ジオメトリカラムのメタデータ（geometry_columns等）の名称を書き換える（SpatiaLite 4.x）    def rename_geomcols_meta(self, s_tbl_old, s_tbl_new, s_gc_old=None, s_gc_new=None):        for s_meta, s_col_tbl, s_col_gc in (            ("geometry_columns", "f_table_name", "f_geometry_column"),            ("geometry_columns_auth", "f_table_name", "f_geometry_column"),            ("geometry_columns_statistics", "f_table_name", "f_geometry_column"),            ("geometry_columns_field_infos", "f_table_name", "f_geometry_column"),            ("geometry_columns_time", "f_table_name", "f_geometry_column"),            ("views_geometry_columns", "f_table_name", "f_geometry_column"),            ("vector_coverages", "f_table_name", "f_geometry_column"),        ):            if not self.ch_exists_table(s_meta):                continue            if s_gc_old is None:                sql = f"""                    UPDATE "{s_meta}" SET "{s_col_tbl}" = lower(?)                    WHERE lower("{s_col_tbl}") = lower(?)                ;"""                self.execute(sql, (s_tbl_new, s_tbl_old))            else:                sql = f"""                    UPDATE "{s_meta}" SET "{s_col_gc}" = lower(?)                    WHERE lower("{s_col_tbl}") = lower(?) AND lower("{s_col_gc}") = lower(?)                ;"""                self.execute(sql, (s_gc_new, s_tbl_old, s_gc_old))    # ALTER TABLEによるジオテーブル・ジオメトリカラムのリネーム（失敗時はFalseを返す）    def rename_inplace(self, s_tbl, s_tbl_new=None, s_gc=None, s_gc_new=None):        """        テーブルを複製せずにリネームする。s_gcを与えるとジオメトリカラムのリネームとなる。        SpatiaLite 5以降はRenameTable/RenameColumnを、4.xではALTER TABLEとgeometry_columns等の        書き換え・R*Treeのリネーム・トリガーの再作成を行う。統計情報は対象レイヤーのみ更新する。        SQLiteが古い、あるいはMbrCacheを使っている場合は何もせずFalseを返す（複製による処理に任せる）。        """        ld_geomcol = self.get_geomcols_meta(s_tbl, s_gc)        if not self.ch_alter_rename() or any(            [d["spatial_index_enabled"] not in (0, 1) for d in ld_geomcol]        ):            return False        self.commit()        try:            if self.get_spatialite_version() >= "5.0.0":                if s_gc is None:                    sql = f"""SELECT RenameTable('main', '{s_tbl}', '{s_tbl_new}');"""                else:                    sql = f"""SELECT RenameColumn('main', '{s_tbl}', '{s_gc}', '{s_gc_new}');"""                if self.execute(sql).fetchone()[0] != 1:                    self.clear_meta_cache()                    return False            else:                self.begin()                self.execute("""PRAGMA defer_foreign_keys = ON;""")                for d_geomcol in ld_geomcol:                    self.drop_geomtriggers(s_tbl, d_geomcol["f_geometry_column"])                if s_gc is None:                    self.execute(f"""ALTER TABLE "{s_tbl}" RENAME TO "{s_tbl_new}";""")                else:                    self.execute(                        f"""ALTER TABLE "{s_tbl}" RENAME COLUMN "{s_gc}" TO "{s_gc_new}";"""                    )                for d_geomcol in ld_geomcol:                    s_gc_old = d_geomcol["f_geometry_column"]                    s_idx_old = f"idx_{s_tbl}_{s_gc_old}"                    if s_gc is None:                        s_idx_new = f"idx_{s_tbl_new}_{s_gc_old}"                    else:                        s_idx_new = f"idx_{s_tbl}_{s_gc_new}"                    if self.ch_exists_table(s_idx_old):                        self.execute(                            f"""ALTER TABLE "{s_idx_old}" RENAME TO "{s_idx_new}";"""                        )                if s_gc is None:                    self.rename_geomcols_meta(s_tbl, s_tbl_new)                else:                    self.rename_geomcols_meta(s_tbl, s_tbl, s_gc, s_gc_new)                # 対象レイヤーのトリガーだけを新しい名称で作成する                for d_geomcol in ld_geomcol:                    self.create_geomtriggers(                        s_tbl if s_tbl_new is None else s_tbl_new,                        d_geomcol["f_geometry_column"] if s_gc is None else s_gc_new,                        d_geomcol["spatial_index_enabled"] == 1,                    )                self.commit()        except sqlite3.Error as e:            logger.warning(f"in-place rename failed, fall back to cloning: {e}")            if self.in_transaction:                self.rollback()            self.clear_meta_cache()            return False        # 統計情報の更新（対象レイヤーのみ）        self.clear_meta_cache()        s_tbl_dst = s_tbl if s_tbl_new is None else s_tbl_new        for d_geomcol in self.get_geomcols_meta(s_tbl_dst, s_gc_new):            self.update_layerstats(s_tbl_dst, d_geomcol["f_geometry_column"])        return True    # get table list (return in utf)    def get_tbllist(self, s_likephrase=None):  # 名称条件はLikeなので％利用可能        if s_likephrase is None:            sql = """SELECT "name" FROM "SQLITE_MASTER" WHERE "type" IS 'table';"""        else:            sql = """                select "name" from "SQLITE_MASTER" where "type" is 'table' and "name" like '{}';            """.format(                s_likephrase            )        rows = self.execute(sql)        l_tbl = sorted([i["name"] for i in rows])        return l_tbl    # テーブルの列情報を得る。戻り値は各カラムの辞書（name, type, notnull, dflt_value, pk）のリスト    def get_columnsdef(self, gt_or_tbl, flg_except_gc=False) -> dict:        """        This function returns the column information of the table.        return :dict of columns info [name, type, notnull, default_value, pk]        """        s_tbl = self.get_tblname(gt_or_tbl)        if isinstance(gt_or_tbl, (str,)) and flg_except_gc is True:            logger.warning("when tblname is given then flg_except_gc must be set False")            return 0  # 処理終了        ld_coldef = self.get_tblinfo_meta(s_tbl)        if flg_except_gc:            ld_coldef = [                d_columninfo                for d_columninfo in ld_coldef                if d_columninfo["name"].lower() != gt_or_tbl.gc.lower()            ]        return ld_coldef    # get geometry type of target column    def get_geomtype(self, gt_or_tbl, s_gc=None):  # （登録されている）ジオメトリタイプを取得する        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        rows = self.get_tblinfo_meta(s_tbl)        s_geomtype = [i["type"] for i in rows if i["name"].lower() == s_gc.lower()][            0        ]  # Geom と geom を等価とする。        return s_geomtype    # get srid of geometry    def get_epsg(self, gt_or_tbl, s_gc=None):  # ジオメトリのSRIDを取得する        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        # 登録されているジオメトリカラムであればメタデータから得る        ld_geomcol = self.get_geomcols_meta(s_tbl, s_gc)        if len(ld_geomcol) == 1:            return ld_geomcol[0]["srid"]        sql = """select distinct Srid("{}") as srid from "{}" where srid is not NULL;""".format(            s_gc, s_tbl        )        i_epsg = self.execute(sql).fetchone()[0]        return i_epsg    def ch_epsg_coordtype(self, i_epsg):        sql = """SELECT "is_geographic" FROM "spatial_ref_sys_all" WHERE "srid" == {};""".format(            i_epsg        )        i = self.execute(sql).fetchone()[0]        if i == 1:            return "geographic"  # 地理座標系        elif i == 0:            return "projected"  # 投影座標系        else:            logger.error('Error: given epsg "{}" is invalid.'.format(i_epsg))            return 0    # make valid geometry （return geometry column name）    def make_valid(self, gt_or_tbl, s_gc=None, flg_addcol=False):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        if flg_addcol:  # 修正カラムを生成する場合            s_gc_valid = "{}_valid".format(s_gc)            i_epsg = self.get_epsg(s_tbl, s_gc)            s_geomtype = self.get_geomtype(s_tbl, s_gc)            self.add_geomcol(                s_tbl, i_epsg, s_geomtype, s_gc_valid, s_dimension="XY", i_notnull=0            )            self.discard_geomcol(s_tbl, s_gc)  # 古いジオメトリカラムをDiscard            # ジオメトリを複写            sql = """update "{}" set "{}" = "{}";""".format(s_tbl, s_gc_valid, s_gc)            self.execute(sql)            s_gc = s_gc_valid  # 追加したカラムをメインカラムとする        sql = """            update "{tbl}" set "{gc}" = ST_MakeValid("{gc}") where ST_IsValid("{gc}") != 1;        """.format(            tbl=s_tbl, gc=s_gc        )        self.execute(sql)        return s_gc  # flg_addcol = True の場合はカラム名が変わるので、戻り値として与える    # get x,y of each min and max with list    def get_extent(self, gt_or_tbl_cover, i_epsg_dst=None):        """        :param gt_or_tbl_cover:        :param i_epsg_dst:        :return: l_nesw        """        s_tbl_cover = self.get_tblname(gt_or_tbl_cover)        if i_epsg_dst is None:            sql = """                select ST_MaxY(geom) as y2, ST_MaxX(geom) as x2, ST_MinY(geom) as y1, ST_MinX(geom) as x1                from (select GetLayerExtent('{tbl}') as geom                );            """.format(                tbl=s_tbl_cover            )        elif isinstance(i_epsg_dst, int):            sql = """                select ST_MaxY(geom) as y2, ST_MaxX(geom) as x2, ST_MinY(geom) as y1, ST_MinX(geom) as x1                from (select ST_Transform(GetLayerExtent('{tbl}'), {epsg}) as geom                );            """.format(                tbl=s_tbl_cover, epsg=i_epsg_dst            )        else:            logger.warning(                f"{self.get_method_name()}: given parameter is something wrowg...: "            )            return        l_extent_nesw = list(self.execute(sql).fetchone())        return l_extent_nesw  # NESW    # ジオテーブルをROWID順のバッチで読み出し、列指向の配列（NumPy）として返す    def iter_geotable(self, gt, columns=None, batch_size=100000, where=None, t_mbr=None):        """        行ごとにSQL関数（AsText等）を呼ばず、BLOBをPython側でまとめて変換する（mod_geomblob.decode_columns）。        保持するのは1バッチ分の行のみなので、メモリ使用量はbatch_sizeで決まる。        :param gt: GTBL（typeによって座標・オフセットの配列の構成が決まる）        :param columns: 属性のカラム名のリスト。Noneならジオメトリカラム以外の全カラム        :param batch_size: 1バッチの行数        :param where: 追加の条件（WHERE句の式）        :param t_mbr: (minx, miny, maxx, maxy)。MBRが交差する地物に絞り込む（空間インデックスのR*Treeがあれば使う）。            R*Treeを使う場合、バッチはR*Treeの走査順に区切られ、バッチ内がROWID順になる。            空間インデックスは作成しない（書き込みを行わない）ため、無い場合は全件を走査してBLOBのMBRで判定する        :return: バッチごとに {"rowid": ndarray, カラム名: ndarray, ..., "geom": decode_columns()の結果} を返すジェネレーター            INTEGER, REALのカラムはint64, float64（REALのNULLはNaN、NULLを含むINTEGERはobject）、それ以外はobject。        """        import mod_geomblob        if batch_size < 1:            raise ValueError(f"batch_size must be positive, but {batch_size} was set.")        d_decltype = {d["name"].lower(): d["type"] for d in self.get_columnsdef(gt.name)}        if columns is None:            set_gc = {                d["f_geometry_column"].lower() for d in self.get_geomcols_meta(gt.name)            } | {gt.gc.lower()}            columns = [                d["name"]                for d in self.get_columnsdef(gt.name)                if d["name"].lower() not in set_gc            ]        s_cols = "".join([f'"{s_col}", ' for s_col in columns])        s_where = f"AND ({where})" if where is not None else ""        # 1バッチ分の行を、属性の配列とジオメトリの配列にする        def to_batch(rows):            l_val = list(zip(*rows))            d_batch = {"rowid": self.to_column_array(l_val[0], "INTEGER")}            for i, s_col in enumerate(columns, 1):                d_batch[s_col] = self.to_column_array(                    l_val[i], d_decltype.get(s_col.lower())                )            d_batch["geom"] = mod_geomblob.decode_columns(l_val[-1], gt.type)            return d_batch        # BLOBのヘッダーのMBRがt_mbrと交差するか（R*TreeのMBRはfloat32に丸められているので、こちらで判定し直す）        def ch_mbr(blob):            if blob is None:                return False            t_mbr_row = mod_geomblob.read_header(blob)[2]            return (                t_mbr_row[0] <= t_mbr[2]                and t_mbr_row[2] >= t_mbr[0]                and t_mbr_row[1] <= t_mbr[3]                and t_mbr_row[3] >= t_mbr[1]            )        # 読み出し専用の接続でも使えるよう、空間インデックスは作成しない（無ければ全件をROWID順に走査する）        s_idx = f"idx_{gt.name}_{gt.gc}"        flg_rtree = (            t_mbr is not None            and s_idx.lower() in self.get_tblset_meta()            and any(                [                    d["spatial_index_enabled"] == 1                    for d in self.get_geomcols_meta(gt.name, gt.gc)                ]            )        )        if t_mbr is not None and not flg_rtree:            logger.warning(                f'"{gt.name}"."{gt.gc}" has no spatial index. all rows are scanned.'            )        if not flg_rtree:            i_rowid = None            while True:                rows = self.execute(                    f"""                    SELECT ROWID, {s_cols}"{gt.gc}" FROM "{gt.name}"                    WHERE ROWID > ? {s_where}                    ORDER BY ROWID LIMIT ?                ;""",                    (-(2**63) if i_rowid is None else i_rowid, batch_size),                ).fetchall()                if not rows:                    break                i_rowid = rows[-1][0]                if t_mbr is not None:                    rows = [row for row in rows if ch_mbr(row[-1])]                if rows:                    yield to_batch(rows)            return        # R*Treeの候補を順に読み、ROWIDの範囲ごとに本体を引く        minx, miny, maxx, maxy = t_mbr        cur_idx = self.execute(            f"""            SELECT "pkid" FROM "{s_idx}"            WHERE "xmin" <= ? AND "xmax" >= ? AND "ymin" <= ? AND "ymax" >= ?        ;""",            (maxx, minx, maxy, miny),        )        i_chunk = 10000  # IN句に並べるROWIDの数        while True:            l_pkid = sorted([row[0] for row in cur_idx.fetchmany(batch_size)])            if not l_pkid:                break            rows = []            for i in range(0, len(l_pkid), i_chunk):                s_pkid = ",".join([str(i_pkid) for i_pkid in l_pkid[i : i + i_chunk]])                rows += [                    row                    for row in self.execute(                        f"""                        SELECT ROWID, {s_cols}"{gt.gc}" FROM "{gt.name}"                        WHERE ROWID IN ({s_pkid}) {s_where}                        ORDER BY ROWID                    ;"""                    )                    if ch_mbr(row[-1])                ]            if rows:                yield to_batch(rows)    # 値のリストを宣言型に応じたNumPy配列にする    @staticmethod    def to_column_array(l_val, s_decltype):        import numpy as np        s_decltype = (s_decltype or "").upper()        try:            if "INT" in s_decltype and None not in l_val:                return np.array(l_val, dtype=np.int64)            elif any([s in s_decltype for s in ("REAL", "FLOA", "DOUB")]):                return np.array(                    [np.nan if v is None else v for v in l_val], dtype=np.float64                )        except (TypeError, ValueError, OverflowError):  # 宣言型と異なる値が格納されている            pass        a_val = np.empty(len(l_val), dtype=object)        a_val[:] = l_val        return a_val    # transform geotable ジオメトリカラムの名称と内容が合致しなくなる可能性があるので注意。    def transform_geotable(        self, gt_or_tbl, i_epsg_dst, s_gc=None, s_dimension="XY", s_gc_dst=None    ):        s_tbl, s_gc = self.get_tblname_and_gc(gt_or_tbl, s_gc)        # ジオメトリカラムを差し替える場合、先にリネームする（可能ならALTER TABLEでその場で）        if s_gc_dst is not None and s_gc != s_gc_dst:            self.rename_geomcol(s_tbl, s_gc, s_gc_dst)            s_gc = s_gc_dst        # 投影変換        s_geomtype = self.get_geomtype(s_tbl, s_gc)        self.discard_geomcol(s_tbl, s_gc)        sql = """update "{0}" set "{1}" = ST_Transform("{1}",{2});""".format(            s_tbl, s_gc, i_epsg_dst        )        self.execute(sql.format(s_tbl, s_gc, i_epsg_dst))        gt = self.recov_geomcol(s_tbl, i_epsg_dst, s_geomtype, s_gc, s_dimension)        self.update_layerstats(s_tbl, s_gc)        return gt    # build point geometry    def build_point(        self,        s_tbl,        s_gc,        i_epsg,        s_geomtype,        r_x,        r_y,        r_z=None,        s_dimension="XY",        i_notnull=0,    ):        # 対象テーブルにジオメトリカラムを追加        self.add_geomcol(s_tbl, i_epsg, s_geomtype, s_gc, s_dimension, i_notnull)        # ポイントジオメトリをupdate        if s_dimension == "XY":            self.update_column(                s_tbl, s_gc, "MakePoint({},{},{})".format(r_x, r_y, i_epsg), True            )            s_type_abr = "pt"        elif s_dimension == "XYZ":            self.update_column(                s_tbl,                s_gc,                "MakePointZ({},{},{},{})".format(r_x, r_y, r_z, i_epsg),                True,            )            s_type_abr = "ptz"        else:            logger.warning("given parameter: s_dimension is strange.")            return 0        return GTBL(self, s_tbl, i_epsg, s_type_abr, s_gc)    # 座標の配列と属性の配列から点のジオテーブルへ一括で書き込む    def load_points(        self,        gt,        x,        y,        z=None,        d_attr=None,        i_epsg_src=None,        i_chunk=100000,        flg_overwrite=False,        add_spidx=True,    ):        """        BLOBはPython側で生成し（mod_geomblob.encode_points）、i_chunk件ずつ1トランザクションのexecutemanyでInsertする。        :param gt: 書込先のGTBL（POINT or POINT Z）。テーブルが無ければ作成する        :param x: x座標の配列        :param y: y座標の配列        :param z: z座標の配列（POINT Zの場合）        :param d_attr: {カラム名: 値の配列}。書込先に無いカラムは追加する        :param i_epsg_src: 座標のEPSG。gt.epsgと異なる場合はInsert文の中でST_Transformする        :param flg_overwrite: Trueの場合、既存のテーブルを削除して作り直す        :return: gt        """        import numpy as np        if d_attr is None:            d_attr = {}        x = np.asarray(x, dtype=np.float64)        y = np.asarray(y, dtype=np.float64)        z = np.asarray(z, dtype=np.float64) if z is not None else None        d_attr = {s_col: np.asarray(a_val) for s_col, a_val in d_attr.items()}        for s_name, a_val in [("y", y), ("z", z)] + list(d_attr.items()):            if a_val is not None and len(a_val) != len(x):                raise ValueError(                    f'length of "{s_name}" ({len(a_val)}) differs from x ({len(x)}).'                )        self.ch_point_load_args(gt, z is not None, i_epsg_src, flg_overwrite)        ll_coldef = []        for s_col, a_val in d_attr.items():            if a_val.dtype.kind in ("i", "u", "b"):                ll_coldef.append([s_col, "INTEGER"])            elif a_val.dtype.kind == "f":                ll_coldef.append([s_col, "DOUBLE"])            else:                ll_coldef.append([s_col, "TEXT"])        def iter_chunk():            for i in range(0, len(x), i_chunk):                s = slice(i, i + i_chunk)                yield (                    x[s],                    y[s],                    z[s] if z is not None else None,                    [a_val[s].tolist() for a_val in d_attr.values()],                )        return self.insert_point_chunks(            gt, ll_coldef, iter_chunk(), i_epsg_src, flg_overwrite, add_spidx        )    # CSVを読みながら点のジオテーブルへ一括で書き込む    def load_points_csv(        self,        gt,        p_csv,        s_col_x,        s_col_y,        s_col_z=None,        l_col=None,        i_epsg_src=None,        s_chcode="utf-8",        s_delimiter=",",        i_chunk=100000,        flg_overwrite=False,        add_spidx=True,    ):        """        load_pointsのCSV版。i_chunk行ずつ読み込んで書き込むため、ファイル全体をメモリに載せない。        属性の値は文字列のまま渡し（空文字はNULL）、カラムの型（最初のi_chunk行から推定）による型変換に任せる。        :param p_csv: ヘッダー行のあるCSVのパス        :param s_col_x: x座標の列名        :param s_col_y: y座標の列名        :param s_col_z: z座標の列名（POINT Zの場合）        :param l_col: 属性として書き込む列名のリスト。Noneなら座標以外の全列        :return: gt        """        import csv        import itertools        import numpy as np        # 数値の列の型を推定する        def get_coltype(l_val):            l_val = [s_val for s_val in l_val if s_val != ""]            for s_type, func in (("INTEGER", int), ("DOUBLE", float)):                try:                    for s_val in l_val:                        func(s_val)                    return s_type                except ValueError:                    continue            return "TEXT"        def to_coords(l_val):            return np.array([s_val or "nan" for s_val in l_val], dtype=np.float64)        with open(p_csv, newline="", encoding=s_chcode) as f:            reader = csv.reader(f, delimiter=s_delimiter)            l_header = next(reader)            if l_col is None:                l_col = [s for s in l_header if s not in (s_col_x, s_col_y, s_col_z)]            l_missing = [                s_col                for s_col in [s_col_x, s_col_y, s_col_z] + list(l_col)                if s_col is not None and s_col not in l_header            ]            if l_missing:                raise ValueError(f"columns {l_missing} are not in the CSV header.")            self.ch_point_load_args(gt, s_col_z is not None, i_epsg_src, flg_overwrite)            l_idx_attr = [l_header.index(s_col) for s_col in l_col]            i_x = l_header.index(s_col_x)            i_y = l_header.index(s_col_y)            i_z = l_header.index(s_col_z) if s_col_z is not None else None            # i_chunk行を読む（列数が合わない行は、途中で失敗しないよう読み飛ばす）            def read_chunk():                l_row = list(itertools.islice(reader, i_chunk))                l_row_ok = [row for row in l_row if len(row) == len(l_header)]                if len(l_row_ok) < len(l_row):                    logger.warning(                        f"{len(l_row) - len(l_row_ok)} rows were skipped: "                        f"the number of fields differs from the header."                    )                return len(l_row) > 0, l_row_ok            flg_first, l_first = read_chunk()            ll_coldef = [                [s_col, get_coltype([row[i] for row in l_first])]                for s_col, i in zip(l_col, l_idx_attr)            ]            def iter_chunk():                flg_read, l_row = flg_first, l_first                while flg_read:                    yield (                        to_coords([row[i_x] for row in l_row]),                        to_coords([row[i_y] for row in l_row]),                        to_coords([row[i_z] for row in l_row]) if i_z is not None else None,                        [[row[i] or None for row in l_row] for i in l_idx_attr],                    )                    flg_read, l_row = read_chunk()            return self.insert_point_chunks(                gt, ll_coldef, iter_chunk(), i_epsg_src, flg_overwrite, add_spidx            )    # 点の一括書き込みの引数を検証する（コミット済みのチャンクを残して途中で失敗しないよう、書き込み前に確認する）    def ch_point_load_args(self, gt, flg_z, i_epsg_src=None, flg_overwrite=False):        if gt.type not in ("POINT", "POINT Z"):            raise ValueError(f"gt must be POINT or POINT Z, but {gt.type} was set.")        if flg_z != (gt.type == "POINT Z"):            raise ValueError(                f"z coordinates are {'given' if flg_z else 'missing'}, but gt.type is {gt.type}."            )        # 既存のテーブルに追記する場合は、登録されているタイプ・SRIDと一致すること        if not flg_overwrite and self.ch_exists_table(gt.name):            if not self.get_geomcols_meta(gt.name, gt.gc):                raise ValueError(                    f'"{gt.name}"."{gt.gc}" is not a registered geometry column.'                )            s_type, i_srid = self.get_type_and_epsg(gt.name, gt.gc)            if (s_type, i_srid) != (gt.type, gt.epsg):                raise ValueError(                    f'"{gt.name}"."{gt.gc}" is {s_type} ({i_srid}), but gt is {gt.type} ({gt.epsg}).'                )        for i_epsg in {gt.epsg, gt.epsg if i_epsg_src is None else i_epsg_src}:            if not self.execute(                """SELECT 1 FROM "spatial_ref_sys" WHERE "srid" = ?;""", (int(i_epsg),)            ).fetchone():                raise ValueError(f"SRID {i_epsg} is not defined in spatial_ref_sys.")    # 点のチャンク（x, y, z, 属性の値のリストのリスト）を順に書き込む（引数はch_point_load_argsで検証済みとする）    def insert_point_chunks(        self, gt, ll_coldef, it_chunk, i_epsg_src=None, flg_overwrite=False, add_spidx=True    ):        import time        import mod_geomblob        if i_epsg_src is None:            i_epsg_src = gt.epsg        # 書込先のテーブルを用意する（既存の場合は無いカラムを追加する）        flg_new = flg_overwrite or not self.ch_exists_table(gt.name)        if flg_new:            self.create_table(gt, ll_coldef or None)            gt = GTBL(self, gt.name, gt.epsg, gt.type_abr, gt.gc)        else:            l_col_lower = [r["name"].lower() for r in self.get_tblinfo_meta(gt.name)]            for s_col, s_type_sql in ll_coldef:                if s_col.lower() not in l_col_lower:                    self.add_column(gt.name, s_col, s_type_sql)        # 座標系が異なる場合は、Insert文の中でまとめて変換する        s_cols = ", ".join([f'"{l_coldef[0]}"' for l_coldef in ll_coldef] + [f'"{gt.gc}"'])        s_holder = ", ".join(            ["?"] * len(ll_coldef)            + ["?" if i_epsg_src == gt.epsg else f"ST_Transform(?, {gt.epsg})"]        )        sql = f"""INSERT INTO "{gt.name}" ({s_cols}) VALUES ({s_holder});"""        i_rows = 0        t_start = time.perf_counter()        for x, y, z, ll_val in it_chunk:            l_blob = mod_geomblob.encode_points(x, y, i_epsg_src, z)            self.begin()            self.executemany(sql, zip(*ll_val, l_blob))            self.commit()            i_rows += len(l_blob)        f_insert = time.perf_counter() - t_start        # 空間インデックス・統計情報は最後にまとめて更新        if flg_new and add_spidx:            self.add_spindex(gt)        self.update_layerstats(gt.name, gt.gc)        logger.info(            f"""loaded {i_rows} points into "{gt.name}" in {f_insert:.2f} s """            f"""({i_rows / f_insert if f_insert > 0 else 0:.0f} rows/s)."""        )        return gt    def get_type_and_epsg(self, s_tbl, s_gc):        # 登録されているジオメトリカラムであればメタデータから得る（GEOMETRY型などは実データから判定する）        d_type = {            1: "POINT",            2: "LINESTRING",            3: "POLYGON",            4: "MULTIPOINT",            5: "MULTILINESTRING",            6: "MULTIPOLYGON",        }        d_dims = {0: "", 1: " Z", 2: " M", 3: " ZM"}        ld_geomcol = self.get_geomcols_meta(s_tbl, s_gc)        if len(ld_geomcol) == 1:            i_type = ld_geomcol[0]["geometry_type"]            if isinstance(i_type, int) and i_type % 1000 in d_type:                geom_type = d_type[i_type % 1000] + d_dims[i_type // 1000]                return geom_type, ld_geomcol[0]["srid"]        sql = """SELECT DISTINCT GeometryType("{gc}") AS type, SRID("{gc}") AS srid FROM "{tbl}";""".format(            tbl=s_tbl, gc=s_gc        )        # print(sql)        fetched = self.execute(sql).fetchone()        geom_type = fetched[0]        i_epsg = fetched[1]        return geom_type, i_epsg    # rename geometry column and return gtbl    def rename_geomcol(self, gt_or_tbl, s_gc_src=None, s_gc_dst=None):        s_tbl = self.get_tblname(gt_or_tbl)        if isinstance(gt_or_tbl, GTBL) and s_gc_src is None:            s_gc_src = gt_or_tbl.gc            geom_type = gt_or_tbl.type            geom_type_abr = gt_or_tbl.type_abr            i_epsg = gt_or_tbl.epsg        elif isinstance(gt_or_tbl, (str,)) and s_gc_src is not None:            geom_type, i_epsg = self.get_type_and_epsg(s_tbl, s_gc_src)            geom_type_abr = self.get_type_abr(geom_type)        else:            logger.warning(                f"{self.get_method_name()}: given parameter is something wrong"            )            logger.info("given gt_or_tbl is {}".format(gt_or_tbl))            logger.info("given s_gc_src is {}".format(s_gc_src))            logger.info("given s_gc_dst is {}".format(s_gc_dst))            return 0  # 処理終了        if s_gc_dst is None:  # ジオメトリカラム名を与えない場合は自動付与            s_gc_dst = "geom_{}_{}".format(geom_type_abr, i_epsg)        # ジオメトリカラムの差し替え        logger.info(            'geometry column "%s" of table "%s" will be renamed to "%s".',            s_gc_src,            s_tbl,            s_gc_dst,        )        # ALTER TABLEによりその場でリネームする（できない場合はテーブルを複製して差し替える）        if s_gc_dst == s_gc_src or self.rename_inplace(            s_tbl, s_gc=s_gc_src, s_gc_new=s_gc_dst        ):            return GTBL(self, s_tbl, i_epsg, geom_type_abr, s_gc_dst)        s_tbl_temp = self.get_temptblname()        self.rename_geotable(s_tbl, s_tbl_temp)        sql = """select CreateClonedTable('main','{tbl_src}','{tbl_dst}',1,'::ignore::{gc}');""".format(            tbl_src=s_tbl_temp, tbl_dst=s_tbl, gc=s_gc_src        )        self.execute(sql)        self.add_geomcol(s_tbl, i_epsg, geom_type, s_gc_dst)        self.begin()        self.execute(f"""INSERT INTO "{s_tbl}" SELECT * FROM "{s_tbl_temp}";""")        self.commit()        self.drop_geotable(s_tbl_temp)        self.clear_meta_cache()        gt_out = GTBL(self, s_tbl, i_epsg, geom_type_abr, s_gc_dst)        return gt_out    # divide elementary geometries and return gtbl    def divide_elem(        self,        gt_or_tbl_in,        s_gc=None,        s_tbl_dst=None,        out_pk="PK_UID_elem",        out_multi_id="PK_UID_multi",        transaction=1,        flg_replace=True,        l_col_ignore=None,    ):        s_tbl_src, s_gc = self.get_tblname_and_gc(gt_or_tbl_in, s_gc)        if s_tbl_dst is None:            s_tbl_dst = "{}_elem".format(s_tbl_src)        # 同名のものがあれば削除する        if flg_replace:            self.drop_geotable(s_tbl_dst)        if l_col_ignore is None:            sql = """                SELECT ElementaryGeometries('{}', '{}', '{}', '{}', '{}', {});            """.format(                s_tbl_src, s_gc, s_tbl_dst, out_pk, out_multi_id, transaction            )        else:            sql = """                SELECT ElementaryGeometries('{}', '{}', '{}', '{}', '{}', {}, {});            """.format(                s_tbl_src,                s_gc,                s_tbl_dst,                out_pk,                out_multi_id,                transaction,                ", ".join(["'::ignore::{}'".format(s_col) for s_col in l_col_ignore]),            )        # print(sql)        self.execute(sql)        # ジオメトリカラム名を変更し、新たなgtblを得る。        gt_out = self.rename_geomcol(s_tbl_dst, s_gc)        return gt_out    # convert dbf to existing sqlite database    def dbf2spatialite(        self, path_dbf, s_tbl_dst, s_chcode_src, flg_append=True, flg_overwrite=True    ):        import os        if flg_append:            # dbfを読み込み -> temp            s_temptbl = self.get_temptblname("dbftemp")        else:            if not self.ch_exists_table(s_tbl_dst):                s_temptbl = s_tbl_dst            elif flg_overwrite:  # テーブルが存在する場合、上書きフラグが有効なら先だって削除する                self.drop_geotable(s_tbl_dst)                s_temptbl = s_tbl_dst            else:                logger.warning(                    'the table "%s" cannot be created because it is already exists.',                    s_tbl_dst,                )                return 0        # ImportDBFは拡張子ありでよい（ややこしい、、）        sql = """select ImportDBF('{}','{}','{}');""".format(            path_dbf, s_temptbl, s_chcode_src        )        self.execute(sql)        # dbf名をデータに追加        self.add_column(s_temptbl, "dbf_name", "TEXT")        self.update_column(            s_temptbl, "dbf_name", os.path.split(os.path.splitext(path_dbf)[0])[1]        )        if flg_append:            # 読み込んだデータを統合 -> s_tbl_dst            self.append_table(s_temptbl, s_tbl_dst)            self.drop_geotable(s_temptbl)    # import shp to spatialite database and return gtbl    def shp2spatialite(        self,        p_shp,        i_epsg_src,        s_chcode_src,        s_tbl_dst=None,        s_gc_dst=None,        flg_multi=False,        flg_append=True,        flg_overwrite=False,        flg_stream=False,    ):        import os        # shp名        s_shp_name = os.path.splitext(os.path.split(p_shp)[1])[0]        # テーブル名が与えられない場合は、shp名を与える        if s_tbl_dst is None:            s_tbl_dst = s_shp_name        # 一時テーブルを介さずに直接読み込む（ライン・ポリゴンは常にマルチタイプ）        if flg_stream:            if not flg_append and not flg_overwrite and self.ch_exists_table(s_tbl_dst):                logger.warning(                    f'the table "{s_tbl_dst}" cannot be created because it is already exists.'                )                return 0            gt, _ = self.shps2spatialite_stream(                p_shp,                s_tbl_dst,                i_epsg_src,                s_chcode_src,                s_gc_dst=s_gc_dst,                flg_overwrite=not flg_append,                i_workers=1,            )            return gt        if flg_append:            # shpを読み込み -> temp            s_tbl_temp = self.get_temptblname()        else:            if not self.ch_exists_table(s_tbl_dst):                s_tbl_temp = s_tbl_dst            elif flg_overwrite:  # テーブルが存在する場合、上書きフラグが有効なら先だって削除する                self.drop_geotable(s_tbl_dst)                s_tbl_temp = s_tbl_dst            else:                logger.warning(                    'the table "%s" cannot be created because it is already exists.',                    s_tbl_dst,                )                return 0        # shpの読み込み        if s_gc_dst is None:            sql = """select ImportSHP('{}','{}','{}',{});""".format(                os.path.splitext(p_shp)[0], s_tbl_temp, s_chcode_src, i_epsg_src            )        else:            sql = """select ImportSHP('{}','{}','{}',{},'{}');""".format(                os.path.splitext(p_shp)[0],                s_tbl_temp,                s_chcode_src,                i_epsg_src,                s_gc_dst,            )        self.execute(sql)        # 読み込まれたデータタイプを検出してGTBLを設定        if s_gc_dst is None:            geom_type = self.get_type_and_epsg(s_tbl_temp, "Geometry")[0]        else:            geom_type = self.get_type_and_epsg(s_tbl_temp, s_gc_dst)[0]        if geom_type is not None:            type_abr = self.get_type_abr(geom_type)            if s_gc_dst is None:                gt = GTBL(self, s_tbl_temp, i_epsg_src, type_abr, "Geometry")            else:                gt = GTBL(self, s_tbl_temp, i_epsg_src, type_abr, s_gc_dst)        else:            logger.warning(                "imported data may be invalid...: {}".format(os.path.split(p_shp)[1])            )            return 0        # shp名をデータに追加        self.add_column(s_tbl_temp, "shp_name", "TEXT")        self.update_column(s_tbl_temp, "shp_name", s_shp_name)        # 読み込んだデータを統合 -> s_tbl_dst        if flg_append:            logger.info('append table "{}" to "{}"'.format(gt.name, s_tbl_dst))            # 読み込んだデータを統合 -> s_tbl_dst            self.append_table(gt, s_tbl_dst, flg_multi=flg_multi)            self.drop_geotable(gt)            gt.name = s_tbl_dst            # gt = GTBL(s_tbl_dst, gt.epsg, gt.type_abr)            if flg_multi and s_gc_dst is None:                gt = self.rename_geomcol(gt)  # todo: 何のためにあるのかイマイチ、、、？　flg_multi必要？            # gt = gt_new        elif flg_multi:  # s_geomcol_dstが指定されない場合、gcはジオメトリのタイプに応じて書き換えられる            gt = self.cast_to_multi(gt, s_gc_dst=s_gc_dst)        elif s_gc_dst is None:            gt = self.rename_geomcol(gt)        return gt    # import shapefile to spatialite database via ogr library and return gtbl    def shp2spatialite_ogr(self, p_shp, i_epsg_dst=None, s_tbl_dst=None, s_gc_dst=None):        from osgeo import ogr        s_tbl_dst = (            s_tbl_dst            if s_tbl_dst is not None            else os.path.splitext(os.path.split(p_shp)[1])[0]        )        # database path        p_db = self.get_dbpath()        # ソースShapefileを開きます        driver = ogr.GetDriverByName("ESRI Shapefile")        shapefile = driver.Open(str(p_shp))        # SpatiaLiteデータベースに接続します        sqlite_driver = ogr.GetDriverByName("SQLite")        database = sqlite_driver.Open(str(p_db), 1)  # 1 means writeable        # Shapefileからレイヤを取得し、その名前を取得します        layer = shapefile.GetLayer()        # EPSGを設定する        if i_epsg_dst is None:            # レイヤからEPSGを取得する            i_epsg = int(layer.GetSpatialRef().GetAuthorityCode(None))            if i_epsg is None:                raise ValueError(                    "EPSG code is not found from shapefile. Please specify EPSG code in i_epsg_src."                )        else:            i_epsg = i_epsg_dst        # ジオメトリカラムの名前を設定する        if s_gc_dst is None:            # Get geometry type from layer            s_geom_type = layer.GetGeomType()            # Convert geometry type to human-readable form            s_geom_type_name = ogr.GeometryTypeToName(s_geom_type)            # Get type abr            s_type_abr = self.get_type_abr(s_geom_type_name)            s_gc_dst = f"geom_{s_type_abr}_{i_epsg}"        # Shapefileのレイヤをデータベースにコピーします        new_layer = database.CopyLayer(            layer,            s_tbl_dst,            ["SPATIALITE=YES", f"GEOMETRY_NAME={s_gc_dst}", "FID=PK_UID"],        )        if new_layer is None:            logger.error("Error while copying layer")        else:            logger.info("Copy layer succeeded")        # データベースとShapefileを閉じます        database.Destroy()        # update metadata        self.update_layerstats(s_tbl_dst)        # get gtbl object        gtbl = self.get_gtbl_from_metadata(s_tbl_dst)        # If i_epsg_src is not None, reproject geometry        if i_epsg_dst is not None:            self.discard_geomcol(gtbl)            self.begin()            self.execute(                f"""                UPDATE "{s_tbl_dst}"                SET "{s_gc_dst}" = ST_Transform("{s_gc_dst}", {i_epsg_dst})                ;            """            )            self.commit()            gtbl = self.recov_geomcol(s_tbl_dst, i_epsg_dst, gtbl.type_abr, s_gc_dst)        logger.info("Import process was done.")        return gtbl    # import zipped shp files to spatialite database    def zipshps2spatialite(        self,        p_zipshpdir,        s_tbl="merge",        i_epsg_src=4612,        s_chcode_src="utf-8",        flg_multi=False,        flg_stream=False,        i_workers=None,    ):        """        フォルダ内のzipに含まれるshpを1つのテーブルに統合する。        flg_stream=Trueの場合はzipを展開せず、shps2spatialite_streamで並列に読み込む        （ライン・ポリゴンは常にマルチタイプになる）。        """        import os        import glob        import shutil        if flg_stream:            l_path_zip = sorted(glob.glob("{}/*.zip".format(p_zipshpdir)))            gt, _ = self.shps2spatialite_stream(                l_path_zip,                s_tbl,                i_epsg_src,                s_chcode_src,                flg_overwrite=False,                i_workers=i_workers,            )            return gt        # path_zipのzipファイルを一時ディレクトリに展開する        def zip_extract(_p_zip):            import zipfile            import tempfile            import os            tempdir = tempfile.mkdtemp(dir=os.path.split(_p_zip)[0])  # 解凍先一時ディレクトリを生成            zipfile.ZipFile(_p_zip).extractall(tempdir)  # 全部展開            return tempdir  # 一時ディレクトリパスを戻り値とする        # フォルダ内の結合するshpファイルのリストを作成        l_path_zip = glob.glob("{}/*.zip".format(p_zipshpdir))        for path_zip in l_path_zip:            # zip展開            path_shpdir = zip_extract(path_zip)            # ディレクトリ内のshpのリストを生成（階層構造になっている場合があるので、globでは足りない）            l_path_shp = []            for root, dirs, files in os.walk(path_shpdir):                for _file in files:                    if os.path.splitext(_file)[1] == ".shp":                        l_path_shp.append(os.path.join(root, _file))            # shpの読み込み            for p_shp in l_path_shp:                gt = self.shp2spatialite(                    p_shp, i_epsg_src, s_chcode_src, s_tbl, flg_multi=flg_multi                )            # 一時ディレクトリの削除            shutil.rmtree(path_shpdir)        return gt    # import shps (or shps in zips) to a table in parallel and return gtbl and report    def shps2spatialite_stream(        self,        l_p_src,        s_tbl_dst,        i_epsg_src=4612,        s_chcode_src="utf-8",        s_gc_dst=None,        flg_overwrite=True,        i_workers=None,        add_spidx=True,    ):        """        shp（zip内のshpを含む）を並列に読み込み、1つのテーブルへ直接Insertする。        zipは展開せずにメンバーを直接読み、shp・dbfの解析とBLOBへの変換はプロセスプールで行う。        一時テーブルは使わず1ファイル1トランザクションのexecutemanyで書き込み、        空間インデックスの作成と統計情報の更新は全ファイルの書き込み後に1回だけ行う。        ライン・ポリゴンは常にマルチタイプ、座標はXYのみ。        :param l_p_src: shp or zipのパス（のリスト）        :param flg_overwrite: Falseの場合、既存のテーブルに追記する        :param i_workers: ワーカープロセス数（Noneの場合はCPU数）        :return: (gt, ld_report)。ld_reportはファイルごとの件数・所要時間        """        import time        import collections        import concurrent.futures        import mod_geomblob        import mod_shapefile        if isinstance(l_p_src, str):            l_p_src = [l_p_src]        l_src = [t_src for p_src in l_p_src for t_src in mod_shapefile.list_shp(p_src)]        if not l_src:            logger.warning("no shapefile was found.")            return None, []        if i_workers is None:            i_workers = os.cpu_count() or 1        i_workers = max(1, min(i_workers, len(l_src)))        gt = None        flg_new = False        ld_report = []        t_start = time.perf_counter()        # 読込済みの結果が溜まりすぎないよう、同時に投入するファイル数をワーカー数の2倍までとする        with concurrent.futures.ProcessPoolExecutor(max_workers=i_workers) as executor:            it_src = iter(l_src)            q_future = collections.deque()            def submit_next():                t_src = next(it_src, None)                if t_src is not None:                    q_future.append(                        (                            t_src,                            executor.submit(                                mod_shapefile.load_shp_rows,                                t_src[0],                                t_src[1],                                s_chcode_src,                                i_epsg_src,                            ),                        )                    )            for _ in range(i_workers * 2):                submit_next()            while q_future:                t_src, future = q_future.popleft()                submit_next()                d_report = {                    "name": os.path.splitext(                        os.path.basename(t_src[1] or t_src[0])                    )[0],                    "n_row": 0,                    "n_byte": 0,                    "t_parse": 0.0,                    "t_insert": 0.0,                    "status": "ok",                }                ld_report.append(d_report)                # 1ファイルの失敗で全体を止めず、ロールバックして次のファイルへ進む                try:                    d_shp = future.result()                    d_report["name"] = d_shp["name"]                    d_report["n_row"] = len(d_shp["rows"])                    d_report["n_byte"] = d_shp["n_byte"]                    d_report["t_parse"] = d_shp["t_parse"]                    # 最初のファイルで出力先テーブルを決める                    if gt is None:                        if not flg_overwrite and self.ch_exists_table(s_tbl_dst):                            gt = self.get_gtbl_from_metadata(s_tbl_dst, s_gc_dst)                            if gt is None:                                return None, ld_report                            # ImportSHP等で作成したテーブルにはshp_nameがない                            self.add_column(gt.name, "shp_name", "TEXT")                        else:                            gt = GTBL(                                self,                                s_tbl_dst,                                i_epsg_src,                                mod_shapefile.TYPE_ABR[d_shp["geomtype"]],                                s_gc_dst,                            )                            self.create_table(                                gt,                                [list(t_field) for t_field in d_shp["fields"]]                                + [["shp_name", "TEXT"]],                            )                            gt = GTBL(self, gt.name, gt.epsg, gt.type_abr, gt.gc)                            flg_new = True                    # 登録済みのタイプとシングル・マルチの違いだけなら変換してInsertする                    if d_shp["geomtype"] == gt.type:                        s_holder_geom = "?"                    elif d_shp["geomtype"] == f"MULTI{gt.type}":                        s_holder_geom = "CastToSingle(?)"                    elif f"MULTI{d_shp['geomtype']}" == gt.type:                        s_holder_geom = "CastToMulti(?)"                    else:                        logger.warning(                            f"""skip "{d_shp["name"]}": geometry type {d_shp["geomtype"]} does not match {gt.type}."""                        )                        d_report["status"] = "skipped"                        continue                    # 複数の要素を持つジオメトリはシングルタイプにできない（NULLになる）                    if s_holder_geom == "CastToSingle(?)":                        i_multi = sum(                            [                                1                                for row in d_shp["rows"]                                if row[-1] is not None                                and mod_geomblob.read_num_parts(row[-1]) > 1                            ]                        )                        if i_multi > 0:                            logger.warning(                                f"""{i_multi} multi-part geometries in "{d_shp["name"]}" cannot be cast to {gt.type} and will be NULL."""                            )                    # 出力先にない属性は列を追加する                    l_col_attr = [                        r["name"]                        for r in self.get_tblinfo_meta(gt.name)                        if r["name"] not in (gt.pk, gt.gc, "shp_name")                    ]                    l_col_lower = [s_col.lower() for s_col in l_col_attr]                    for s_field, s_type_sql in d_shp["fields"]:                        if s_field.lower() not in l_col_lower:                            self.add_column(gt.name, s_field, s_type_sql)                            l_col_attr.append(s_field)                            l_col_lower.append(s_field.lower())                    s_cols = ", ".join(                        [f'"{s_col}"' for s_col in l_col_attr + ["shp_name", gt.gc]]                    )                    s_holder = ", ".join(                        ["?"] * (len(l_col_attr) + 1) + [s_holder_geom]                    )                    sql = f"""INSERT INTO "{gt.name}" ({s_cols}) VALUES ({s_holder});"""                    # 属性の並びを出力先テーブルの列に合わせる（ない列はNULL）                    l_field_src = [s_name.lower() for s_name, _ in d_shp["fields"]]                    l_idx = [                        l_field_src.index(s_col.lower())                        if s_col.lower() in l_field_src                        else None                        for s_col in l_col_attr                    ]                    s_name = d_shp["name"]                    if l_idx == list(range(len(l_field_src))):                        l_row = [                            row[:-1] + (s_name, row[-1]) for row in d_shp["rows"]                        ]                    else:                        l_row = [                            tuple([row[i] if i is not None else None for i in l_idx])                            + (s_name, row[-1])                            for row in d_shp["rows"]                        ]                    t0 = time.perf_counter()                    self.begin()                    self.executemany(sql, l_row)                    self.commit()                    d_report["t_insert"] = time.perf_counter() - t0                except Exception as e:                    if self.in_transaction:                        self.rollback()                    d_report["status"] = "error"                    d_report["error"] = str(e)                    logger.error('failed to import "%s": %s', d_report["name"], e)        if gt is None:            logger.warning("no shapefile was imported.")            return None, ld_report        # 空間インデックス・統計情報は最後にまとめて更新        if flg_new and add_spidx:            self.add_spindex(gt)        self.update_layerstats(gt.name, gt.gc)        f_total = time.perf_counter() - t_start        # ファイルごとのスループットを出力        logger.info(f"""imported into "{gt.name}" with {i_workers} worker(s):""")        for d_report in ld_report:            f_sec = d_report["t_parse"] + d_report["t_insert"]            logger.info(                f"""  {d_report["name"]}: {d_report["n_row"]} rows, """                f"""{d_report["n_byte"] / 1e6:.1f} MB, parse {d_report["t_parse"]:.2f} s, """                f"""insert {d_report["t_insert"]:.2f} s, """                f"""{d_report["n_row"] / f_sec if f_sec > 0 else 0:.0f} rows/s ({d_report["status"]})"""            )        i_rows = sum([d["n_row"] for d in ld_report if d["status"] == "ok"])        logger.info(            f"""  total: {i_rows} rows in {f_total:.2f} s ({i_rows / f_total if f_total > 0 else 0:.0f} rows/s)"""        )        return gt, ld_report    # generate stdmesh    def generate_stdmesh(        self,        s_tbl,        lat_max_or_t_nesw,        lon_max=None,        lat_min=None,        lon_min=None,        mesh_level=3,        ellipsoid="wgs84",        i_chunk=100000,        add_spidx=True,    ):        """        範囲内の基準地域メッシュのポリゴンを生成する。        メッシュは行・列番号で逐次列挙し、i_chunk件ずつのトランザクションでexecutemanyによりInsertするため、        範囲が広くてもメモリ使用量は一定。インデックスはInsert後に作成する。        """        import itertools        import mod_standardmesh as mod_stdms        # check given extent format        if isinstance(lat_max_or_t_nesw, (list, tuple)):            lat_max = lat_max_or_t_nesw[0]  # N            lon_max = lat_max_or_t_nesw[1]  # E            lat_min = lat_max_or_t_nesw[2]  # S            lon_min = lat_max_or_t_nesw[3]  # W        elif (            isinstance(lat_max_or_t_nesw, (int, float))            and lat_min is not None            and lon_max is not None            and lon_min is not None        ):            lat_max = lat_max_or_t_nesw        else:            logger.warning("invalid some of coordinate values.")            return 0        # do nothing when given mesh_level is invalid        if mesh_level not in mod_stdms.MESH_STEPS:            logger.warning("invalid mesh_level: {}".format(mesh_level))            return 0        # メッシュのテーブルを生成        if ellipsoid == "wgs84":            i_epsg = 4612        elif ellipsoid == "bessel":            i_epsg = 4301        else:            logger.warning('given parameter ellipsoid: "{}" is invalid.')            return 0        ll_coldef = [["mesh_code", "INTEGER"]]        gt_mesh = GTBL(self, s_tbl, i_epsg, "pg")        self.create_table(gt_mesh, ll_coldef)        # 連続的にメッシュポリゴンをInsert（左下から右上まで）        n_row, n_col = mod_stdms.get_meshcount_from_extent(            lon_min, lat_min, lon_max, lat_max, mesh_level        )        i_total = n_row * n_col        it_mesh = mod_stdms.iter_mesh_from_extent(            lon_min, lat_min, lon_max, lat_max, mesh_level        )        sql = f"""            INSERT INTO "{gt_mesh.name}" ("mesh_code", "{gt_mesh.gc}")            VALUES (?, BuildMbr(?, ?, ?, ?, {i_epsg}))        ;"""        i_done = 0        while True:            l_chunk = list(itertools.islice(it_mesh, i_chunk))            if len(l_chunk) == 0:                break            self.begin()            self.executemany(sql, l_chunk)            self.commit()            i_done += len(l_chunk)            logger.info(f"generate_stdmesh: {i_done} / {i_total} meshes were inserted.")        self.add_uindex(s_tbl, "mesh_code")        if add_spidx:            self.add_spindex(gt_mesh)        return gt_mesh    # aggregate points to stdmesh    def aggregate_to_stdmesh(        self,        gt_points,        mesh_level=3,        aggregations=None,        s_tbl_dst=None,        ellipsoid="wgs84",        add_spidx=True,    ):        """        点のジオテーブルを基準地域メッシュ単位で集計し、点が存在するメッシュのみをポリゴンとして出力する。        MeshCode()でメッシュコードを求めてGROUP BYするので、ポリゴンとの空間結合は不要（テーブルを1回走査するのみ）。        :param gt_points: 点のGTBL        :param mesh_level: get_unitsizeと同じメッシュレベル        :param aggregations: {出力カラム名: 集計式}の辞書。例: {"cnt": "Count(*)", "pop": 'Sum("pop")'}        :param s_tbl_dst: 出力テーブル名（省略時は"{点のテーブル名}_mesh"）        :param ellipsoid: メッシュの測地系（"wgs84" or "bessel"）。点のEPSGと異なる場合は投影変換する        :param add_spidx: 出力テーブルに空間インデックスを作成するか        :return: 出力テーブルのGTBL        """        import mod_standardmesh as mod_stdms        if mesh_level not in mod_stdms.MESH_STEPS:            logger.warning("invalid mesh_level: {}".format(mesh_level))            return 0        if ellipsoid == "wgs84":            i_epsg = 4612        elif ellipsoid == "bessel":            i_epsg = 4301        else:            logger.warning(f'given parameter ellipsoid: "{ellipsoid}" is invalid.')            return 0        aggregations = {"cnt": "Count(*)"} if aggregations is None else aggregations        s_tbl_dst = f"{gt_points.name}_mesh" if s_tbl_dst is None else s_tbl_dst        s_level = f"'{mesh_level}'" if isinstance(mesh_level, str) else mesh_level        # メッシュの測地系と異なる場合は投影変換する        if gt_points.epsg == i_epsg:            s_geom = f'"{gt_points.gc}"'        else:            s_geom = f'ST_Transform("{gt_points.gc}", {i_epsg})'        gt_mesh = GTBL(self, s_tbl_dst, i_epsg, "pg")        ll_coldef = [["mesh_code", "INTEGER"]] + [            [s_col, "NUMERIC"] for s_col in aggregations        ]        self.create_table(gt_mesh, ll_coldef)        s_cols = ", ".join([f'"{s_col}"' for s_col in aggregations])        s_aggs = ", ".join(            [f'{s_expr} AS "{s_col}"' for s_col, s_expr in aggregations.items()]        )        sql = f"""            INSERT INTO "{gt_mesh.name}" ("mesh_code", {s_cols}, "{gt_mesh.gc}")            SELECT              "mesh_code", {s_cols}, ST_GeomFromText(MeshBBox("mesh_code", {s_level}), {i_epsg})            FROM (              SELECT MeshCode(ST_X({s_geom}), ST_Y({s_geom}), {s_level}) AS "mesh_code", {s_aggs}              FROM "{gt_points.name}"              WHERE "{gt_points.gc}" IS NOT NULL              GROUP BY 1            )            WHERE "mesh_code" IS NOT NULL        ;"""        self.begin()        self.execute(sql)        self.commit()        self.add_uindex(gt_mesh, "mesh_code")        if add_spidx:            self.add_spindex(gt_mesh)        return gt_mesh    # generate gridmesh    def generate_gridmesh(        self, gt_src, s_tbl_dst, i_gridsize, edges_only=False, t_origing=(0, 0)    ):        # メッシュのgtblを作成する        if edges_only:            s_type_abr = "mln"        else:            s_type_abr = "mpg"        i_epsg = self.get_epsg(gt_src)        gt_dst = GTBL(self, s_tbl_dst, i_epsg, s_type_abr)        self.create_table(gt_dst)        # グリッドのジオメトリを挿入する        sql = """            insert into "{tbl_grid}"            select NULL, ST_SquareGrid(ST_Collect("{geom}"), {size}, {edges_only}, MakePoint({x}, {y}))            from "{tbl_src}"            ;        """.format(            tbl_grid=gt_dst.name,            tbl_src=gt_src.name,            geom=gt_src.gc,            size=i_gridsize,            edges_only=edges_only,            x=t_origing[0],            y=t_origing[1],        )        self.execute(sql)        return gt_dst    # split selected geometry area and generate area polygon    def split_mbr(        self,        s_tbl_dst,        s_tbl_src,        s_gc_src,        sql_select_geom,        i_split_x=2,        i_split_y=2,        flg_overwrite=True,    ):        """        与えられたselect stmtにもとづいて、対象のエリアを分割するポリゴンを生成する。デフォルトは四等分。        対象ジオメトリのselect stmtは、s_gc_srcのみ選択する内容である必要がある。        """        # get epsg        i_epsg = self.get_epsg(s_tbl_src, s_gc_src)        # create geotable        gt_dst = self.set_gtbl(s_tbl_dst, i_epsg, "pg")        self.create_table(gt_dst, overwrite=flg_overwrite)        # create split data        sql = """            select ST_MinX(extent), ST_MinY(extent), ST_MaxX(extent), ST_MaxY(extent)            from (select ST_Collect({gc}) as extent from ({slct_stmt}));        """.format(            gc=s_gc_src, slct_stmt=sql_select_geom        )        # print(sql)        t_extent = self.execute(sql).fetchone()        min_x = t_extent[0]        min_y = t_extent[1]        max_x = t_extent[2]        max_y = t_extent[3]        dx = 1.0 * (max_x - min_x) / i_split_x        dy = 1.0 * (max_y - min_y) / i_split_y        self.begin()        for n_y in range(i_split_y):            y1 = min_y + dy * n_y            y2 = y1 + dy            for n_x in range(i_split_x):                x1 = min_x + dx * n_x                x2 = x1 + dx                # wkt                wkt = "POLYGON(({0} {1}, {0} {3}, {2} {3}, {2} {1}, {0} {1}))".format(                    x1, y1, x2, y2                )                sql = """insert into "{tbl}" ("{gc}") values (GeomFromtext('{wkt}', {epsg}));""".format(                    tbl=s_tbl_dst, gc=gt_dst.gc, wkt=wkt, epsg=i_epsg                )                # print(sql)                self.execute(sql)        self.commit()        return gt_dst    # タイルごとのSQLをプロセスプールで並列実行し、結果を統合する    def exec_tile_parallel(        self,        gt_src,        gt_tile,        sql_tile,        gt_dst,        i_workers=None,        i_shards=None,        s_col_key=None,        p_shard_dir=None,        add_spidx=True,    ):        """        gt_tile（split_mbrの分割ポリゴン、generate_stdmeshのメッシュ等）の各タイルについて        sql_tile（SELECT文）を別プロセスで実行する。各ワーカーは読み取り専用のSpatiaLiteConnectionで        自身のシャードファイルに書き込み、最後にシャードをattachして出力テーブルへまとめてInsertする。        sql_tileはstr.formatで展開される（リテラルの波括弧は二重にする）。使えるプレースホルダー：          {src}, {gc}: ソースのテーブル名・ジオメトリカラム名          {tile_id}, {minx}, {miny}, {maxx}, {maxy}, {epsg}: タイルのIDと範囲（ソースのSRID）          {tile}: タイルの矩形（BuildMbr）          {tile_filter}: 空間インデックスで絞り込み、MBRの中心がタイル内にある地物のみを選ぶ条件。            地物はちょうど1つのタイルに属するため、タイル境界の地物も重複しない。            SRIDが異なる場合は、MBRの中心をタイルのSRIDに変換して判定する。            gt_srcの空間インデックスがなければ、ワーカーの起動前に作成する。        :param gt_dst: 出力テーブル。sql_tileの結果のうちgt_dst.gcの列をジオメトリとする（PK_UID列があれば引き継ぐ）        :param i_workers: ワーカープロセス数（Noneの場合はCPU数）        :param i_shards: シャード数（ワーカーに投入する単位。Noneの場合はワーカー数の4倍）        :param s_col_key: 統合時の重複除去に用いる列（{tile_filter}を使わず、境界の地物が複数のタイルから出力される場合）        :return: gt_dst        """        import time        import shutil        import tempfile        import concurrent.futures        import mod_geomblob        p_db = self.get_dbpath()        if p_db in ("", None, 0):            raise ValueError("exec_tile_parallel requires a file database.")        # タイルの範囲をタイルのSRIDで得る（所属判定用）        l_tile = self.execute(            f"""            SELECT ROWID, MbrMinX("{gt_tile.gc}"), MbrMinY("{gt_tile.gc}"),              MbrMaxX("{gt_tile.gc}"), MbrMaxY("{gt_tile.gc}")            FROM "{gt_tile.name}" WHERE "{gt_tile.gc}" IS NOT NULL            ORDER BY ROWID        ;"""        ).fetchall()        if not l_tile:            logger.warning(f'no tile was found in "{gt_tile.name}".')            return None        # タイルの範囲をソースのSRIDで得る        # SRIDが異なる場合は、辺を細分したタイルの外周を変換したMBRとする（変換後の辺の曲がりも含める）        def get_mbr_src(tminx, tminy, tmaxx, tmaxy):            if gt_tile.epsg == gt_src.epsg:                return tminx, tminy, tmaxx, tmaxy            l_t = [i / TILE_DENSIFY for i in range(TILE_DENSIFY)]            l_xy = (                [(tminx + (tmaxx - tminx) * t, tminy) for t in l_t]                + [(tmaxx, tminy + (tmaxy - tminy) * t) for t in l_t]                + [(tmaxx - (tmaxx - tminx) * t, tmaxy) for t in l_t]                + [(tminx, tmaxy - (tmaxy - tminy) * t) for t in l_t]                + [(tminx, tminy)]            )            blob = mod_geomblob.encode_geometry(                "LINESTRING", l_xy, gt_tile.epsg, (tminx, tminy, tmaxx, tmaxy)            )            return self.execute(                f"""                SELECT MbrMinX(g), MbrMinY(g), MbrMaxX(g), MbrMaxY(g)                FROM (SELECT ST_Transform(?, {gt_src.epsg}) AS g)            ;""",                (blob,),            ).fetchone()        f_maxx_all = max([t[3] for t in l_tile])        f_maxy_all = max([t[4] for t in l_tile])        # 所属判定はタイルのSRIDで行う（変換後のタイルのMBRは互いに重なるため、ソースのSRIDでは判定しない）        s_cx = f'(MbrMinX("{gt_src.name}"."{gt_src.gc}") + MbrMaxX("{gt_src.name}"."{gt_src.gc}")) / 2.0'        s_cy = f'(MbrMinY("{gt_src.name}"."{gt_src.gc}") + MbrMaxY("{gt_src.name}"."{gt_src.gc}")) / 2.0'        if gt_tile.epsg != gt_src.epsg:            s_center = f"ST_Transform(MakePoint({s_cx}, {s_cy}, {gt_src.epsg}), {gt_tile.epsg})"            s_cx = f"ST_X({s_center})"            s_cy = f"ST_Y({s_center})"        # タイルごとのプレースホルダーの値（所属判定は半開区間、全体の上端のみ閉区間）        ld_tile = []        for i_tile, tminx, tminy, tmaxx, tmaxy in l_tile:            minx, miny, maxx, maxy = get_mbr_src(tminx, tminy, tmaxx, tmaxy)            s_tile = f"BuildMbr({minx!r}, {miny!r}, {maxx!r}, {maxy!r}, {gt_src.epsg})"            s_op_x = "<=" if tmaxx >= f_maxx_all else "<"            s_op_y = "<=" if tmaxy >= f_maxy_all else "<"            s_filter = f"""                "{gt_src.name}".ROWID IN (                  SELECT ROWID FROM SpatialIndex                  WHERE f_table_name = '{gt_src.name}' AND f_geometry_column = '{gt_src.gc}'                    AND search_frame = {s_tile}                )                AND {s_cx} >= {tminx!r} AND {s_cx} {s_op_x} {tmaxx!r}                AND {s_cy} >= {tminy!r} AND {s_cy} {s_op_y} {tmaxy!r}            """            ld_tile.append(                {                    "src": gt_src.name,                    "gc": gt_src.gc,                    "tile_id": i_tile,                    "minx": minx,                    "miny": miny,                    "maxx": maxx,                    "maxy": maxy,                    "epsg": gt_src.epsg,                    "tile": s_tile,                    "tile_filter": s_filter,                }            )        if i_workers is None:            i_workers = os.cpu_count() or 1        if i_shards is None:            i_shards = i_workers * 4        i_shards = max(1, min(i_shards, len(ld_tile)))        # 密な範囲が1つのシャードに偏らないよう、タイルを順に振り分ける        p_dir = tempfile.mkdtemp(            prefix="shards_", dir=p_shard_dir or os.path.split(os.path.abspath(p_db))[0]        )        ll_tile = [ld_tile[i::i_shards] for i in range(i_shards)]        l_p_shard = [os.path.join(p_dir, f"shard_{i:04d}.sqlite") for i in range(i_shards)]        self.add_spindex(gt_src)  # {tile_filter}はR*Treeを使う（ワーカーは読み取り専用のため作成できない）        self.commit()  # ワーカーから見えるように確定しておく        self.enable_wal()  # ワーカーの読み込みと他の接続の書き込みが互いを待たないようにする        t_start = time.perf_counter()        try:            with concurrent.futures.ProcessPoolExecutor(max_workers=i_workers) as executor:                l_future = [                    executor.submit(                        SpatiaLiteConnection.exec_tiles_to_shard,                        p_db,                        p_shard,                        sql_tile,                        ld_tile_shard,                        self.p_mod_spatialite,                    )                    for p_shard, ld_tile_shard in zip(l_p_shard, ll_tile)                ]                i_rows = 0                for i_done, future in enumerate(                    concurrent.futures.as_completed(l_future), 1                ):                    i_rows += future.result()                    logger.info(                        f"exec_tile_parallel: {i_done} / {i_shards} shards ({i_rows} rows)."                    )            t_exec = time.perf_counter() - t_start            # シャードをattachしてまとめてInsertする            gt_dst = self.merge_shards(                l_p_shard, gt_dst, s_col_key=s_col_key, add_spidx=add_spidx            )        finally:            shutil.rmtree(p_dir, ignore_errors=True)        logger.info(            f"exec_tile_parallel: {len(ld_tile)} tiles, {i_rows} rows, "            f"{i_workers} workers, exec {t_exec:.2f} s, "            f"total {time.perf_counter() - t_start:.2f} s."        )        return gt_dst    # exec_tile_parallelのワーカー（別プロセスで実行される）    @staticmethod    def exec_tiles_to_shard(p_db, p_shard, sql_tile, ld_tile, p_mod_spatialite=None):        """        読み取り専用で接続し、各タイルのSELECTの結果をシャードファイルの"tile_out"に書き込む。        :return: 書き込んだ行数        """        con = SpatiaLiteConnection(            p_db,            p_mod_spatialite=p_mod_spatialite,            fast_open=True,            read_only=True,            timeout=WORKER_TIMEOUT,        )        i_rows = 0        try:            con.execute(f"""ATTACH DATABASE '{p_shard}' AS "shard";""")            for d_tile in ld_tile:                sql = sql_tile.format(**d_tile).strip().rstrip(";")                if i_rows == 0 and not con.execute(                    """SELECT 1 FROM "shard"."SQLITE_MASTER" WHERE "name" = 'tile_out';"""                ).fetchone():                    con.execute(                        f"""CREATE TABLE "shard"."tile_out" AS SELECT * FROM ({sql}) WHERE 0;"""                    )                con.begin()                i_rows += con.execute(                    f"""INSERT INTO "shard"."tile_out" SELECT * FROM ({sql});"""                ).rowcount                con.commit()            con.execute("""DETACH DATABASE "shard";""")        finally:            con.close()        return i_rows    # シャードファイルの"tile_out"を出力テーブルに統合する    def merge_shards(self, l_p_shard, gt_dst, s_col_key=None, add_spidx=True):        """        出力テーブルが無い場合は最初のシャードの列定義から作成する。        s_col_keyを与えると、同じ値の行は1行だけ（既に出力テーブルにある値は除いて）Insertする。        空間インデックス・統計情報は統合後に作成・更新する。        """        l_p_shard = [p for p in l_p_shard if os.path.isfile(p)]        flg_new = not self.ch_exists_table(gt_dst.name)        flg_index_key = False        for p_shard in l_p_shard:            self.execute(f"""ATTACH DATABASE '{p_shard}' AS "shard";""")            ld_col = self.execute("""PRAGMA "shard".table_info("tile_out");""").fetchall()            if not ld_col:                self.execute("""DETACH DATABASE "shard";""")                continue            if flg_new:                ll_coldef = [                    [d["name"], d["type"]]                    for d in ld_col                    if d["name"].lower() not in ("pk_uid", gt_dst.gc.lower())                ]                self.create_table(gt_dst, ll_coldef)                flg_new = False            if s_col_key is not None and not flg_index_key:                self.add_index(gt_dst, s_col_key)                flg_index_key = True            # 出力テーブルにある列のみ（PK_UIDがなければ自動採番）            l_col_dst = [d["name"].lower() for d in self.get_tblinfo_meta(gt_dst.name)]            s_cols = ", ".join(                [f'"{d["name"]}"' for d in ld_col if d["name"].lower() in l_col_dst]            )            sql = f"""INSERT INTO "{gt_dst.name}" ({s_cols}) SELECT {s_cols} FROM "shard"."tile_out" AS "s" """            if s_col_key is not None:                sql += f"""                    WHERE "s".ROWID IN (SELECT min(ROWID) FROM "shard"."tile_out" GROUP BY "{s_col_key}")                      AND NOT EXISTS (                        SELECT 1 FROM "{gt_dst.name}" AS "d" WHERE "d"."{s_col_key}" = "s"."{s_col_key}"                      )                """            self.begin()            self.execute(sql + ";")            self.commit()            self.execute("""DETACH DATABASE "shard";""")        if flg_new:            logger.warning("no rows were produced by the tiles.")            return gt_dst        if add_spidx:            self.add_spindex(gt_dst)        self.update_layerstats(gt_dst.name, gt_dst.gc)        self.clear_meta_cache()        return gt_dst    # split line to equidistant points    def split_line_equidistant(        self,        gt_line,        s_tbl_out,        len_split_m,        i_epsg4len=3857,        i_chunk=10000,        i_workers=1,    ):        """        :param gt_line        :param s_tbl_out        :param len_split_m: 点の間隔[m]        :param i_epsg4len: 等間隔点を得る際に距離の基準とするepsg        :param i_chunk: 1回に処理する線の件数（ROWID順）        :param i_workers: 2以上の場合、線の分割を別の接続で並列に計算する（ファイルDBのみ）        :return: 切断後lineのGTBL        """        import concurrent.futures        # 切断したデータを入れるテーブルを作成する（マルチジオメトリになるのでジオメトリカラムを変更する）        self.drop_geotable(s_tbl_out)        self.create_cloned_table(gt_line.name, s_tbl_out)        self.discard_geomcol(s_tbl_out, gt_line.gc)        gt_line_out = self.recov_geomcol(            s_tbl_out, gt_line.epsg, "MULTILINESTRING", gt_line.gc        )        gt_line_out = self.rename_geomcol(            gt_line_out, s_gc_dst="geom_mln_{}".format(gt_line_out.epsg)        )        ld_columns = self.get_columnsdef(gt_line, flg_except_gc=True)        s_cols = ", ".join(['"{}"'.format(d_columns["name"]) for d_columns in ld_columns])        s_cols_a = ", ".join(            ['a."{}"'.format(d_columns["name"]) for d_columns in ld_columns]        )        # ROWIDの区切りで処理単位を決める（各チャンクの上限ROWIDを順に求める）        i_numlines, i_rowid_min, i_rowid_max = self.execute(            f"""SELECT Count(*), Min("ROWID"), Max("ROWID") FROM "{gt_line.name}";"""        ).fetchone()        def iter_range():            if i_numlines == 0:                return            i_lo = i_rowid_min - 1            while i_lo < i_rowid_max:                row = self.execute(                    f"""                    SELECT "ROWID" FROM "{gt_line.name}"                    WHERE "ROWID" > ?                    ORDER BY "ROWID"                    LIMIT 1 OFFSET {i_chunk - 1}                ;""",                    (i_lo,),                ).fetchone()                i_hi = i_rowid_max if row is None else row[0]                yield (i_lo, i_hi)                i_lo = i_hi        # 1チャンク分の切断後の線を選択する（等間隔点は線ごとに1回だけ求める）        def select_split(con, i_lo, i_hi):            s_tbl_eq = con.get_temptblname("eqpoints")            s_tbl_seq = con.get_temptblname("tbl_numlist")            con.execute(                f"""CREATE TEMP TABLE "{s_tbl_eq}" ("rid" INTEGER PRIMARY KEY, "eqpoints" BLOB);"""            )            con.execute(                f"""                INSERT INTO "{s_tbl_eq}"                SELECT                  "ROWID",                  ST_Transform(                    -- いったん投影してからメートル単位で等間隔点を得る                    ST_Line_Interpolate_Equidistant_Points(ST_Transform("{gt_line.gc}", {i_epsg4len}), {len_split_m}),                    {gt_line.epsg}                  )                FROM "{gt_line.name}"                WHERE "ROWID" > {i_lo} AND "ROWID" <= {i_hi}            ;"""            )            # GeometryNで利用する連番テーブル            i_limit = con.execute(                f"""SELECT Max(ST_NumGeometries("eqpoints")) FROM "{s_tbl_eq}";"""            ).fetchone()[0]            con.create_sequential_data(s_tbl_seq, i_limit or 0, flg_temp=True)            sql_select = f"""                SELECT                    {s_cols_a},                    CASE                        WHEN b."blades" IS NOT NULL THEN ST_Multi(ST_Split(a."{gt_line.gc}", b."blades"))                        ELSE ST_Multi(a."{gt_line.gc}")                    END                FROM "{gt_line.name}" AS a                LEFT JOIN (                    SELECT                        e."rid",                        ST_Collect(                            MakeLine(                                ShiftCoords(GeometryN(e."eqpoints", n."PK_UID"), -0.000001, -0.000001),                                ShiftCoords(GeometryN(e."eqpoints", n."PK_UID"), 0.000001, 0.000001)                            )                        ) AS "blades"                    FROM "{s_tbl_eq}" AS e                    JOIN "{s_tbl_seq}" AS n ON n."PK_UID" <= ST_NumGeometries(e."eqpoints")                    GROUP BY e."rid"                ) AS b ON b."rid" = a."ROWID"                WHERE a."ROWID" > {i_lo} AND a."ROWID" <= {i_hi}            """            return sql_select, s_tbl_eq, s_tbl_seq        def drop_work_tables(con, s_tbl_eq, s_tbl_seq):            con.execute(f"""DROP TABLE IF EXISTS "{s_tbl_eq}";""")            con.execute(f"""DROP TABLE IF EXISTS "{s_tbl_seq}";""")        sql_insert = f"""INSERT INTO "{gt_line_out.name}" ({s_cols}, "{gt_line_out.gc}")"""        p_db = self.get_dbpath()        if i_workers <= 1 or p_db in ("", None):            # 同一接続でチャンクごとにINSERT ... SELECT            i_done = 0            for i_lo, i_hi in iter_range():                sql_select, s_tbl_eq, s_tbl_seq = select_split(self, i_lo, i_hi)                self.begin()                i_done += self.execute(f"{sql_insert} {sql_select};").rowcount                self.commit()                drop_work_tables(self, s_tbl_eq, s_tbl_seq)                logger.info(                    f"split_line_equidistant: {i_done} / {i_numlines} lines were split."                )        else:            # ワーカーの接続で切断後の線を計算し、こちらの接続でまとめてInsertする            import threading            local = threading.local()            l_con = []            def compute(t_range):                if not hasattr(local, "con"):                    local.con = SpatiaLiteConnection(                        p_db,                        p_mod_spatialite=self.p_mod_spatialite,                        fast_open=True,                        read_only=True,                        check_same_thread=False,                        timeout=WORKER_TIMEOUT,                    )                    l_con.append(local.con)                sql_select, s_tbl_eq, s_tbl_seq = select_split(local.con, *t_range)                l_row = local.con.execute(f"{sql_select};").fetchall()                drop_work_tables(local.con, s_tbl_eq, s_tbl_seq)                return [tuple(row) for row in l_row]            sql_insert_values = f"""{sql_insert} VALUES ({", ".join(["?"] * (len(ld_columns) + 1))});"""            self.commit()            self.enable_wal()  # ワーカーの読み込み中にこちらの接続でコミットするため            i_busy_timeout = self.execute("""PRAGMA busy_timeout;""").fetchone()[0]            self.execute("""PRAGMA busy_timeout = 600000;""")  # ワーカーの読み込みとの競合を待つ            i_done = 0            try:                with concurrent.futures.ThreadPoolExecutor(max_workers=i_workers) as executor:                    # メモリ使用量を抑えるため、計算中・未Insertのチャンクはワーカー数の2倍までとする                    l_future = []                    it_range = iter_range()                    while True:                        for t_range in it_range:                            l_future.append(executor.submit(compute, t_range))                            if len(l_future) >= i_workers * 2:                                break                        if len(l_future) == 0:                            break                        l_row = l_future.pop(0).result()                        self.begin()                        self.executemany(sql_insert_values, l_row)                        self.commit()                        i_done += len(l_row)                        logger.info(                            f"split_line_equidistant: {i_done} / {i_numlines} lines were split."                        )            finally:                self.execute(f"""PRAGMA busy_timeout = {i_busy_timeout};""")                for con in l_con:                    con.close()        return gt_line_out    # 与えられた座標を投影変換する    def transform_pt(self, t_xy, i_epsg_src, i_epsg_dst):        x = t_xy[0]        y = t_xy[1]        sql = """            select                ST_X(ST_Transform(MakePoint({x}, {y}, {epsg_src}), {epsg_dst})) as x                , ST_Y(ST_Transform(MakePoint({x}, {y}, {epsg_src}), {epsg_dst})) as y            ;        """.format(            x=x, y=y, epsg_src=i_epsg_src, epsg_dst=i_epsg_dst        )        l_xy_dst = self.execute(sql).fetchone()        # print('tranfomed value: x={}, y={}'.format(l_xy_dst['x'], l_xy_dst['y']))        return l_xy_dst    # 与えられた範囲座標を投影変換する    def transform_coverage(self, l_nesw, i_epsg_src, i_epsg_dst):        n = l_nesw[0]        e = l_nesw[1]        s = l_nesw[2]        w = l_nesw[3]        sql = """            select                ST_MaxY(geom) as y2                , ST_MaxX(geom) as x2                , ST_MinY(geom) as y1                , ST_MinX(geom) as x1            from (                select ST_Transform(BuildMbr({}, {}, {}, {}, {}), {}) as geom            );        """.format(            w, s, e, n, i_epsg_src, i_epsg_dst        )        l_nesw_dst = list(self.execute(sql).fetchone())        logger.info(            "tranfomed value: x1=%s, x2=%s, y1=%s, y2=%s",            l_nesw_dst[3],            l_nesw_dst[1],            l_nesw_dst[2],            l_nesw_dst[0],        )        return l_nesw_dst    # get and update Nearest-Neighbour    def get_nearest_neighbour(        self, gt_src_pt, gt_dst_pt, s_col_update, use_virtual_knn=False    ):        if use_virtual_knn:            # KNN使用モード ：KNNはPythonからのループでは落ちる（原因不明）ので、ひとまず利用しない。            logger.info("get and update nearest neighbor using Virtual KNN")            rows = self.execute(                f"""                SELECT "ROWID"                FROM "{gt_src_pt.name}"                WHERE "{gt_src_pt.gc}" IS NOT NULL            ;"""            )            self.begin()            for row in rows:  # sqlite3ではwithが使えないのでforで対応                i_id_src = row[0]                # print('knn process: {}'.format(i_id_src))                sql = f"""                        SELECT "fid" FROM "KNN"                        WHERE "f_table_name" = '{gt_dst_pt.name}'                        AND "ref_geometry" = (                            SELECT "{gt_src_pt.gc}"                            FROM "{gt_src_pt.name}"                            WHERE "ROWID" == {i_id_src})                        AND "max_items" = 1                        ;                    """                id_closest_road = self.execute(sql).fetchone()[0]                self.execute(                    f"""                        UPDATE "{gt_src_pt.name}"                        SET "{s_col_update}" = {id_closest_road}                        WHERE "ROWID" == {i_id_src}                    ;"""                )            self.commit()        else:            # KNNを使用しない場合、空間インデックスを利用した近傍探索で対応する            logger.info("get and update nearest neighbor without using Virtual KNN")            self.get_nearest_neighbours_bulk(gt_src_pt, gt_dst_pt, s_col_update)    # get and update k-Nearest-Neighbours using spatial index    def get_nearest_neighbours_bulk(        self,        gt_src,        gt_dst,        s_col_update=None,        i_k=1,        f_dist_max=None,        flg_dist_m=False,        s_col_dist=None,        s_tbl_out=None,        f_radius_init=None,        i_chunk=50000,    ):        """        gt_srcの各ジオメトリについて、gt_dstの近傍k件を空間インデックス（R*Tree）で探索する。        探索窓を倍々に広げながら、k番目の候補までの距離が窓の半径以下になった（確定した）ものから結果に入れる。        gt_srcはROWID順にi_chunk件ずつ処理し、全組み合わせの距離は計算しない。        :param gt_src: 探索元のGTBL        :param gt_dst: 探索先のGTBL（空間インデックスがなければ作成する）        :param s_col_update: 最近傍のgt_dstのROWIDを書き込むgt_srcのカラム（既存のカラム）        :param i_k: 取得する近傍の件数        :param f_dist_max: 探索する最大距離（gt_dstの座標系の単位）        :param flg_dist_m: gt_dstが地理座標系の場合、距離を楕円体上のメートルで返す（順位は座標系上の距離による）        :param s_col_dist: 最近傍までの距離を書き込むgt_srcのカラム（既存のカラム）        :param s_tbl_out: 結果（src_id, dst_id, rank, dist）を出力するテーブル名。Noneなら一時テーブル        :param f_radius_init: 探索窓の初期半径。Noneならgt_dstの密度から推定する        :param i_chunk: 1回に処理するgt_srcの件数        :return: 結果テーブル名        """        import math        self.add_spindex(gt_dst)        # 探索先の範囲と件数（R*Treeから得る）        s_idx = f"idx_{gt_dst.name}_{gt_dst.gc}"        t_ext = self.execute(            f"""            SELECT Min("xmin"), Min("ymin"), Max("xmax"), Max("ymax"), Count(*) FROM "{s_idx}"        ;"""        ).fetchone()        if t_ext[4] == 0:            logger.info(                f'geotable "{gt_dst.name}" has no geometry. process was skipped.'            )            return None        dxmin, dymin, dxmax, dymax, i_num_dst = t_ext        if f_radius_init is None:  # 近傍k件が含まれる程度の半径            f_area = max((dxmax - dxmin) * (dymax - dymin), 1e-12)            f_radius_init = math.sqrt(f_area / i_num_dst * i_k)            if f_dist_max is not None:                f_radius_init = min(f_radius_init, f_dist_max)        # 座標系が異なる場合は探索元を投影変換する（探索先と同名のジオメトリカラムでも曖昧にならないよう別名で修飾する）        s_geom_src = f's."{gt_src.gc}"'        if gt_src.epsg != gt_dst.epsg:            s_geom_src = f"ST_Transform({s_geom_src}, {gt_dst.epsg})"        # 作業用テーブル        s_tbl_pend = self.get_temptblname("nn_pend")        s_tbl_cand = self.get_temptblname("nn_cand")        s_tbl_res = self.get_temptblname("nn_res") if s_tbl_out is None else s_tbl_out        s_temp = "TEMP " if s_tbl_out is None else ""        if s_tbl_out is not None:            self.drop_geotable(s_tbl_out)        self.executescript(            f"""            CREATE TEMP TABLE "{s_tbl_pend}" ("src_id" INTEGER PRIMARY KEY, "geom" BLOB);            CREATE TEMP TABLE "{s_tbl_cand}" ("src_id" INTEGER, "dst_id" INTEGER, "dist" REAL);            CREATE {s_temp}TABLE "{s_tbl_res}" (              "src_id" INTEGER, "dst_id" INTEGER, "rank" INTEGER, "dist" REAL,              PRIMARY KEY ("src_id", "rank")            );            CREATE INDEX "temp"."ix_{s_tbl_cand}" ON "{s_tbl_cand}" ("src_id", "dist");        """        )        self.clear_meta_cache()        sql_candidate = f"""            INSERT INTO "{s_tbl_cand}"            SELECT p."src_id", d."ROWID", ST_Distance(p."geom", d."{gt_dst.gc}")            FROM "{s_tbl_pend}" AS p, "{gt_dst.name}" AS d            WHERE d."ROWID" IN (              SELECT "ROWID" FROM "SpatialIndex"              WHERE "f_table_name" = '{gt_dst.name}'              AND "f_geometry_column" = '{gt_dst.gc}'              AND "search_frame" = BuildMbr(                MbrMinX(p."geom") - :r, MbrMinY(p."geom") - :r,                MbrMaxX(p."geom") + :r, MbrMaxY(p."geom") + :r              )            )        ;"""        # 候補がk件以上あり、k番目が半径以内 / 窓が探索先全体を覆う / 最大距離に達した ものを確定とする        sql_resolved = f"""            SELECT p."src_id" FROM "{s_tbl_pend}" AS p            WHERE :flg_last            OR (              MbrMinX(p."geom") - :r <= {dxmin} AND MbrMinY(p."geom") - :r <= {dymin}              AND MbrMaxX(p."geom") + :r >= {dxmax} AND MbrMaxY(p."geom") + :r >= {dymax}            )            OR (              SELECT "dist" FROM "{s_tbl_cand}" AS c              WHERE c."src_id" = p."src_id"              ORDER BY "dist" LIMIT 1 OFFSET {i_k - 1}            ) <= :r        """        sql_insert_res = f"""            INSERT INTO "{s_tbl_res}"            SELECT "src_id", "dst_id", "rank", "dist" FROM (              SELECT                "src_id", "dst_id", "dist",                ROW_NUMBER() OVER (PARTITION BY "src_id" ORDER BY "dist", "dst_id") AS "rank"              FROM "{s_tbl_cand}"              WHERE "src_id" IN ({sql_resolved})            )            WHERE "rank" <= {i_k} AND (:dist_max IS NULL OR "dist" <= :dist_max)        ;"""        i_last_id = -(2**63)        i_done = 0        while True:            self.begin()            self.execute(f"""DELETE FROM "{s_tbl_pend}";""")            self.execute(                f"""                INSERT INTO "{s_tbl_pend}"                SELECT s."ROWID", {s_geom_src} FROM "{gt_src.name}" AS s                WHERE s."ROWID" > ? AND s."{gt_src.gc}" IS NOT NULL                ORDER BY s."ROWID" LIMIT ?            ;""",                (i_last_id, i_chunk),            )            t_chunk = self.execute(                f"""SELECT Count(*), Max("src_id") FROM "{s_tbl_pend}";"""            ).fetchone()            if t_chunk[0] == 0:                self.commit()                break            i_last_id = t_chunk[1]            # 投影変換できなかったもの（NULL）は確定できず探索が終わらないので除外する            i_null = self.execute(                f"""DELETE FROM "{s_tbl_pend}" WHERE "geom" IS NULL;"""            ).rowcount            if i_null > 0:                logger.warning(                    f"nearest neighbour: {i_null} geometries could not be transformed and were skipped."                )            # 探索窓を広げながら確定させていく            f_radius = f_radius_init            while (                self.execute(f"""SELECT Count(*) FROM "{s_tbl_pend}";""").fetchone()[0]                > 0            ):                flg_last = f_dist_max is not None and f_radius >= f_dist_max                if flg_last:                    f_radius = f_dist_max                d_param = {"r": f_radius, "flg_last": flg_last, "dist_max": f_dist_max}                self.execute(f"""DELETE FROM "{s_tbl_cand}";""")                self.execute(sql_candidate, {"r": f_radius})                self.execute(sql_insert_res, d_param)                self.execute(                    f"""DELETE FROM "{s_tbl_pend}" WHERE "src_id" IN ({sql_resolved});""",                    d_param,                )                f_radius *= 2            self.commit()            i_done += t_chunk[0]            logger.info(f"nearest neighbour: {i_done} geometries were processed.")        # 楕円体上の距離（メートル）に置き換える        if flg_dist_m and gt_dst.is_geographic:            self.begin()            self.execute(                f"""                UPDATE "{s_tbl_res}"                SET "dist" = (                  SELECT ST_Distance({s_geom_src}, d."{gt_dst.gc}", 1)                  FROM "{gt_src.name}" AS s, "{gt_dst.name}" AS d                  WHERE s."ROWID" = "{s_tbl_res}"."src_id" AND d."ROWID" = "{s_tbl_res}"."dst_id"                )            ;"""            )            self.commit()        # 最近傍の結果をまとめて書き込む        if s_col_update is not None or s_col_dist is not None:            l_set = []            if s_col_update is not None:                l_set.append(                    f""""{s_col_update}" = (                      SELECT "dst_id" FROM "{s_tbl_res}" AS r                      WHERE r."src_id" = "{gt_src.name}"."ROWID" AND r."rank" = 1                    )"""                )            if s_col_dist is not None:                l_set.append(                    f""""{s_col_dist}" = (                      SELECT "dist" FROM "{s_tbl_res}" AS r                      WHERE r."src_id" = "{gt_src.name}"."ROWID" AND r."rank" = 1                    )"""                )            self.begin()            self.execute(                f"""                UPDATE "{gt_src.name}" SET {", ".join(l_set)}                WHERE "{gt_src.gc}" IS NOT NULL            ;"""            )            self.commit()        self.execute(f"""DROP TABLE IF EXISTS "{s_tbl_pend}";""")        self.execute(f"""DROP TABLE IF EXISTS "{s_tbl_cand}";""")        self.clear_meta_cache()        return s_tbl_res    # create routing nodes id    def routing_addcol_routing_id(        self,        gt_lines,        s_col_from="node_from",        s_col_to="node_to",        s_tbl_nodes_gt=None,        s_tbl_nodes_gv=None,        s_db_alies=None,    ):        """        始点ノードIDと終点ノードIDをラインのジオテーブルにカラムとして付与する        :return 追加されたfrom、toのカラム名および、s_tbl_nodes_gtを与えた場合はそのgtblオブジェクトが返る        """        self.ch_able_routing()        logger.info("adding node id column for routing...")        s_db_alies = f"'{s_db_alies}'" if s_db_alies is not None else "NULL"        sql = f"""            SELECT CreateRoutingNodes({s_db_alies}, '{gt_lines.name}', '{gt_lines.gc}', '{s_col_from}', '{s_col_to}');        """        try:            self.execute(sql)            logger.info(f'successfully added column "{s_col_from}" and "{s_col_to}"')        except sqlite3.OperationalError as e:            logger.info(e)            logger.info(                f"Column {s_col_from} and {s_col_to} are already exists for routing."            )        if s_tbl_nodes_gt is None:            return s_col_from, s_col_to        # create geotable/spatialview of nodes with node id        logger.info("creating geotable of nodes.")        gt_nodes = self.set_gtbl(s_tbl_nodes_gt, gt_lines.epsg, "pt")        self.create_table(gt_nodes)        if s_tbl_nodes_gv is None:            sql = f"""                INSERT INTO "{s_tbl_nodes_gt}"                SELECT * FROM (                  SELECT                    "{s_col_from}" AS "id",                    ST_StartPoint("{gt_lines.gc}")                  FROM "{gt_lines.name}"                  UNION                  SELECT                    "{s_col_to}",                    ST_EndPoint("{gt_lines.gc}")                  FROM "{gt_lines.name}"                )                ORDER BY "id"                ;            """            self.execute(sql)        # if creates spatial view, no geometries will be inserted to geotable. (but knn too slow...        else:            sql = f"""                DROP VIEW IF EXISTS "{s_tbl_nodes_gv}";                CREATE VIEW "{s_tbl_nodes_gv}" AS                SELECT * FROM (                    SELECT                        "{s_col_from}" AS "id",                        ST_StartPoint("{gt_lines.gc}") AS "{gt_nodes.gc}"                    FROM "{gt_lines.name}"                    UNION                    SELECT                        "{s_col_to}",                        ST_EndPoint("{gt_lines.gc}")                    FROM "{gt_lines.name}"                )                ORDER BY "id"                ;                INSERT INTO "views_geometry_columns"                VALUES ('{s_tbl_nodes_gv}', '{gt_nodes.gc}', 'id', '{gt_nodes.name}', '{gt_nodes.gc}', 1)                ;            """            self.executescript(sql)        self.add_spindex(gt_nodes)  # for using KNN, spatial index is necessary.        return s_col_from, s_col_to, gt_nodes    # create routing data    def routing_create_routing_data(        self,        gt_lines,        s_col_from,        s_col_to,        s_col_cost=None,        s_col_name=None,        i_argorithm=1,        i_bidirectional=0,        s_col_fwd=None,        s_col_inv=None,        i_overwrite=1,        s_tbl_rtg_data="routing_net_data",        s_vtbl_rtg="routing_net",    ):        self.ch_able_routing()        logger.info("creating routing data.")        s_col_cost = "'{}'".format(s_col_cost) if s_col_cost is not None else "NULL"        s_col_name = "'{}'".format(s_col_name) if s_col_name is not None else "NULL"        s_col_fwd = "'{}'".format(s_col_fwd) if s_col_fwd is not None else "NULL"        s_col_inv = "'{}'".format(s_col_inv) if s_col_inv is not None else "NULL"        sql = """            SELECT CreateRouting(                '{tbl_rtg_data}', '{vtbl_rtg}', '{tbl_lines}', '{col_from}', '{col_to}', '{gc_lines}'                , {col_cost}  -- cost column when NULL then length                , {col_name}  -- road name or NULL                , {i_argorithm}  -- enable A-star (boolean)                , {i_bidirectional}  -- directed graph or not (boolean)                , {col_flg_fwd}  -- flag to forward                , {col_flg_inv}  -- flag to inverse                , {i_flg_overwrite}  -- boolean            )            ;        """.format(            tbl_rtg_data=s_tbl_rtg_data,            vtbl_rtg=s_vtbl_rtg,            tbl_lines=gt_lines.name,            col_from=s_col_from,            col_to=s_col_to,            gc_lines=gt_lines.gc,            col_cost=s_col_cost,            col_name=s_col_name,            i_argorithm=i_argorithm,            i_bidirectional=i_bidirectional,            col_flg_fwd=s_col_fwd,            col_flg_inv=s_col_inv,            i_flg_overwrite=i_overwrite,        )        if self.execute(sql).fetchone()[0] == 1:            logger.info("routing data was successfully created.")        else:            s_msg = self.execute("""SELECT CreateRouting_GetLastError();""").fetchone()[                0            ]            logger.error('create routing exit with exception: "{}"'.format(s_msg))    # extract nodes point data from routing network    def extract_routing_nodes(        self,        gt_lines: "GTBL",        s_col_from: str,        s_col_to: str,        s_gt_road_nodes: str = None,    ) -> "GTBL":        s_gt_road_nodes = (            f"{gt_lines.name}_nodes" if s_gt_road_nodes is None else s_gt_road_nodes        )        gt_road_nodes = self.set_gtbl(s_gt_road_nodes, gt_lines.epsg, "pt")        self.create_table(gt_road_nodes)        self.begin()        self.execute(            f"""            INSERT INTO "{gt_road_nodes.name}"            SELECT * FROM (                SELECT                    "{s_col_from}" AS "id",                    ST_StartPoint("{gt_lines.gc}")                FROM "{gt_lines.name}"                UNION                SELECT                    "{s_col_to}" AS "id",                    ST_EndPoint("{gt_lines.gc}")                FROM "{gt_lines.name}"            )            ORDER BY id        ;"""        )        self.commit()        self.add_spindex(gt_road_nodes)        return gt_road_nodes    # ある点からのネットワーク上の近接点IDと、その点までの距離を得る。戻り値はid、dist_mの辞書    def routing_get_nearest_netpoint(        self, gt_node, x, y, i_epsg=4612, s_uid_nodes="PK_UID"    ):        # ch coord type        s_coordtype = self.ch_epsg_coordtype(i_epsg)        s_coordtype_nodes = self.ch_epsg_coordtype(gt_node.epsg)        if i_epsg == gt_node.epsg:            # get the closest point            sql = """                SELECT                  "{uid}" AS "id"                  , Min(ST_Distance(MakePoint({x}, {y}, {epsg}), "{gc_node}")) AS "dist_m"                FROM "{tbl_node}"                ;            """.format(                tbl_node=gt_node.name,                gc_node=gt_node.gc,                x=x,                y=y,                epsg=i_epsg,                uid=s_uid_nodes,            )            d_closest_point = dict(self.execute(sql).fetchone())            if s_coordtype == "geographic":  # get distance with ellipsoidal                sql = """                    SELECT ST_Distance(MakePoint({x}, {y}, {epsg}), "{gc_node}", 1)                    FROM "{tbl_node}"                    WHERE "{uid}" == {id}                    ;                """.format(                    tbl_node=gt_node.name,                    gc_node=gt_node.gc,                    x=x,                    y=y,                    epsg=i_epsg,                    uid=s_uid_nodes,                    id=d_closest_point["id"],                )                d_closest_point["dist_m"] = self.execute(sql).fetchone()[0]        else:            # get the closest point            sql = """                SELECT                  "{uid}" AS "id"                  , Min(ST_Distance(ST_Transform(MakePoint({x}, {y}, {epsg}), {epsg_nodes}), "{gc_node}")) AS "dist_m"                FROM "{tbl_node}"                ;            """.format(                tbl_node=gt_node.name,                gc_node=gt_node.gc,                x=x,                y=y,                epsg=i_epsg,                uid=s_uid_nodes,                epsg_nodes=gt_node.epsg,            )            d_closest_point = dict(self.execute(sql).fetchone())            if s_coordtype_nodes == "geographic":  # get distance with ellipsoidal                sql = """                    SELECT ST_Distance(ST_Transform(MakePoint({x}, {y}, {epsg}), {epsg_nodes}), "{gc_node}", 1)                    FROM "{tbl_node}" WHERE "{uid}" == {id};                """.format(                    tbl_node=gt_node.name,                    gc_node=gt_node.gc,                    x=x,                    y=y,                    epsg=i_epsg,                    uid=s_uid_nodes,                    id=d_closest_point["id"],                    epsg_nodes=gt_node.epsg,                )                d_closest_point["dist_m"] = self.execute(sql).fetchone()[0]        # print('closest point id:{}, dist_m:{}'.format(d_closest_point['id'], d_closest_point['dist_m']))        return d_closest_point    # KNNを利用してある点からのネットワーク上の近接点IDと、その点までの距離を得る。戻り値はid、dist_mの辞書    def routing_get_nearest_netpoint_knn(self, gt_node, x, y, i_epsg_lonlat=4612):        """        KNNを利用して近接点を得る。もしかしてpython-sqlite3からは利用できないのでは…？        :param gt_node:        :param x: lon        :param y: lat        :param i_epsg_lonlat:        :return:        """        sql = """            SELECT "fid" AS id, "distance" AS dist_m            FROM "KNN"            WHERE "f_table_name" = '{tbl_node}'            AND "f_geometry_column" = '{gc_node}'            AND "ref_geometry" = MakePoint({x}, {y}, {epsg})            AND "max_items" = 1            ;        """.format(            tbl_node=gt_node.name, gc_node=gt_node.gc, x=x, y=y, epsg=i_epsg_lonlat        )        d_closest_point = dict(self.execute(sql).fetchone())        logger.info(            "closest point id:%s, dist_m:%s",            d_closest_point["id"],            d_closest_point["dist_m"],        )        return d_closest_point    # ノードのインデックス・スナップ結果のキャッシュを破棄する（gt_or_tblがNoneなら全て）    def clear_node_cache(self, gt_or_tbl=None):        if gt_or_tbl is None:            self.d_node_cache.clear()            return        s_tbl = self.get_tblname(gt_or_tbl).lower()        for t_key in [t_key for t_key in self.d_node_cache if t_key[0] == s_tbl]:            del self.d_node_cache[t_key]    # ノードのジオテーブルをメモリ上のグリッドインデックスとして得る（スナップ結果のキャッシュを含む）    def get_routing_node_index(self, gt_node, s_uid_nodes="PK_UID"):        """        メタデータキャッシュとは別に保持し、他のテーブルのDDLでは破棄しない。        他の接続がDBを更新した場合（PRAGMA data_versionが変わった場合）は作り直す。        ノードテーブルはこのモジュールで削除・リネームすると破棄される。それ以外の方法でこの接続から        ノードテーブルを更新した場合は、clear_node_cacheを呼ぶこと。        """        d_nodes = self.d_node_cache        t_key = (gt_node.name.lower(), gt_node.gc.lower(), s_uid_nodes.lower())        i_data_ver = self.execute("""PRAGMA data_version;""").fetchone()[0]        if t_key not in d_nodes or d_nodes[t_key]["data_version"] != i_data_ver:            rows = self.execute(                f"""                SELECT "{s_uid_nodes}", ST_X("{gt_node.gc}"), ST_Y("{gt_node.gc}")                FROM "{gt_node.name}"                WHERE "{gt_node.gc}" IS NOT NULL            ;"""            ).fetchall()            d_nodes[t_key] = {                "index": PointGridIndex(                    [row[0] for row in rows],                    [row[1] for row in rows],                    [row[2] for row in rows],                ),                "snapped": {},  # (x, y, epsg): {"id", "dist_m"}                "data_version": i_data_ver,            }        return d_nodes[t_key]    # 複数の点をネットワーク上の近接点にまとめてスナップする。戻り値はid、dist_mの辞書のリスト    def routing_snap_points(self, gt_node, l_xy, i_epsg=4612, s_uid_nodes="PK_UID"):        """        routing_get_nearest_netpointの一括版。ノードはメモリ上のグリッドインデックスで探索し、        座標変換と楕円体上の距離計算はそれぞれ1回のSQLでまとめて行う。結果は接続ごとにキャッシュされる。        :param gt_node: ノードのGTBL（extract_routing_nodesで作成したもの）        :param l_xy: (x, y)のリスト        :param i_epsg: l_xyの座標系        :param s_uid_nodes: ノードIDのカラム名        :return: {"id": ノードID, "dist_m": 距離}のリスト（l_xyと同順）        """        d_node_index = self.get_routing_node_index(gt_node, s_uid_nodes)        d_snapped = d_node_index["snapped"]        l_xy = [(float(xy[0]), float(xy[1])) for xy in l_xy]        l_xy_new = list(            dict.fromkeys(                [xy for xy in l_xy if (xy[0], xy[1], i_epsg) not in d_snapped]            )        )        if len(l_xy_new) > 0:            s_tbl_pt = self.get_temptblname("snap")            self.execute(                f"""CREATE TEMP TABLE "{s_tbl_pt}" ("x" REAL, "y" REAL, "id" INTEGER);"""            )            try:                self.begin()                self.executemany(                    f"""INSERT INTO "{s_tbl_pt}" ("x", "y") VALUES (?, ?);""", l_xy_new                )                # ノードの座標系に変換した座標（変換できない点はNone）                if i_epsg == gt_node.epsg:                    l_xy_node = l_xy_new                else:                    l_xy_node = [                        (row[0], row[1])                        for row in self.execute(                            f"""                            SELECT                              ST_X(ST_Transform(MakePoint("x", "y", {i_epsg}), {gt_node.epsg})),                              ST_Y(ST_Transform(MakePoint("x", "y", {i_epsg}), {gt_node.epsg}))                            FROM "{s_tbl_pt}" ORDER BY "ROWID"                        ;"""                        )                    ]                # 最近傍のノード（変換できなかった点はid, dist_mともNone）                l_nearest = [                    d_node_index["index"].nearest(x, y)                    if x is not None and y is not None                    else (None, None)                    for x, y in l_xy_node                ]                self.executemany(                    f"""UPDATE "{s_tbl_pt}" SET "id" = ? WHERE "ROWID" = ?;""",                    [(t[0], i + 1) for i, t in enumerate(l_nearest)],                )                # 地理座標系の場合は楕円体上の距離とする                if self.ch_epsg_coordtype(gt_node.epsg) == "geographic":                    s_geom_pt = f"""MakePoint(p."x", p."y", {i_epsg})"""                    if i_epsg != gt_node.epsg:                        s_geom_pt = f"ST_Transform({s_geom_pt}, {gt_node.epsg})"                    l_dist = [                        row[0]                        for row in self.execute(                            f"""                            SELECT ST_Distance({s_geom_pt}, n."{gt_node.gc}", 1)                            FROM "{s_tbl_pt}" AS p                            LEFT JOIN "{gt_node.name}" AS n ON n."{s_uid_nodes}" = p."id"                            ORDER BY p."ROWID"                        ;"""                        )                    ]                else:                    l_dist = [t[1] for t in l_nearest]                self.commit()            except Exception:                self.rollback()                raise            finally:                self.execute(f"""DROP TABLE IF EXISTS "{s_tbl_pt}";""")            for xy, t_nearest, dist in zip(l_xy_new, l_nearest, l_dist):                d_snapped[(xy[0], xy[1], i_epsg)] = {"id": t_nearest[0], "dist_m": dist}        return [dict(d_snapped[(xy[0], xy[1], i_epsg)]) for xy in l_xy]    # 複数の出発地・目的地間の経路をまとめて探索する    def routing_get_od_matrix(        self,        gt_node,        l_xy_orig,        l_xy_dest,        s_vtbl_rtg="routing_net",        i_epsg=4612,        s_uid_nodes="PK_UID",        flg_pairwise=False,        s_tbl_out=None,    ):        """        出発地・目的地をrouting_snap_pointsでノードにスナップし、routing_create_routing_dataで作成した        VirtualRoutingに対して最短経路探索をまとめて行う。同じノード間の探索は1回のみ行う。        :param gt_node: ノードのGTBL（extract_routing_nodesで作成したもの）        :param l_xy_orig: 出発地の(x, y)のリスト        :param l_xy_dest: 目的地の(x, y)のリスト        :param s_vtbl_rtg: VirtualRoutingのテーブル名        :param i_epsg: 出発地・目的地の座標系        :param s_uid_nodes: ノードIDのカラム名        :param flg_pairwise: Trueならl_xy_orig[i] -> l_xy_dest[i]のみ探索する（行列ではなくリストを返す）        :param s_tbl_out: 経路のジオテーブルを出力する場合のテーブル名        :return: {"cost": コスト, "length": 経路長, "orig": スナップ結果, "dest": スナップ結果}の辞書。                 cost、lengthは行列（出発地×目的地のリストのリスト）、flg_pairwiseの場合はリスト。経路がない場合はNone        """        if flg_pairwise and len(l_xy_orig) != len(l_xy_dest):            raise ValueError("l_xy_orig and l_xy_dest must have the same length.")        self.ch_able_routing()        l_snap_orig = self.routing_snap_points(gt_node, l_xy_orig, i_epsg, s_uid_nodes)        l_snap_dest = self.routing_snap_points(gt_node, l_xy_dest, i_epsg, s_uid_nodes)        # 探索するODペア（出発地のインデックス, 目的地のインデックス）        if flg_pairwise:            l_pair = [(i, i) for i in range(len(l_xy_orig))]        else:            l_pair = [                (i, j) for i in range(len(l_xy_orig)) for j in range(len(l_xy_dest))            ]        # 同じノード間の経路は1回のみ探索する        flg_geom = s_tbl_out is not None        flg_geographic = self.ch_epsg_coordtype(gt_node.epsg) == "geographic"        sql = f"""            SELECT "Cost", ST_Length("Geometry", {flg_geographic * 1}) AS "length"            {', "Geometry"' if flg_geom else ""}            FROM "{s_vtbl_rtg}"            WHERE "NodeFrom" = ? AND "NodeTo" = ?            LIMIT 1        ;"""        d_route = {}        self.begin()        for i, j in l_pair:            t_node = (l_snap_orig[i]["id"], l_snap_dest[j]["id"])            if t_node in d_route:                continue            if t_node[0] is None or t_node[1] is None:                d_route[t_node] = None            elif t_node[0] == t_node[1]:                d_route[t_node] = (0.0, 0.0, None)            else:                row = self.execute(sql, t_node).fetchone()                d_route[t_node] = None if row is None or row[0] is None else tuple(row)        self.commit()        # 結果の整理        def get_value(i, j, n):            t_route = d_route[(l_snap_orig[i]["id"], l_snap_dest[j]["id"])]            return None if t_route is None else t_route[n]        if flg_pairwise:            l_cost = [get_value(i, j, 0) for i, j in l_pair]            l_length = [get_value(i, j, 1) for i, j in l_pair]        else:            l_cost = [                [get_value(i, j, 0) for j in range(len(l_xy_dest))]                for i in range(len(l_xy_orig))            ]            l_length = [                [get_value(i, j, 1) for j in range(len(l_xy_dest))]                for i in range(len(l_xy_orig))            ]        # 経路のジオテーブルを出力        if flg_geom:            ll_coldef = [                ["orig_idx", "INTEGER"],                ["dest_idx", "INTEGER"],                ["node_from", "INTEGER"],                ["node_to", "INTEGER"],                ["cost", "REAL"],                ["length", "REAL"],                ["orig_dist_m", "REAL"],                ["dest_dist_m", "REAL"],            ]            gt_route = GTBL(self, s_tbl_out, gt_node.epsg, "ln")            self.create_table(gt_route, ll_coldef)            l_row = []            for i, j in l_pair:                t_node = (l_snap_orig[i]["id"], l_snap_dest[j]["id"])                t_route = d_route[t_node]                if t_route is None:                    continue                l_row.append(                    (i, j)                    + t_node                    + tuple(t_route[:2])                    + (l_snap_orig[i]["dist_m"], l_snap_dest[j]["dist_m"], t_route[2])                )            self.begin()            self.executemany(                f"""                INSERT INTO "{gt_route.name}" (                  {", ".join([f'"{l_coldef[0]}"' for l_coldef in ll_coldef])}, "{gt_route.gc}"                ) VALUES ({", ".join(["?"] * (len(ll_coldef) + 1))})            ;""",                l_row,            )            self.commit()        return {            "cost": l_cost,            "length": l_length,            "orig": l_snap_orig,            "dest": l_snap_dest,        }    # 登録されているジオメトリカラムの情報をもとに、テーブル名からgtblを得る    def get_gtbl_from_metadata(self, s_tbl, s_gc=None):        ll_fetch = self.get_geomcols_meta(s_tbl, s_gc)        d_type = {            1: "pt",            2: "ln",            3: "pg",            4: "mpt",            5: "mln",            6: "mpg",        }  # M、Z次元には未対応（dimension列見てない）        if len(ll_fetch) == 1:            l_fetch = ll_fetch[0]            gt = GTBL(                self,                s_tbl,                l_fetch["srid"],                d_type[l_fetch["geometry_type"]],                l_fetch["f_geometry_column"],            )        elif len(ll_fetch) == 0:            logger.warning(                "no table and/or geometry column was found. please check them."            )            return None        else:            logger.warning(                'geotable "%s" has multiple geometry column. please identify the geometry column.',                s_tbl,            )            return None        return gt    # GTBLならそれを、違うなら作成してGTBLを返す    def ch_and_get_gtbl(self, gt_or_tbl, s_gc, i_epsg, s_geomtype):        if isinstance(gt_or_tbl, GTBL):            gt = gt_or_tbl        elif (            isinstance(gt_or_tbl, (str,))            and i_epsg is not None            and s_geomtype is not None        ):            if s_geomtype in (                "pt",                "ln",                "pg",                "mpt",                "mln",                "mpg",                "mptm",                "mlnm",                "mpgm",                "ptz" "ptzm",                "mptz",                "mptzm",            ):                s_type_abr = s_geomtype            else:                s_type_abr = self.get_type_abr(s_geomtype)            gt = GTBL(self, gt_or_tbl, i_epsg, s_type_abr, s_gc)        else:            logger.warning(                f"{self.get_method_name()}: given parameter is something wrong"            )            return 0  # 処理終了        return gt    # set gtbl    def set_gtbl(self, gt_or_tbl, epsg=None, s_type_abr=None, gc=None):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name            epsg = gt_or_tbl.epsg if epsg is None else epsg            s_type_abr = gt_or_tbl.type_abr if s_type_abr is None else s_type_abr            # epsg/s_typeどちらか指定 => 通常gcは書き換わるため、gcについてはそれ以外の場合のみ指定。            if epsg is None and s_type_abr is None:                gc = gt_or_tbl.gc if gc is None else gc        else:            if epsg is None:                logger.warning(                    'if you give s_tbl instead of gtbl object, parameter "epsg" must not be None.'                )                return 0            if s_type_abr is None:                logger.warning(                    'if you give s_tbl instead of gtbl object, parameter "s_type_abr" must not be None.'                )                return 0            s_tbl = gt_or_tbl        if s_type_abr in (            "pt",            "ln",            "pg",            "mpt",            "mln",            "mpg",            "mptm",            "mlnm",            "mpgm",            "ptz" "ptzm",            "mptz",            "mptzm",        ):            s_type_abr = s_type_abr        else:            s_type_abr = self.get_type_abr(s_type_abr)        gt = GTBL(self, s_tbl, epsg, s_type_abr, gc)        return gt    # レイヤ名を返す    @staticmethod    def get_tblname(gt_or_tbl):        if isinstance(gt_or_tbl, GTBL):            s_tbl = gt_or_tbl.name        elif isinstance(gt_or_tbl, (str,)):            s_tbl = gt_or_tbl        else:            logger.warning(                f"{self.get_method_name()}: given parameter is something wrong"            )            return 0  # 処理終了        return s_tbl    # レイヤ名とジオメトリカラム名を返す    @staticmethod    def get_tblname_and_gc(gt_or_tbl, s_gc=None):        if isinstance(gt_or_tbl, GTBL) and s_gc is None:            s_tbl = gt_or_tbl.name            s_gc = gt_or_tbl.gc        elif isinstance(gt_or_tbl, (str,)) and s_gc is not None:            s_tbl = gt_or_tbl        else:            logger.warning(                f"{self.get_method_name()}: given parameter is something wrong"            )            logger.info("given gt_or_tbl is {}".format(gt_or_tbl))            logger.info("given s_gc is {}".format(s_gc))            return 0  # 処理終了        return s_tbl, s_gc    # ジオメトリタイプから略形表記を取得する    @staticmethod    def get_type_abr(s_geomtype):        type_dict = {            "pt": "POINT",            "ln": "LINESTRING",            "pg": "POLYGON",            "mpt": "MULTIPOINT",            "mln": "MULTILINESTRING",            "mpg": "MULTIPOLYGON",            "mptm": "MULTIPOINT M",            "mlnm": "MULTILINESTRING M",            "mpgm": "MULTIPOLYGON M",            "ptz": "POINT Z",            "ptzm": "POINT ZM",            "mptz": "MULTIPOINT Z",            "mptzm": "MULTIPOINT ZM",        }        # typeからtype_abrを呼ぶために辞書を反転する。辞書を反転させるときにスペースを削除し、すべて小文字に変換        type_dict_inv = {            v.replace(" ", "").lower(): k for k, v in list(type_dict.items())        }        # Remove spaces and convert to lower case for matching        s_geomtype_lower = s_geomtype.replace(" ", "").lower()        # Try to match geometry type directly        s_type_abr = type_dict_inv.get(s_geomtype_lower)        # If no match found, raise an error        if s_type_abr is None:            raise ValueError(f"No abbreviation found for geometry type {s_geomtype}")        return s_type_abr    # 適当な一時テーブル名を作成    @staticmethod    def get_temptblname(s_prefix="geotemp"):        # 適当な一時テーブル名を作成 http://qiita.com/FGtatsuro/items/92bca9ed665449ab047        import string        import random        s_temptbl = "".join([random.choice(string.ascii_letters) for i in range(10)])        s_temptbl = "{}_{}".format(s_prefix, s_temptbl)        return s_temptbl    # SQLiteで定義できるカラムタイプに変換する    @staticmethod    def get_dtype(dtype):        if isinstance(dtype, str):            return dtype        elif dtype is bytes or dtype is str:            return "TEXT"        elif dtype is int:            return "INTEGER"        elif dtype is float:            return "REAL"        elif dtype is bytes:            return "BLOB"        else:            logger.warning('given type "{}" might be strange.'.format(dtype))            return dtype    # get primary key column name    def get_primary_key(self, gt_or_tbl: [GTBL, str]) -> [str, None]:        """        get name of primary key column        :param gt_or_tbl: table name or GTBL object        :return: name of primary key column        """        s_tbl = gt_or_tbl.name if isinstance(gt_or_tbl, GTBL) else gt_or_tbl        rows = self.get_tblinfo_meta(s_tbl)        for row in rows:            if row[5] == 1:                return row[1]        logger.info(f'the table "{s_tbl}" has no primary key column. return None.')        return None    # get method name（呼び出し元のメソッド名。i_depthだけ更に遡る）    @staticmethod    def get_method_name(i_depth=0):        frame = inspect.currentframe().f_back        for _ in range(i_depth):            frame = frame.f_back        return frame.f_code.co_nameclass GTBL(object):    def __init__(        self, con: SpatiaLiteConnection, name: str, epsg: int, type_abr: str, gc=None    ):        self.con = con        self.name = name        self.epsg = epsg        self.type_abr = type_abr        if gc is None:            gc = f"geom_{type_abr}_{epsg}"        self.gc = gc        type_dict = {            "pt": "POINT",            "ln": "LINESTRING",            "pg": "POLYGON",            "mpt": "MULTIPOINT",            "mln": "MULTILINESTRING",            "mpg": "MULTIPOLYGON",            "mptm": "MULTIPOINT M",            "mlnm": "MULTILINESTRING M",            "mpgm": "MULTIPOLYGON M",            "ptz": "POINT Z",            "ptzm": "POINT ZM",            "mptz": "MULTIPOINT Z",            "mptzm": "MULTIPOINT ZM",        }        self.type = type_dict[type_abr]        # Get Primary Key column of geo table        l_row = self.con.get_tblinfo_meta(self.name)        if len([r["pk"] for r in l_row if r["pk"] == 1]) == 1:            s_pk = [r["name"] for r in l_row if r["pk"] == 1][0]        elif len([r["pk"] for r in l_row if r["pk"] == 1]) > 1:            logger.warning(f"""Multiple Primary Key columns in "{self.name}".""")            s_pk = None        else:            s_pk = None        self.pk = s_pk    @property    def is_geographic(self):        i_result = self.con.execute(            f"""SELECT SridIsGeographic({self.epsg});"""        ).fetchone()[0]        return bool(i_result)    @property    def is_projected(self):        i_result = self.con.execute(            f"""SELECT SridIsProjected({self.epsg});"""        ).fetchone()[0]        return bool(i_result)class SpatiaLiteConnectionPool(object):    """    初期化済みのSpatiaLiteConnectionをスレッドに貸し出すコネクションプール。    接続は必要になった時点でi_sizeまで生成し、以降は使い回す。貸し出し時にヘルスチェックを行い、    異常な接続は破棄して作り直す。    使い方:        pool = SpatiaLiteConnectionPool('hoge.sqlite', i_size=8)        with pool.connection() as con:            con.execute('SELECT ...').fetchall()        logger.info(pool.get_stats())        pool.close()    """    def __init__(        self,        p_db,        i_size=4,        read_only=True,        p_mod_spatialite=None,        f_timeout=30.0,        **kwargs,    ):        import queue        import threading        self.p_db = p_db        self.i_size = i_size        self.read_only = read_only        self.p_mod_spatialite = p_mod_spatialite        self.f_timeout = f_timeout        self.kwargs = kwargs        self.kwargs.setdefault("timeout", f_timeout)  # ロックの解除も貸し出しと同じ秒数まで待つ        self.q_idle = queue.LifoQueue()  # 直近に返却された接続から使う        self.lock = threading.Lock()        self.l_con = []  # 生成済みの接続        self.flg_closed = False        self.d_stats = {            "created": 0,            "discarded": 0,            "acquired": 0,            "in_use": 0,            "in_use_max": 0,            "wait_sec_total": 0.0,            "wait_sec_max": 0.0,            "timeout": 0,        }    # 接続を生成する    def create_connection(self):        con = SpatiaLiteConnection(            self.p_db,            p_mod_spatialite=self.p_mod_spatialite,            fast_open=True,            read_only=self.read_only,            check_same_thread=False,  # 生成したスレッドと異なるスレッドで利用するため            **self.kwargs,        )        con.n_used = 0        return con    # 接続が利用可能かどうかを確認する    @staticmethod    def ch_health(con):        try:            con.execute("""SELECT 1;""").fetchone()        except sqlite3.Error:            return False        return con.in_transaction is False    # 接続を借りる    def get(self, f_timeout=None):        import queue        import time        if self.flg_closed:            raise RuntimeError("the connection pool is already closed.")        f_timeout = self.f_timeout if f_timeout is None else f_timeout        f_start = time.perf_counter()        con = None        while con is None:            # 空いている接続がなく、上限に達していなければ生成する            flg_create = False            if self.q_idle.empty():                with self.lock:                    if len(self.l_con) < self.i_size:                        self.l_con.append(None)  # 生成中の枠を確保                        flg_create = True            if flg_create:                try:                    con = self.create_connection()                finally:                    with self.lock:                        self.l_con.remove(None)                        if con is not None:                            self.l_con.append(con)                            self.d_stats["created"] += 1                break            f_left = f_timeout - (time.perf_counter() - f_start)            try:                con = self.q_idle.get(timeout=max(f_left, 0))            except queue.Empty:                with self.lock:                    self.d_stats["timeout"] += 1                raise TimeoutError(                    f"no connection was available within {f_timeout} seconds."                )            if not self.ch_health(con):                self.discard(con)                con = None        f_wait = time.perf_counter() - f_start        with self.lock:            con.n_used += 1            self.d_stats["acquired"] += 1            self.d_stats["in_use"] += 1            self.d_stats["in_use_max"] = max(                self.d_stats["in_use_max"], self.d_stats["in_use"]            )            self.d_stats["wait_sec_total"] += f_wait            self.d_stats["wait_sec_max"] = max(self.d_stats["wait_sec_max"], f_wait)        return con    # 接続を返却する    def put(self, con):        with self.lock:            self.d_stats["in_use"] -= 1        if self.flg_closed:            self.discard(con)            return        # 未完了のトランザクションが残っている場合は破棄する        if con.in_transaction:            try:                con.rollback()            except sqlite3.Error:                self.discard(con)                return        self.q_idle.put(con)    # 接続を破棄する    def discard(self, con):        with self.lock:            if con in self.l_con:                self.l_con.remove(con)                self.d_stats["discarded"] += 1        try:            con.close()        except sqlite3.Error:            pass    # with文で接続を借りる    def connection(self, f_timeout=None):        import contextlib        @contextlib.contextmanager        def borrow():            con = self.get(f_timeout)            try:                yield con            finally:                self.put(con)        return borrow()    # 利用状況の統計を返す    def get_stats(self):        with self.lock:            d_stats = dict(self.d_stats)            d_stats["size"] = self.i_size            d_stats["opened"] = len([con for con in self.l_con if con is not None])            d_stats["usage"] = [con.n_used for con in self.l_con if con is not None]        d_stats["idle"] = self.q_idle.qsize()        d_stats["wait_sec_mean"] = (            d_stats["wait_sec_total"] / d_stats["acquired"]            if d_stats["acquired"] > 0            else 0.0        )        return d_stats    # すべての接続を閉じる    def close(self):        import queue        self.flg_closed = True        while True:            try:                con = self.q_idle.get_nowait()            except queue.Empty:                break            self.discard(con)class PointGridIndex(object):    """    点群の最近傍探索用のグリッドインデックス（メモリ上に保持する）    """    def __init__(self, l_id, l_x, l_y, i_per_cell=4):        import math        self.i_num = len(l_id)        self.d_cell = {}        if self.i_num == 0:            self.x0 = self.y0 = 0.0            self.f_cell = 1.0            self.i_nx = self.i_ny = 0            return        self.x0 = min(l_x)        self.y0 = min(l_y)        f_w = max(l_x) - self.x0        f_h = max(l_y) - self.y0        if f_w * f_h > 0:            self.f_cell = math.sqrt(f_w * f_h / self.i_num * i_per_cell)        elif max(f_w, f_h) > 0:  # 一直線上に並んでいる場合            self.f_cell = max(f_w, f_h) / self.i_num * i_per_cell        else:  # すべて同一座標の場合            self.f_cell = 1.0        self.i_nx = int(f_w // self.f_cell)        self.i_ny = int(f_h // self.f_cell)        for s_id, x, y in zip(l_id, l_x, l_y):            t_cell = (int((x - self.x0) // self.f_cell), int((y - self.y0) // self.f_cell))            self.d_cell.setdefault(t_cell, []).append((x, y, s_id))    # 最近傍点のIDと距離を返す    def nearest(self, x, y):        import math        if self.i_num == 0:            return None, None        cx = int((x - self.x0) // self.f_cell)        cy = int((y - self.y0) // self.f_cell)        t_best = (math.inf, None)        # グリッドの範囲外の点は全件から探す        if not (0 <= cx <= self.i_nx and 0 <= cy <= self.i_ny):            for l_pt in self.d_cell.values():                for x_pt, y_pt, s_id in l_pt:                    f_dist = math.hypot(x_pt - x, y_pt - y)                    if f_dist < t_best[0]:                        t_best = (f_dist, s_id)            return t_best[1], t_best[0]        i_ring_max = max(cx, self.i_nx - cx, cy, self.i_ny - cy)        for i_ring in range(i_ring_max + 1):            # i_ring周目のセル            for ix in range(cx - i_ring, cx + i_ring + 1):                for iy in (cy - i_ring, cy + i_ring) if i_ring > 0 else (cy,):                    t_best = self.search_cell(ix, iy, x, y, t_best)            for iy in range(cy - i_ring + 1, cy + i_ring):                for ix in (cx - i_ring, cx + i_ring) if i_ring > 0 else ():                    t_best = self.search_cell(ix, iy, x, y, t_best)            # 未探索のセルはi_ring * f_cell以上離れている            if t_best[0] <= i_ring * self.f_cell:                break        return t_best[1], t_best[0]    def search_cell(self, ix, iy, x, y, t_best):        import math        for x_pt, y_pt, s_id in self.d_cell.get((ix, iy), ()):            f_dist = math.hypot(x_pt - x, y_pt - y)            if f_dist < t_best[0]:                t_best = (f_dist, s_id)        return t_best
\ No newline at end of file
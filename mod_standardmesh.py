@@ -7,127 +7,140 @@
 spatialiteと独立で扱えるものはこちらに入れ込む。conが必要なものについてはmod_spatialiteへ。
 """
 
+import logging
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# 1次メッシュを経緯度方向にそれぞれ何分割した整数グリッドで計算するか（全メッシュレベルの公倍数）
+MESH_GRID_DIV = 3200
+
+# 境界上の点を判定する際の許容誤差（整数グリッド単位）
+MESH_GRID_EPS = 1e-6
+
+# 2次メッシュ以下の分割手順（"xy": n×n分割で緯度・経度の2桁、"q": 2×2分割で1～4の1桁、"2x": 2倍地域メッシュ）
+MESH_STEPS = {
+    1: (),
+    2: (("xy", 8),),
+    3: (("xy", 8), ("xy", 10)),
+    "5x": (("xy", 8), ("q", 2)),
+    "2x": (("xy", 8), ("2x", 5)),
+    "half": (("xy", 8), ("xy", 10), ("q", 2)),
+    "quarter": (("xy", 8), ("xy", 10), ("q", 2), ("q", 2)),
+    "eighth": (("xy", 8), ("xy", 10), ("q", 2), ("q", 2), ("q", 2)),
+    "tenth": (("xy", 8), ("xy", 10), ("xy", 10)),
+    "twentieth": (("xy", 8), ("xy", 10), ("xy", 10), ("xy", 2)),
+}
+
 
 # ある位置のメッシュコードを返す
 def get_mesh_index(
     longitude: int or float, latitude: int or float, mesh_level: int or str = 3
 ) -> str:
-    # todo: lonlat値が境界上の場合、計算精度の関係で誤った値になる場合がある。
+    """
+    境界上の点も正しいメッシュに入るよう、整数グリッドに変換してからコードを求める。
+    """
+    if mesh_level in MESH_STEPS:
+        ix, iy = get_grid_index(longitude, latitude)
+
+        return str(encode_mesh_grid(ix, iy, mesh_level))
+
+    else:
+        logger.warning(f"invalid mesh_level: {mesh_level}")
+        return "invalid mesh_level"
+
+
+# メッシュコード（整数）から南西端の整数グリッド座標を求める。encode_mesh_gridの逆変換。
+def decode_mesh_grid(meshcode, mesh_level: int or str = 3) -> tuple:
+    # 各分割段階のグリッド幅
+    l_span = []
+    span = MESH_GRID_DIV
+    for s_step, n_part in MESH_STEPS[mesh_level]:
+        span = span // n_part
+        l_span.append(span)
+
+    # 下位の桁から順に取り出して、1次メッシュ内のグリッド座標を求める
+    ix = 0
+    iy = 0
+    for (s_step, n_part), span in zip(
+        reversed(MESH_STEPS[mesh_level]), reversed(l_span)
+    ):
+        if s_step == "xy":
+            xd = meshcode % 10
+            yd = meshcode // 10 % 10
+            meshcode = meshcode // 100
+        elif s_step == "q":
+            xd = (meshcode % 10 - 1) % 2
+            yd = (meshcode % 10 - 1) // 2
+            meshcode = meshcode // 10
+        else:  # 2x mesh
+            xd = meshcode // 10 % 10 // 2
+            yd = meshcode // 100 % 10 // 2
+            meshcode = meshcode // 1000
+        ix = ix + xd * span
+        iy = iy + yd * span
+
+    ix = ix + meshcode % 100 * MESH_GRID_DIV
+    iy = iy + meshcode // 100 * MESH_GRID_DIV
+
+    return ix, iy
+
+
+# 経緯度を整数グリッド座標に変換する（境界上の点は北東側のグリッドに含める）
+def get_grid_index(longitude: int or float, latitude: int or float) -> tuple:
     import math
 
-    if mesh_level in (
-        1,
-        2,
-        3,
-        "5x",
-        "2x",
-        "half",
-        "quarter",
-        "eighth",
-        "tenth",
-    ):  # 1st mesh base
-        x_tmp = longitude - 100
-        y_tmp = latitude * 1.5
+    x_grid = (longitude - 100) * MESH_GRID_DIV
+    y_grid = latitude * 1.5 * MESH_GRID_DIV
+    ix = round(x_grid)
+    if abs(x_grid - ix) >= MESH_GRID_EPS:
+        ix = math.floor(x_grid)
+    iy = round(y_grid)
+    if abs(y_grid - iy) >= MESH_GRID_EPS:
+        iy = math.floor(y_grid)
 
-        n_part = 1.0  # 分割数の設定
-        x1d = math.floor(x_tmp)
-        y1d = math.floor(y_tmp)
-        meshcode = f"{int(y1d)}{int(x1d)}"
+    return ix, iy
 
-        x_tmp = x_tmp - x1d / n_part  # / 1.0
-        y_tmp = y_tmp - y1d / n_part
-        if mesh_level != 1:  # 2nd mesh base
-            n_part = n_part * 8
-            x2d = math.floor(x_tmp * n_part)
-            y2d = math.floor(y_tmp * n_part)
-            meshcode = f"{meshcode}{int(y2d)}{int(x2d)}"
 
-            x_tmp = x_tmp - x2d / n_part  # / 8.0
-            y_tmp = y_tmp - y2d / n_part
-            if mesh_level in (
-                3,
-                "half",
-                "quarter",
-                "eighth",
-                "tenth",
-                "twentieth",
-            ):  # 3rd mesh base
-                n_part = n_part * 10
-                x3d = math.floor(x_tmp * n_part)
-                y3d = math.floor(y_tmp * n_part)
-                meshcode = f"{meshcode}{int(y3d)}{int(x3d)}"
-
-                x_tmp = x_tmp - x3d / n_part  # / 80.0
-                y_tmp = y_tmp - y3d / n_part
-
-                if mesh_level not in (3, "tenth"):  # ext 3rd mesh base
-                    n_part = n_part * 2
-                    x4d = math.floor(x_tmp * n_part)
-                    y4d = math.floor(y_tmp * n_part)
-                    _4d = x4d + y4d * 2 + 1
-                    meshcode = f"{meshcode}{int(_4d)}"
-
-                    x_tmp = x_tmp - x4d / n_part  # / 160.0
-                    y_tmp = y_tmp - y4d / n_part
-                    if mesh_level != "half":  # half mesh base
-                        n_part = n_part * 2
-                        x5d = math.floor(x_tmp * n_part)
-                        y5d = math.floor(y_tmp * n_part)
-                        _5d = x5d + y5d * 2 + 1
-                        meshcode = f"{meshcode}{int(_5d)}"
-
-                        x_tmp = x_tmp - x5d / n_part  # / 320.0
-                        y_tmp = y_tmp - y5d / n_part
-                        if mesh_level != "quarter":  # quarter mesh base = eighth mesh
-                            n_part = n_part * 2
-                            x6d = math.floor(x_tmp * n_part)
-                            y6d = math.floor(y_tmp * n_part)
-                            _6d = x6d + y6d * 2 + 1
-                            meshcode = f"{meshcode}{int(_6d)}"
-
-                elif mesh_level in ("tenth", "twentieth"):  # 10th mesh base
-                    n_part = (
-                        n_part * 10
-                    )  # change division number to 10 for 1/10 division
-                    x4d = math.floor(x_tmp * n_part)
-                    y4d = math.floor(y_tmp * n_part)
-                    meshcode = f"{meshcode}{int(y4d)}{int(x4d)}"  # append y and x direction code
-
-                    x_tmp = x_tmp - x4d / n_part  # / 800.0
-                    y_tmp = y_tmp - y4d / n_part
-                    if mesh_level == "twentieth":  # 20th mesh
-                        n_part = n_part * 2
-                        x5d = math.floor(x_tmp * n_part)
-                        y5d = math.floor(y_tmp * n_part)
-                        meshcode = f"{meshcode}{int(y5d)}{int(x5d)}"  # append y and x direction code
+# メッシュレベルに応じた1メッシュあたりの整数グリッド幅を返す
+def get_grid_span(mesh_level: int or str = 3) -> int:
+    span = MESH_GRID_DIV
+    for s_step, n_part in MESH_STEPS[mesh_level]:
+        span = span // n_part
 
-            else:  # ext 2nd mesh base
-                if mesh_level == "5x":  # 5x mesh
-                    n_part = n_part * 2
-                    x3d = math.floor(x_tmp * n_part)
-                    y3d = math.floor(y_tmp * n_part)
-                    _3d = x3d + y3d * 2 + 1
-                    meshcode = f"{meshcode}{int(_3d)}"
+    return span
 
-                elif mesh_level == "2x":  # 2x mesh
-                    n_part = n_part * 5
-                    x3d = math.floor(x_tmp * n_part) * 2
-                    y3d = math.floor(y_tmp * n_part) * 2
-                    meshcode = f"{meshcode}{int(y3d)}{int(x3d)}5"
 
-        return meshcode
+# 整数グリッド座標からメッシュコード（整数）を求める。intとnumpyの整数配列のどちらにも使える。
+def encode_mesh_grid(ix, iy, mesh_level: int or str = 3):
+    meshcode = (iy // MESH_GRID_DIV) * 100 + ix // MESH_GRID_DIV  # 1st mesh
+    ix = ix % MESH_GRID_DIV
+    iy = iy % MESH_GRID_DIV
 
-    else:
-        print(f"invalid mesh_level: {mesh_level}")
-        return "invalid mesh_level"
+    span = MESH_GRID_DIV
+    for s_step, n_part in MESH_STEPS[mesh_level]:
+        span = span // n_part
+        xd = ix // span
+        yd = iy // span
+        ix = ix % span
+        iy = iy % span
+        if s_step == "xy":
+            meshcode = meshcode * 100 + yd * 10 + xd
+        elif s_step == "q":
+            meshcode = meshcode * 10 + xd + yd * 2 + 1
+        else:  # 2x mesh
+            meshcode = meshcode * 1000 + yd * 200 + xd * 20 + 5
+
+    return meshcode
 
 
 # メッシュレベルに基づいて経度と緯度のメッシュ単位サイズを取得する
 def get_unitsize(mesh_level: int or str) -> tuple:
     """
     This function calculates the unit size (longitude and latitude) based on the provided mesh level.
-    It supports the following mesh levels: 1, 2, 3, '5x', '2x', 'half', 'quarter', 'eighth', 'tenth'.
-    If an invalid mesh level is provided, the function prints an error message and returns an empty tuple.
+    It supports the following mesh levels: 1, 2, 3, '5x', '2x', 'half', 'quarter', 'eighth', 'tenth',
+    'twentieth'.
+    If an invalid mesh level is provided, the function logs a warning and returns an empty tuple.
 
     Args:
         mesh_level (int or str): The desired mesh level, could be a string or an integer.
@@ -145,11 +158,12 @@ def get_unitsize(mesh_level: int or str) -> tuple:
         'quarter': 1/4地域メッシュ
         'eighth': 1/8地域メッシュ
         'tenth': 1/10細分メッシュ
+        'twentieth': 1/20細分メッシュ
 
     Returns:
         tuple: If a valid mesh level is provided, it returns a tuple containing the unit longitude and
                unit latitude sizes.
-               If an invalid mesh level is provided, it returns an empty tuple and prints an error message.
+               If an invalid mesh level is provided, it returns an empty tuple and logs a warning.
     """
 
     # 東西南北端の座標
@@ -163,6 +177,7 @@ def get_unitsize(mesh_level: int or str) -> tuple:
         "quarter",
         "eighth",
         "tenth",
+        "twentieth",
     ):  # 1st mesh base
         unitlon = 1.0
         unitlat = 1.0 / 1.5
@@ -205,7 +220,7 @@ def get_unitsize(mesh_level: int or str) -> tuple:
         return unitlon, unitlat
 
     else:
-        print(f"invalid mesh_level: {mesh_level}")
+        logger.warning(f"invalid mesh_level: {mesh_level}")
         return tuple()
 
 
@@ -237,7 +252,7 @@ def detect_meshlevel(meshcode: str) -> int or str:
         mesh_level = 0
 
     if mesh_level == 0:
-        print(f"invalid meshcode moge: {meshcode}")
+        logger.warning(f"invalid meshcode moge: {meshcode}")
 
     return mesh_level
 
@@ -299,7 +314,7 @@ def get_stdmeshcode2wkt(meshcode: str) -> tuple:
     """
 
     # コード分割
-    (mesh_level, x1d, x2d, x3d, y1d, y2d, y3d, _3d, _4d, _5d, _6d) = split_meshcode(
+    mesh_level, x1d, x2d, x3d, y1d, y2d, y3d, _3d, _4d, _5d, _6d, _7d = split_meshcode(
         meshcode
     )
 
@@ -333,7 +348,10 @@ def get_stdmeshcode2wkt(meshcode: str) -> tuple:
                             minlon = minlon + unitlon
                         if _5d in (3, 4):
                             minlat = minlat + unitlat
-                        if mesh_level != "quarter":  # quarter mesh base = eighth mesh
+                        if mesh_level not in (
+                            "quarter",
+                            "quarter or tenth",
+                        ):  # quarter mesh base = eighth mesh
                             unitlon = unitlon / 2
                             unitlat = unitlat / 2
                             if _6d in (2, 4):
@@ -361,7 +379,7 @@ def get_stdmeshcode2wkt(meshcode: str) -> tuple:
         return wkt, (minlon, minlat), (maxlon, maxlat)
 
     else:
-        print(f"invalid meshcode hoge: {meshcode}")
+        logger.warning(f"invalid meshcode hoge: {meshcode}")
         return tuple()
 
 
@@ -369,19 +387,126 @@ def get_stdmeshcode2wkt(meshcode: str) -> tuple:
 def get_meshlist_from_extent(
     lon_min: float, lat_min: float, lon_max: float, lat_max: float, mesh_level: int = 3
 ) -> list:
-    # メッシュの幅を取得
-    unitlon, unitlat = get_unitsize(mesh_level)
-
-    # 緯度と経度でループを順に回して、メッシュリストを生成
-    mesh_list = []
-    lat = lat_min
-    while lat <= lat_max:
-        lon = lon_min
-        while lon <= lon_max:
-            # 該当する座標のメッシュコードを取得してリストに追加
-            meshcode = get_mesh_index(lon, lat, mesh_level)
-            mesh_list.append(meshcode)
-            lon += unitlon
-        lat += unitlat
+    mesh_list = [
+        str(t_mesh[0])
+        for t_mesh in iter_mesh_from_extent(
+            lon_min, lat_min, lon_max, lat_max, mesh_level
+        )
+    ]
 
     return mesh_list
+
+
+# 範囲に含まれるメッシュの行数・列数を返す
+def get_meshcount_from_extent(
+    lon_min: float, lat_min: float, lon_max: float, lat_max: float, mesh_level: int = 3
+) -> tuple:
+    span = get_grid_span(mesh_level)
+    ix_min, iy_min = get_grid_index(lon_min, lat_min)
+    ix_max, iy_max = get_grid_index(lon_max, lat_max)
+
+    n_row = max(iy_max // span - iy_min // span + 1, 0)
+    n_col = max(ix_max // span - ix_min // span + 1, 0)
+
+    return n_row, n_col
+
+
+# 範囲に含まれるメッシュのコードと端点座標を順に返す（左下から右上まで）
+def iter_mesh_from_extent(
+    lon_min: float, lat_min: float, lon_max: float, lat_max: float, mesh_level: int = 3
+):
+    """
+    メッシュを整数の行・列番号で列挙するジェネレータ。浮動小数点の累積誤差でメッシュが欠けたり重複したりせず、
+    範囲がどれだけ広くてもメモリ使用量は一定。
+
+    :return: (meshcode, minlon, minlat, maxlon, maxlat) のタプルを返すジェネレータ
+    """
+
+    if mesh_level not in MESH_STEPS:
+        raise ValueError(f"invalid mesh_level: {mesh_level}")
+
+    span = get_grid_span(mesh_level)
+    ix_min, iy_min = get_grid_index(lon_min, lat_min)
+    ix_max, iy_max = get_grid_index(lon_max, lat_max)
+
+    for n_row in range(iy_min // span, iy_max // span + 1):
+        iy = n_row * span
+        minlat = iy / (1.5 * MESH_GRID_DIV)
+        maxlat = (iy + span) / (1.5 * MESH_GRID_DIV)
+        for n_col in range(ix_min // span, ix_max // span + 1):
+            ix = n_col * span
+            yield (
+                encode_mesh_grid(ix, iy, mesh_level),
+                ix / MESH_GRID_DIV + 100.0,
+                minlat,
+                (ix + span) / MESH_GRID_DIV + 100.0,
+                maxlat,
+            )
+
+
+# 座標配列からメッシュコード（整数）の配列を返す
+def get_mesh_index_array(longitude, latitude, mesh_level: int or str = 3):
+    """
+    get_mesh_indexの配列版。大量の点に一括でメッシュコードを付与する際に利用する。
+
+    :param longitude: 経度の配列（array_like）
+    :param latitude: 緯度の配列（array_like）
+    :param mesh_level: get_unitsizeと同じメッシュレベル
+    :return: メッシュコードのnumpy.ndarray（int64）
+    """
+    import numpy as np
+
+    if mesh_level not in MESH_STEPS:
+        raise ValueError(f"invalid mesh_level: {mesh_level}")
+
+    x_grid = (np.asarray(longitude, dtype=np.float64) - 100) * MESH_GRID_DIV
+    y_grid = np.asarray(latitude, dtype=np.float64) * 1.5 * MESH_GRID_DIV
+
+    # 境界からの誤差が許容範囲内であれば境界上（北東側のメッシュ）とみなす
+    x_round = np.round(x_grid)
+    y_round = np.round(y_grid)
+    ix = np.where(
+        np.abs(x_grid - x_round) < MESH_GRID_EPS, x_round, np.floor(x_grid)
+    ).astype(np.int64)
+    iy = np.where(
+        np.abs(y_grid - y_round) < MESH_GRID_EPS, y_round, np.floor(y_grid)
+    ).astype(np.int64)
+
+    return encode_mesh_grid(ix, iy, mesh_level)
+
+
+# メッシュコード（整数）の配列から各メッシュの端点座標の配列を返す
+def get_meshbounds_array(meshcode, mesh_level: int or str = 3) -> tuple:
+    """
+    get_stdmeshcode2wkt（split_meshcode）の配列版。
+    1/4地域メッシュと1/10細分メッシュはコード長が同じで判別できないため、mesh_levelは明示的に与える。
+
+    :param meshcode: メッシュコードの配列（array_like、整数または数字の文字列）
+    :param mesh_level: get_unitsizeと同じメッシュレベル
+    :return: (minlon, minlat, maxlon, maxlat) のnumpy.ndarrayのタプル
+    """
+    import numpy as np
+
+    if mesh_level not in MESH_STEPS:
+        raise ValueError(f"invalid mesh_level: {mesh_level}")
+
+    meshcode = np.asarray(meshcode).astype(np.int64)
+
+    return get_meshbounds(meshcode, mesh_level)
+
+
+# メッシュコード（整数）からメッシュの端点座標を返す。intとnumpyの整数配列のどちらにも使える。
+def get_meshbounds(meshcode, mesh_level: int or str = 3) -> tuple:
+    """
+    :return: (minlon, minlat, maxlon, maxlat)
+    """
+
+    ix, iy = decode_mesh_grid(meshcode, mesh_level)
+    span = get_grid_span(mesh_level)
+
+    minlon = ix / MESH_GRID_DIV + 100.0
+    minlat = iy / (1.5 * MESH_GRID_DIV)
+    maxlon = (ix + span) / MESH_GRID_DIV + 100.0
+    maxlat = (iy + span) / (1.5 * MESH_GRID_DIV)
+
+    return minlon, minlat, maxlon, maxlat